@@ -12,18 +12,28 @@ import signal
 import logging
 import json
 import random
+import threading
+
+from web_helpers import AccountContext, LobbyIndex, WarmDriverPool, click_positions, resolve_driver_path
 
 # =========================
 # 基本設定
 # =========================
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s")
 
 SPIN_MIN = 10
 SPIN_MAX = 25                # 每個遊戲 SPIN 次數上限（達到就強制退出）
 WINDOW_SIZE = "350,750"
+CLICK_PACE_MS = 200          # actions.json 座標批次點擊的每次點擊間隔（毫秒）
+PREWARM_BROWSERS = 1         # 除了每個 worker 一個之外，再先在背景開好幾個瀏覽器備用（0 = 不預開）
+PARALLEL_WORKERS = 1         # 同時執行的帳號數（1 = 逐一執行）
+PER_GAME_LIMIT = 2           # 同一個 game_title_code 同時最多幾個帳號（0 = 不限制）
+REUSE_BROWSER = True         # 換帳號時沿用同一個瀏覽器（每個帳號一個全新的 browser context，狀態不互通）
+RESULTS_CSV = "results_{ts}.csv"  # 執行結果摘要（{ts} 代入開始時間）
 
 keyword_actions = {}
 machine_actions = {}
+lobby_index = LobbyIndex()   # 大廳卡片索引（各 driver 分開快取）
 
 # =========================
 # 共用工具
@@ -41,7 +51,8 @@ def looks_like_url(s: str) -> bool:
 def js_click(driver, elem):
     driver.execute_script("arguments[0].click();", elem)
 
-def launch_driver(url: str):
+def new_driver():
+    """啟動一個 Edge（停在 about:blank）；預熱與冷啟動共用"""
     edge_options = webdriver.EdgeOptions()
     edge_options.add_argument(
         "--user-agent=Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) "
@@ -50,15 +61,11 @@ def launch_driver(url: str):
     edge_options.add_argument(f"--window-size={WINDOW_SIZE}")
     edge_options.add_argument("--incognito")
 
-    # 優先使用本地 msedgedriver.exe，若失敗則使用 webdriver-manager 自動下載
-    driver_path = resource_path("msedgedriver.exe")
-    if not os.path.exists(driver_path):
-        raise FileNotFoundError(f"找不到驅動程式：{driver_path}")
+    # 使用本地 msedgedriver.exe（路徑只在第一次檢查，之後取快取）
+    driver_path = resolve_driver_path(resource_path("msedgedriver.exe"))
 
     service = Service(executable_path=driver_path)
-    driver = webdriver.Edge(service=service, options=edge_options)
-    driver.get(url)
-    return driver
+    return webdriver.Edge(service=service, options=edge_options)
 
 # =========================
 # 讀取 accounts.csv
@@ -111,17 +118,9 @@ def load_accounts(csv_path: str):
 # actions.json 支援
 # =========================
 def click_multiple_positions(driver, positions, click_take=False):
-    for label in positions or []:
-        try:
-            xpath = f"//span[normalize-space(text())='{label}']"
-            elems = WebDriverWait(driver, 2).until(
-                EC.presence_of_all_elements_located((By.XPATH, xpath))
-            )
-            js_click(driver, elems[0])
-            logging.info(f"✅ 已點擊座標: {label}")
-            time.sleep(0.2)
-        except Exception as e:
-            logging.warning(f"❌ 找不到座標 '{label}': {e}")
+    # 與 AutoSpin.py 共用批次點擊：一次 execute_async_script 找出所有座標並依序點擊，回報找不到的座標
+    if positions:
+        click_positions(driver, positions, pace_ms=CLICK_PACE_MS, wait_timeout=2.0)
 
     if click_take:
         try:
@@ -148,27 +147,11 @@ def scroll_and_click_game(driver, game_title_code: str) -> bool:
         return True
     
     try:
-        items = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located((By.ID, "grid_gm_item"))
-        )
-
-        target = None
-        for item in items:
-            try:
-                title = item.get_attribute("title") or ""
-                if game_title_code and game_title_code in title:
-                    target = item
-                    break
-            except Exception:
-                continue
-
-        if not target:
+        # 一次 execute_script 找卡片、捲動並點擊（大廳未重建時沿用上次的索引）
+        if not lobby_index.click_card(driver, game_title_code, timeout=10):
             logging.warning(f"❌ 無法在大廳中找到遊戲: {game_title_code}")
             return False
 
-        driver.execute_script("arguments[0].scrollIntoView({block:'center'});", target)
-        time.sleep(0.2)
-        js_click(driver, target)
         logging.info(f"✅ 成功點擊遊戲卡片: {game_title_code}")
         time.sleep(1.0)
 
@@ -330,31 +313,145 @@ def spin_n_times_then_exit(driver, game_title_code: str, n: int = None):
             time.sleep(1.0)
 
 # =========================
-# 單一 URL 任務（逐一執行）
+# 帳號任務（可並行）
 # =========================
-def run_one(account: str, game_title_code: str, url: str):
-    logging.info(f"➡️ [{account}]({game_title_code}) 啟動：{url}")
-    driver = launch_driver(url)
+def isolate_account(driver, contexts):
+    """
+    沿用瀏覽器時，每個帳號換到一個全新的 browser context（上一個帳號的 cookie / storage / 所有網域資料整個丟棄）
+    回傳 AccountContext；無法隔離時回傳 None，呼叫端應關閉這個瀏覽器改開新的
+    """
     try:
-        # 進入指定遊戲並跑固定次數 SPIN
-        scroll_and_click_game(driver, game_title_code)
-        spin_n_times_then_exit(driver, game_title_code=game_title_code)
-    finally:
+        if contexts is None:
+            w, h = (int(x) for x in WINDOW_SIZE.split(","))
+            contexts = AccountContext(driver, window_size=(w, h))
+        contexts.fresh()
+        return contexts
+    except Exception as e:
+        logging.warning(f"無法建立獨立的瀏覽器 context，改開新瀏覽器：{e}")
+        if contexts is not None:
+            contexts.close()
+        return None
+
+def quit_driver(driver, contexts=None):
+    if contexts is not None:
+        contexts.close()
+    try:
+        driver.quit()
+    except Exception:
+        pass
+
+def run_account(driver, account: str, game_title_code: str, url: str):
+    logging.info(f"➡️ [{account}]({game_title_code}) 啟動：{url}")
+    driver.get(url)
+    # 進入指定遊戲並跑固定次數 SPIN
+    scroll_and_click_game(driver, game_title_code)
+    spin_n_times_then_exit(driver, game_title_code=game_title_code)
+    logging.info(f"✔️ [{account}]({game_title_code}) 完成")
+
+class AccountScheduler:
+    """
+    分派 accounts.csv 的列給各 worker：
+    - 依原本順序取下一列，但同一 game_title_code 執行中的帳號數達 PER_GAME_LIMIT 時跳過，先做其他遊戲
+    - stop() 後不再分派（執行中的帳號照常跑完）
+    """
+
+    def __init__(self, tasks, per_game_limit: int):
+        self._pending = list(tasks)
+        self._running = {}
+        self.per_game_limit = per_game_limit
+        self.stopped = False
+        self._cond = threading.Condition()
+
+    def next(self):
+        with self._cond:
+            while not self.stopped and self._pending:
+                for i, row in enumerate(self._pending):
+                    game = row["game_title_code"]
+                    if self.per_game_limit <= 0 or self._running.get(game, 0) < self.per_game_limit:
+                        self._running[game] = self._running.get(game, 0) + 1
+                        return self._pending.pop(i)
+                self._cond.wait()
+            return None
+
+    def done(self, row):
+        with self._cond:
+            game = row["game_title_code"]
+            self._running[game] = max(0, self._running.get(game, 0) - 1)
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self.stopped = True
+            self._cond.notify_all()
+
+    def remaining(self):
+        with self._cond:
+            return list(self._pending)
+
+def account_worker(scheduler: AccountScheduler, warm: WarmDriverPool, results: list, results_lock):
+    driver = contexts = None
+    while True:
+        row = scheduler.next()
+        if row is None:
+            break
+        started = time.time()
+        status, error = "ok", ""
         try:
-            driver.quit()
-        except Exception:
-            pass
-    logging.info(f"✔️ [{account}]({game_title_code}) 完成並關閉")
+            for _ in range(2):
+                if driver is None:
+                    driver = warm.take() if warm is not None else new_driver()
+                if not REUSE_BROWSER:
+                    break
+                contexts = isolate_account(driver, contexts)
+                if contexts is not None:
+                    break
+                # 無法隔離就不沿用：關掉換一個新的瀏覽器再試一次
+                quit_driver(driver)
+                driver = None
+            if driver is None:
+                raise RuntimeError("無法建立獨立的瀏覽器 context")
+            run_account(driver, row["account"], row["game_title_code"], row["url"])
+        except Exception as e:
+            status, error = "failed", str(e).splitlines()[0] if str(e) else type(e).__name__
+            logging.error(f"❌ [{row['account']}]({row['game_title_code']}) 失敗：{error}")
+            # 出錯的瀏覽器狀態不明，不再沿用
+            if driver is not None:
+                quit_driver(driver, contexts)
+            driver = contexts = None
+        finally:
+            scheduler.done(row)
+        with results_lock:
+            results.append({
+                "account": row["account"], "game_title_code": row["game_title_code"], "status": status,
+                "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+                "elapsed_sec": f"{time.time() - started:.1f}", "worker": threading.current_thread().name, "error": error,
+            })
+        if not REUSE_BROWSER and driver is not None:
+            quit_driver(driver)
+            driver = None
+    if driver is not None:
+        quit_driver(driver, contexts)
+
+def write_results(results: list, path: str):
+    fields = ["account", "game_title_code", "status", "started_at", "elapsed_sec", "worker", "error"]
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(results)
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    logging.info(f"📄 結果摘要已寫入 {path}：" + "、".join(f"{k} {v}" for k, v in counts.items()))
 
 # =========================
 # 主程式
 # =========================
 def main():
-    # Ctrl+C：當前 URL 完成後停止
+    # Ctrl+C：不再開始新的帳號，執行中的帳號跑完後停止
     interrupted = {"flag": False}
     def handle_interrupt(sig, frame):
         interrupted["flag"] = True
-        logging.info("⚠️ 收到中斷，當前 URL 完成後停止")
+        logging.info("⚠️ 收到中斷，執行中的帳號完成後停止")
     signal.signal(signal.SIGINT, handle_interrupt)
 
     # 讀 actions.json（可選）
@@ -383,11 +480,36 @@ def main():
         logging.error("accounts.csv 讀不到任何有效資料")
         return
 
-    # 逐一執行（不要同時全部跑）
-    for row in tasks:
-        if interrupted["flag"]:
-            break
-        run_one(row["account"], row["game_title_code"], row["url"])
+    workers = max(1, min(PARALLEL_WORKERS, len(tasks)))
+    # 預熱：每個 worker 的第一個瀏覽器同時啟動，另備 PREWARM_BROWSERS 個；
+    # 沿用瀏覽器時只需這些（出錯才補開），不沿用時每個帳號都從預熱池取
+    warm_size = min(len(tasks), workers + PREWARM_BROWSERS)
+    warm = WarmDriverPool(new_driver, size=warm_size, total=warm_size if REUSE_BROWSER else len(tasks))
+
+    scheduler = AccountScheduler(tasks, PER_GAME_LIMIT)
+    results, results_lock = [], threading.Lock()
+    started_ts = time.strftime("%Y%m%d_%H%M%S")
+    logging.info(f"共 {len(tasks)} 個帳號，同時執行 {workers} 個（同遊戲最多 {PER_GAME_LIMIT or '不限'} 個）")
+    threads = [
+        threading.Thread(target=account_worker, args=(scheduler, warm, results, results_lock), name=f"Worker-{i + 1}", daemon=True)
+        for i in range(workers)
+    ]
+    try:
+        for t in threads:
+            t.start()
+        # 主執行緒只做短暫 sleep 等待，才能即時處理 Ctrl+C 並停止分派
+        while any(t.is_alive() for t in threads):
+            if interrupted["flag"] and not scheduler.stopped:
+                scheduler.stop()
+            time.sleep(0.2)
+    finally:
+        warm.close()
+        for row in scheduler.remaining():
+            results.append({
+                "account": row["account"], "game_title_code": row["game_title_code"], "status": "skipped",
+                "started_at": "", "elapsed_sec": "", "worker": "", "error": "interrupted",
+            })
+        write_results(results, RESULTS_CSV.format(ts=started_ts))
 
     logging.info("全部任務完成")
 
@@ -1,15 +1,25 @@
 import os
+import re
 import sys
 import json
 import time
-import hashlib
 import logging
 import signal
+import atexit
+import heapq
+import asyncio
+import shutil
+import queue
 import threading
 import traceback
-from dataclasses import dataclass
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 import cv2
 import numpy as np
@@ -21,7 +31,7 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.edge.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
 from pynput import keyboard
 
 try:
@@ -32,6 +42,8 @@ except Exception:  # pragma: no cover
 
 from dotenv import load_dotenv
 
+from web_helpers import BrowserLease, BrowserPool, LobbyIndex, WarmDriverPool, click_positions, resolve_driver_path
+
 # =========================== 常量與初始化 ===========================
 # BASE_DIR: 若是打包成 .exe，取可執行檔所在資料夾；否則取 .py 檔案所在資料夾
 BASE_DIR = Path(getattr(sys, "frozen", False) and Path(sys.executable).parent or Path(__file__).resolve().parent)
@@ -45,6 +57,8 @@ FFMPEG_EXE = BASE_DIR / "ffmpeg.exe"
 EDGEDRIVER_EXE = BASE_DIR / "msedgedriver.exe"
 # 🔹 Manifest 檔案（用來管理 類型→模板、門檻、遮罩）
 TEMPLATES_MANIFEST = BASE_DIR / "templates_manifest.json"
+# 🔹 各機台 Spin 節奏（fixed / burst / adaptive、失敗退避）；不存在時沿用熱鍵的全域頻率
+SPIN_PROFILES = BASE_DIR / "spin_profiles.json"
 
 SCREENSHOT_RTMP.mkdir(parents=True, exist_ok=True)
 SCREENSHOT_DIR.mkdir(parents=True, exist_ok=True)
@@ -52,6 +66,50 @@ SCREENSHOT_DIR.mkdir(parents=True, exist_ok=True)
 # 載入 .env（LARK Webhook 等）
 load_dotenv(BASE_DIR / "dotenv.env")
 LARK_WEBHOOK = os.getenv("LARK_WEBHOOK_URL")
+# Lark 背景推播：佇列上限、同類訊息合併視窗、同類訊息最短發送間隔（秒）
+LARK_QUEUE_SIZE = int(os.getenv("LARK_QUEUE_SIZE", "200"))
+LARK_COALESCE_WINDOW = float(os.getenv("LARK_COALESCE_WINDOW", "3"))
+LARK_KEY_INTERVAL = float(os.getenv("LARK_KEY_INTERVAL", "30"))
+
+# 常駐取幀（每個 rtmp_url 一個常駐 FFmpeg 解碼程序）
+GRABBER_FPS = float(os.getenv("GRABBER_FPS", "5"))                      # 解碼輸出幀率（越高越即時、越吃 CPU）
+GRABBER_STALL_TIMEOUT = float(os.getenv("GRABBER_STALL_TIMEOUT", "10"))  # 超過此秒數無新畫面即重連
+GRABBER_MAX_AGE = float(os.getenv("GRABBER_MAX_AGE", "3"))              # 取用畫面的最大允許延遲（秒）
+FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "8"))               # 每路串流的共享記憶體畫面環形緩衝格數
+# 重複畫面偵測：縮圖逐格灰階差值上限（0~255），不超過即視為同一畫面
+DUP_TOLERANCE = int(os.getenv("DUP_TOLERANCE", "4"))
+# 串流複製錄影（recording_mode="copy"）：常駐以 -c copy 切片保留最近畫面，觸發時連同觸發前一併輸出
+RECORD_PRE_ROLL = float(os.getenv("RECORD_PRE_ROLL", "20"))              # 觸發前保留的秒數
+RECORD_SEGMENT_SECONDS = float(os.getenv("RECORD_SEGMENT_SECONDS", "2"))  # 緩衝切片長度（秒；實際依關鍵幀切）
+# 錄影排程（全程序共用）：同時錄影數、CPU 預算（以「核心」計）、排隊逾時
+RECORD_MAX_CONCURRENT = int(os.getenv("RECORD_MAX_CONCURRENT", "2"))    # 同時執行的重新編碼錄影上限
+RECORD_CPU_BUDGET = float(os.getenv("RECORD_CPU_BUDGET", "2.0"))         # 重新編碼約 1.0 核（串流複製不計入）
+RECORD_QUEUE_TIMEOUT = float(os.getenv("RECORD_QUEUE_TIMEOUT", "60"))   # 重新編碼排隊超過此秒數仍未開始即放棄
+# 模板比對工作池：0 = 在各機台執行緒內直接比對（舊行為）；N = 開 N 個比對程序，建議不超過 CPU 核心數 - 1
+DETECTION_WORKERS = int(os.getenv("DETECTION_WORKERS", "0"))
+DETECTION_TIMEOUT = float(os.getenv("DETECTION_TIMEOUT", "15"))  # 單次比對等待結果的上限（秒）
+STALE_WARN_STREAK = 3  # 連續幾輪因畫面被覆寫而略過偵測時改記 WARNING
+# Spin 結算等待：頁面內觀察到餘額 / Spin 按鈕變動後安靜多久算結算完成，以及最多等多久（正常頻率）
+SPIN_SETTLE_QUIET_MS = int(os.getenv("SPIN_SETTLE_QUIET_MS", "150"))
+# Spin 按鈕不會進入停用狀態的遊戲：餘額需維持多久不變才算結算（毫秒）
+SPIN_SETTLE_IDLE_MS = int(os.getenv("SPIN_SETTLE_IDLE_MS", "1000"))
+SPIN_SETTLE_TIMEOUT = float(os.getenv("SPIN_SETTLE_TIMEOUT", "2.0"))
+# 404 / 錯誤頁檢測間隔（秒）；檢測在頁面內完成，成本很低
+ERROR_PAGE_CHECK_INTERVAL = float(os.getenv("ERROR_PAGE_CHECK_INTERVAL", "5"))
+# keyword_actions / machine_actions 座標批次點擊：每次點擊間隔（毫秒）
+CLICK_PACE_MS = int(os.getenv("CLICK_PACE_MS", "150"))
+# spin_profiles.json 熱重載：最多每幾秒檢查一次檔案是否有變更
+SPIN_PROFILES_RELOAD_INTERVAL = float(os.getenv("SPIN_PROFILES_RELOAD_INTERVAL", "2"))
+# 多機台驅動方式："async"（單一事件迴圈 + 有上限的執行緒池）或 "thread"（每台機台一個執行緒，舊行為）
+AUTOSPIN_ORCHESTRATOR = os.getenv("AUTOSPIN_ORCHESTRATOR", "async").strip().lower()
+ORCHESTRATOR_WORKERS = int(os.getenv("ORCHESTRATOR_WORKERS", "0"))  # async 模式的執行緒上限；0 = 機台數（最多 32）
+# 瀏覽器池：每個 Edge 程序最多放幾台機台（各自獨立的 browser context 與視窗）；0 = 每台機台獨立的 Edge（舊行為）
+BROWSER_POOL_CONTEXTS = int(os.getenv("BROWSER_POOL_CONTEXTS", "0"))
+# 精簡瀏覽器（game_config 的 lean_browser: true）：視窗大小與要擋掉的資源（逗號分隔的 URL 樣式，空白 = 預設清單）
+LEAN_WINDOW_SIZE = tuple(int(x) for x in os.getenv("LEAN_WINDOW_SIZE", "375,667").split(","))
+LEAN_BLOCKED_URLS = [x.strip() for x in os.getenv("LEAN_BLOCKED_URLS", "").split(",") if x.strip()]
+# 預熱：啟動時同時先開幾個瀏覽器（依機台啟動順序取用，取走一個補一個）；0 = 各機台啟動時才冷啟動
+BROWSER_PREWARM = int(os.getenv("BROWSER_PREWARM", "0"))
 
 # 設定 logging 到終端（INFO：一般流程、WARNING：非致命、ERROR：例外）
 logging.basicConfig(
@@ -59,16 +117,45 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
+class _NotifyingEvent(threading.Event):
+    """threading.Event，set / clear 時呼叫已註冊的回呼（AsyncOrchestrator 以此把狀態同步到事件迴圈）"""
+
+    def __init__(self):
+        super().__init__()
+        self._listeners: List[Callable[[], None]] = []
+
+    def add_listener(self, cb: Callable[[], None]) -> None:
+        self._listeners.append(cb)
+
+    def remove_listener(self, cb: Callable[[], None]) -> None:
+        if cb in self._listeners:
+            self._listeners.remove(cb)
+
+    def set(self) -> None:
+        super().set()
+        self._notify()
+
+    def clear(self) -> None:
+        super().clear()
+        self._notify()
+
+    def _notify(self) -> None:
+        for cb in list(self._listeners):
+            try:
+                cb()
+            except Exception:
+                pass  # 事件迴圈已關閉
+
+
 # 全域停止旗標：Ctrl+C 或外部觸發可讓迴圈收斂退出
-stop_event = threading.Event()
-pause_event = threading.Event()   # 置位時代表「暫停」
+stop_event = _NotifyingEvent()
+pause_event = _NotifyingEvent()   # 置位時代表「暫停」
 
 # 全域 spin 頻率控制（秒）
 spin_frequency = 1.0  # 預設 1 秒間隔
 spin_frequency_lock = threading.Lock()  # 保護頻率變數的鎖
-
-# 以來源名稱（rtmp_name）記住上一張影像的 MD5，用來偵測連續重複畫面
-last_image_hash: Dict[str, str] = {}
+# 熱鍵調整過頻率後，所有機台改用全域頻率（覆蓋 spin_profiles.json）；小鍵盤 . 交回各機台節奏
+spin_frequency_override = False
 
 # 特殊機台集合：影響餘額 selector 與 spin 按鈕 selector 的選擇
 SPECIAL_GAMES = {"BULLBLITZ", "ALLABOARD"}
@@ -104,11 +191,18 @@ def _on_press(key):
 
 def _handle_frequency_keys(key):
     """處理頻率調整熱鍵（小鍵盤數字鍵）"""
-    global spin_frequency
+    global spin_frequency, spin_frequency_override
     
     try:
         # 檢查是否為小鍵盤數字鍵（使用 hasattr 檢查 vk 屬性）
         if hasattr(key, 'vk'):
+            # 小鍵盤 .（VK 110）：取消全域頻率覆蓋，回到 spin_profiles.json 的各機台節奏
+            if key.vk == 110:
+                with spin_frequency_lock:
+                    spin_frequency_override = False
+                logging.info("[Hotkey] 取消全域頻率，改回各機台節奏（spin_profiles.json）")
+                print("🎛️  Spin 頻率：各機台節奏（spin_profiles.json）")
+                return
             # 小鍵盤數字鍵的 VK 碼範圍是 0x60-0x69 (96-105)
             numpad_vk_map = {
                 96: 0.01,   # 小鍵盤 0
@@ -144,6 +238,7 @@ def _handle_frequency_keys(key):
                 with spin_frequency_lock:
                     old_freq = spin_frequency
                     spin_frequency = new_freq
+                    spin_frequency_override = True
                     logging.info(f"[Hotkey] Spin 頻率調整：{old_freq:.1f}s → {spin_frequency:.1f}s")
                     
                     # 顯示頻率狀態
@@ -192,7 +287,7 @@ def get_current_frequency_status():
 def start_hotkey_listener():
     logging.info("[Hotkey] 啟動全域熱鍵監聽（Ctrl+Space=Pause/Resume, 小鍵盤數字鍵=頻率調整, Ctrl+Esc=Stop）")
     print("🔧 Hotkeys: Ctrl+Space = Pause/Resume | Ctrl+Esc = Stop")
-    print("🎛️  Spin 頻率: 小鍵盤0=極度危險(0.01s) | 小鍵盤1=極限(0.05s) | 小鍵盤2=超快(0.1s) | 小鍵盤3=快速(0.5s) | 小鍵盤4=正常(1.0s) | 小鍵盤5=慢速(1.5s) | 小鍵盤6=很慢(2.0s) | 小鍵盤7=極慢(3.0s) | 小鍵盤8=非常慢(5.0s) | 小鍵盤9=極度慢(10.0s)")
+    print("🎛️  Spin 頻率: 小鍵盤.=各機台節奏(spin_profiles.json) | 小鍵盤0=極度危險(0.01s) | 小鍵盤1=極限(0.05s) | 小鍵盤2=超快(0.1s) | 小鍵盤3=快速(0.5s) | 小鍵盤4=正常(1.0s) | 小鍵盤5=慢速(1.5s) | 小鍵盤6=很慢(2.0s) | 小鍵盤7=極慢(3.0s) | 小鍵盤8=非常慢(5.0s) | 小鍵盤9=極度慢(10.0s)")
     print(f"📊 當前頻率: {get_current_frequency_status()}")
     listener = keyboard.Listener(on_press=_on_press, on_release=_on_release)
     listener.daemon = True
@@ -200,13 +295,51 @@ def start_hotkey_listener():
 
 
 # =========================== 小工具函式 ===========================
-def file_md5(path: Path) -> str:
-    """計算檔案 MD5（逐塊讀取，避免占用過多記憶體）"""
-    h = hashlib.md5()
-    with path.open("rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+class FrameDupDetector:
+    """
+    以解碼後的畫面偵測 RTMP「連續重複」（串流凍結）：
+    - 畫面先縮成 32x18 灰階縮圖，與同來源上一張縮圖逐格比較，
+      最大差值 <= tolerance 即視為同一畫面（不受重新編碼造成的微小位元差異影響）
+    - 1080p 單張約 0.1 ms，可以每張取到的畫面都檢查
+    - 各來源狀態存在有上限的 OrderedDict（最久未用的先淘汰），多執行緒共用安全
+    """
+
+    THUMB_SIZE = (32, 18)
+
+    def __init__(self, tolerance: int = 4, max_streams: int = 256):
+        self.tolerance = tolerance
+        self.max_streams = max_streams
+        self._state: "OrderedDict[str, Tuple[np.ndarray, int]]" = OrderedDict()  # key -> (縮圖, 連續重複次數)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def thumbnail(cls, frame: np.ndarray) -> np.ndarray:
+        """先 INTER_LINEAR 快速縮小、再 INTER_AREA 平均成縮圖，最後轉灰階"""
+        small = cv2.resize(frame, (cls.THUMB_SIZE[0] * 4, cls.THUMB_SIZE[1] * 4), interpolation=cv2.INTER_LINEAR)
+        small = cv2.resize(small, cls.THUMB_SIZE, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def observe(self, key: str, frame: np.ndarray) -> int:
+        """記錄一張畫面，回傳與上一張相同的「連續重複次數」（0 表示畫面有變化或第一張）"""
+        thumb = self.thumbnail(frame)
+        with self._lock:
+            prev = self._state.pop(key, None)
+            count = 0
+            if prev is not None and prev[0].shape == thumb.shape:
+                if int(cv2.absdiff(prev[0], thumb).max()) <= self.tolerance:
+                    count = prev[1] + 1
+            self._state[key] = (thumb, count)
+            while len(self._state) > self.max_streams:
+                self._state.popitem(last=False)
+            return count
+
+    def reset_count(self, key: str) -> None:
+        """重複次數歸零（保留上一張縮圖，持續凍結會重新累計）"""
+        with self._lock:
+            if key in self._state:
+                self._state[key] = (self._state[key][0], 0)
     
 
 
@@ -221,67 +354,561 @@ def wait_for_all(driver, by, selector, timeout: float = 8.0):
 
 
 def safe_click(driver, elem) -> bool:
-    """通用點擊：先滾動到視窗中，再以 JS click，失敗不拋例外而回傳 False"""
+    """
+    通用點擊：滾動到視窗中並以 JS click，失敗不拋例外而回傳 False
+    JS click 不依賴滾動後的版面是否穩定，因此兩步合併成一次 execute_script，不需要中間等待
+    """
     try:
-        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", elem)
-        time.sleep(0.15)  # 很短暫的穩定延遲
-        driver.execute_script("arguments[0].click();", elem)
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'}); arguments[0].click();", elem)
         return True
     except Exception as e:
         logging.warning(f"safe_click failed: {e}")
         return False
 
+
+class ElementCache:
+    """
+    每個 GameRunner 一份的 WebElement 快取（熱門 selector：Spin 按鈕、餘額、Cashout 按鈕）：
+    - 第一次查詢後保留元素參照，之後直接重用，不再 find_element
+    - 使用時遇到 StaleElementReferenceException（DOM 重建）才重新查詢一次並重試
+    - 換了 driver（重建瀏覽器）時整份快取自動清空
+    - 記錄每個 key 的命中 / 重新查詢 / 失效次數與查詢耗時，report() 可看出省下多少查詢
+    """
+
+    def __init__(self):
+        self._driver_id: Optional[int] = None
+        self._elements: Dict[str, object] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def _stat(self, key: str) -> Dict[str, float]:
+        return self._stats.setdefault(key, {"hit": 0, "miss": 0, "stale": 0, "lookup_ms": 0.0})
+
+    def _check_driver(self, driver) -> None:
+        if self._driver_id != id(driver):
+            self._driver_id = id(driver)
+            self._elements.clear()
+
+    def peek(self, driver, key: str):
+        """取出快取中的元素（不查詢、不驗證）；沒有時回傳 None"""
+        self._check_driver(driver)
+        return self._elements.get(key)
+
+    def put(self, driver, key: str, elem) -> None:
+        self._check_driver(driver)
+        self._elements[key] = elem
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        if key is None:
+            self._elements.clear()
+        else:
+            self._elements.pop(key, None)
+
+    def record(self, key: str, hit: bool, lookup_ms: float = 0.0, stale: bool = False) -> None:
+        """自行查詢的呼叫端（例如 Cashout 多組 selector）用來登記統計"""
+        st = self._stat(key)
+        st["hit" if hit else "miss"] += 1
+        st["lookup_ms"] += lookup_ms
+        if stale:
+            st["stale"] += 1
+
+    def get(self, driver, key: str, by, selector: str, timeout: Optional[float] = None):
+        """
+        取得元素：有快取直接回傳，否則查詢（timeout 有值時以 wait_for 等待出現）
+        查不到時拋出 NoSuchElementException / TimeoutException
+        """
+        self._check_driver(driver)
+        elem = self._elements.get(key)
+        if elem is not None:
+            self._stat(key)["hit"] += 1
+            return elem
+        t0 = time.perf_counter()
+        try:
+            elem = wait_for(driver, by, selector, timeout=timeout) if timeout else driver.find_element(by, selector)
+        finally:
+            st = self._stat(key)
+            st["miss"] += 1
+            st["lookup_ms"] += (time.perf_counter() - t0) * 1000
+        self._elements[key] = elem
+        return elem
+
+    def call(self, driver, key: str, by, selector: str, fn: Callable, timeout: Optional[float] = None):
+        """以快取元素執行 fn(elem)；元素已失效時重新查詢並重試一次"""
+        elem = self.get(driver, key, by, selector, timeout)
+        try:
+            return fn(elem)
+        except StaleElementReferenceException:
+            self._stat(key)["stale"] += 1
+            self._elements.pop(key, None)
+            return fn(self.get(driver, key, by, selector, timeout))
+
+    def report(self) -> str:
+        parts = []
+        for key, st in self._stats.items():
+            total = st["hit"] + st["miss"]
+            if not total:
+                continue
+            avg = st["lookup_ms"] / st["miss"] if st["miss"] else 0.0
+            parts.append(
+                f"{key}: 命中 {int(st['hit'])}/{int(total)}（{st['hit'] / total:.0%}），"
+                f"失效 {int(st['stale'])}，查詢平均 {avg:.1f}ms，約省下 {st['hit'] * avg / 1000:.1f}s"
+            )
+        return "；".join(parts) if parts else "無紀錄"
+
+
+# 頁面內的 Spin 狀態觀察器：MutationObserver 監看餘額文字與 Spin 按鈕，
+# 任一變動就遞增 seq 並記下時間；餘額變動另記 balLast，變動當下 Spin 按鈕為停用狀態則記 busySeq
+# （重複安裝無副作用；頁面重新載入後由下一次 arm 重新安裝）
+# arguments: [餘額 selector, Spin 按鈕 selector]；執行後 w 為觀察器狀態
+_SPIN_WATCH_INSTALL_JS = """
+const balSel = arguments[0], spinSel = arguments[1];
+const isBusy = (el) => !!el && (el.disabled || el.getAttribute('aria-disabled') === 'true' || /disable/i.test(el.className || ''));
+let w = window.__autospinWatch;
+if (!w || w.balSel !== balSel || w.spinSel !== spinSel || w.root !== document.body) {
+  if (w && w.observer) w.observer.disconnect();
+  w = window.__autospinWatch = {
+    balSel: balSel, spinSel: spinSel, seq: 0, last: performance.now(), balLast: 0, busySeq: 0, root: document.body, isBusy: isBusy,
+  };
+  const hit = (n) => n && n.nodeType === 1 && (n.closest(balSel) || n.closest(spinSel) || n.querySelector(balSel) || n.querySelector(spinSel));
+  w.observer = new MutationObserver((muts) => {
+    for (const m of muts) {
+      const t = m.target.nodeType === 1 ? m.target : m.target.parentElement;
+      if ((t && (t.closest(balSel) || t.closest(spinSel))) || Array.prototype.some.call(m.addedNodes, hit)) {
+        w.seq++; w.last = performance.now();
+        if (!t || t.closest(balSel) || Array.prototype.some.call(m.addedNodes, hit)) w.balLast = w.last;
+        if (isBusy(document.querySelector(spinSel))) w.busySeq = w.seq;
+        return;
+      }
+    }
+  });
+  w.observer.observe(document.body, {subtree: true, childList: true, characterData: true, attributes: true, attributeFilter: ['class', 'disabled', 'aria-disabled']});
+}
+"""
+
+# 安裝觀察器並回傳點擊前狀態 → {seq, text, busy}
+_SPIN_WATCH_ARM_JS = _SPIN_WATCH_INSTALL_JS + """
+const bal = document.querySelector(balSel);
+return {seq: w.seq, text: bal ? bal.textContent : null, busy: isBusy(document.querySelector(spinSel))};
+"""
+
+# 等待 Spin 結算（execute_async_script），arm 之後須觀察到變動且 Spin 按鈕不在停用狀態：
+# - 有看到 Spin 按鈕「停用 → 恢復」：最後一次變動後安靜 quietMs 毫秒即回報
+# - 始終沒看到停用（按鈕 class 不帶 disable 的遊戲）：扣注後的餘額變動不代表結算，
+#   須餘額 idleMs 毫秒都沒有再變動才回報（避免讀到派彩入帳前的餘額）
+# 逾時則回報目前狀態（settled=false）
+# arguments: [arm 時的 seq, quietMs, idleMs, timeoutMs, callback] → {settled, changed, busy_seen, text, ms}
+_SPIN_WATCH_WAIT_JS = """
+const seq0 = arguments[0], quietMs = arguments[1], idleMs = arguments[2], timeoutMs = arguments[3];
+const done = arguments[arguments.length - 1];
+const w = window.__autospinWatch;
+const t0 = performance.now();
+let busySeen = !!w && w.busySeq > seq0;
+const read = () => { const b = w && document.querySelector(w.balSel); return b ? b.textContent : null; };
+(function tick() {
+  const now = performance.now();
+  // 觀察器不存在（arm 與等待之間頁面重新載入）：不能判斷結算，直接回報 settled=false
+  if (!w) return done({settled: false, changed: false, busy_seen: false, text: null, ms: now - t0});
+  const changed = w.seq !== seq0;
+  const busy = w.isBusy(document.querySelector(w.spinSel));
+  busySeen = busySeen || busy || w.busySeq > seq0;
+  const quiet = busySeen ? now - w.last >= quietMs : now - Math.max(w.balLast, t0) >= idleMs;
+  if (changed && !busy && quiet) return done({settled: true, changed: true, busy_seen: busySeen, text: read(), ms: now - t0});
+  if (now - t0 >= timeoutMs) return done({settled: false, changed: changed, busy_seen: busySeen, text: read(), ms: now - t0});
+  setTimeout(tick, 20);
+})();
+"""
+
+# 以觀察器記下的 selector 點擊 Spin（同步 execute_script，點擊與等待結算分開：
+# 等待途中頁面重新載入 / 逾時拋出例外時，才能確定按鈕已點過，不會再點第二次而重複下注）
+# 須先以 _SPIN_WATCH_ARM_JS 或 _PAGE_PROBE_JS 安裝觀察器；回傳 {clicked}，觀察器或按鈕不存在時為 false
+_SPIN_CLICK_JS = """
+const w0 = window.__autospinWatch;
+const btn = w0 && document.querySelector(w0.spinSel);
+if (!btn) return {clicked: false};
+btn.scrollIntoView({block: 'center'});
+btn.click();
+return {clicked: true};
+"""
+
+# 遊戲中 / 大廳判斷（與 GameRunner._is_in_game 的 selector 相同），回傳 "game" / "lobby" / "unknown"
+_PAGE_STATE_BODY_JS = """
+const shown = (sel) => Array.prototype.some.call(document.querySelectorAll(sel), (el) => el.getClientRects().length > 0);
+const pageState = () => {
+  if (shown('.my-button.btn_spin') || shown('.balance-bg.hand_balance') || shown('.h-balance.hand_balance')) return 'game';
+  if (shown('#grid_gm_item')) return 'lobby';
+  return 'unknown';
+};
+"""
+_PAGE_STATE_JS = _PAGE_STATE_BODY_JS + "return pageState();"
+
+# 404 / 錯誤頁標記（與 is_404_page 相同規則；內文只取前 2000 字，不經 WebDriver 傳整份 page_source）
+# 內文用 textContent（不觸發版面計算）；Spin 迴圈的快照只在檢測到期或換頁時才呼叫 errorPage()
+_ERROR_PAGE_BODY_JS = """
+const errorPage = () => {
+  const title = (document.title || '').toLowerCase();
+  if (title.indexOf('404') >= 0 || title.indexOf('not found') >= 0) return 'title';
+  const text = ((document.body && document.body.textContent) || '').slice(0, 2000).toLowerCase();
+  if (text.indexOf('404 not found') >= 0 || text.indexOf('nginx/1.20.1') >= 0) return 'content';
+  if (location.href.toLowerCase().indexOf('404') >= 0) return 'url';
+  return null;
+};
+"""
+
+_ERROR_PAGE_SOURCES = {"title": "標題", "content": "內容", "url": "URL"}
+_ERROR_PAGE_JS = _ERROR_PAGE_BODY_JS + "return errorPage();"
+
+# 導覽事件計數：攔截 history.pushState / replaceState 與 popstate / hashchange（SPA 換頁），
+# 整頁重新載入後 window 被重置，fresh 為 true
+_NAV_WATCH_BODY_JS = """
+let nav = window.__autospinNav;
+const fresh = !nav;
+if (!nav) {
+  nav = window.__autospinNav = {seq: 0};
+  const bump = () => { nav.seq++; };
+  ['pushState', 'replaceState'].forEach((k) => {
+    const orig = history[k];
+    if (typeof orig === 'function') history[k] = function () { const r = orig.apply(this, arguments); bump(); return r; };
+  });
+  window.addEventListener('popstate', bump);
+  window.addEventListener('hashchange', bump);
+}
+"""
+
+# Spin 迴圈每輪一次的頁面快照（同時安裝 Spin 觀察器），一次 execute_script 取得所有判斷依據
+# arguments: [餘額 selector, Spin 按鈕 selector, 404 檢測是否到期, 上次檢測時的導覽事件計數]
+# 404 檢測未到期且沒有換頁時不讀內文（error_checked=false）
+_PAGE_PROBE_JS = _SPIN_WATCH_INSTALL_JS + _PAGE_STATE_BODY_JS + _ERROR_PAGE_BODY_JS + _NAV_WATCH_BODY_JS + """
+const bal = document.querySelector(balSel);
+const spin = document.querySelector(spinSel);
+const checkErrors = !!arguments[2] || fresh || nav.seq !== arguments[3];
+return {
+  seq: w.seq,
+  text: bal ? bal.textContent : null,
+  state: pageState(),
+  spin_present: !!spin && spin.getClientRects().length > 0,
+  busy: isBusy(spin),
+  cashout: shown('.handle-main .btn_cashout') || shown(".handle-main [class*='cashout']"),
+  error_page: checkErrors ? errorPage() : null,
+  error_checked: checkErrors,
+  nav_seq: nav.seq,
+  fresh: fresh,
+};
+"""
+
+
+@dataclass
+class PageSnapshot:
+    """_PAGE_PROBE_JS 的結果：Spin 迴圈每輪的判斷都以此為準，不再各自查詢 DOM"""
+    balance: Optional[int]
+    state: str                    # "game" / "lobby" / "unknown"
+    spin_present: bool
+    spin_enabled: bool
+    cashout_visible: bool
+    error_page: Optional[str]     # 404 標記來源（"title" / "content" / "url"），None 表示正常（或本輪未檢測）
+    armed: dict                   # 觀察器狀態（{seq, text, busy}），供點擊後等待結算
+    nav_seq: int = 0              # 頁面內導覽事件計數（SPA 換頁）
+    fresh_document: bool = False  # 上一次快照之後整頁重新載入過
+    error_checked: bool = True    # 本輪快照是否有檢測 404（未到期且未換頁時略過）
+
+    @property
+    def in_game(self) -> bool:
+        """無法判斷時視為在遊戲中（與 _is_in_game 相同的保守策略）"""
+        return self.state != "lobby"
+
+    @property
+    def spin_ready(self) -> bool:
+        return self.state == "game" and self.spin_present and self.spin_enabled
+
+    @classmethod
+    def from_probe(cls, raw: dict) -> "PageSnapshot":
+        nums = "".join(ch for ch in (raw.get("text") or "") if ch.isdigit())
+        return cls(
+            balance=int(nums) if nums else None,
+            state=raw.get("state") or "unknown",
+            spin_present=bool(raw.get("spin_present")),
+            spin_enabled=not raw.get("busy"),
+            cashout_visible=bool(raw.get("cashout")),
+            error_page=raw.get("error_page"),
+            armed={"seq": raw.get("seq", 0), "text": raw.get("text"), "busy": raw.get("busy")},
+            nav_seq=int(raw.get("nav_seq") or 0),
+            fresh_document=bool(raw.get("fresh")),
+            error_checked=bool(raw.get("error_checked", True)),
+        )
+
+
+def wait_page_state(driver, want: str, timeout: float = 8.0) -> bool:
+    """等待頁面進入指定狀態（"game" 或 "lobby"），每 0.1 秒在頁面內檢查一次；逾時回傳 False，不拋例外"""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(lambda d: d.execute_script(_PAGE_STATE_JS) == want)
+        return True
+    except TimeoutException:
+        return False
+    except Exception as e:
+        logging.debug(f"等待頁面狀態 {want} 時發生錯誤: {e}")
+        return False
+
+# =========================== Edge 啟動設定 ===========================
+MOBILE_USER_AGENT = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.127 Mobile Safari/537.36"
+)
+MOBILE_WINDOW_SIZE = (432, 859)
+
+# 精簡模式預設擋掉的資源：影音、字型、照片類大圖（jpg / webp / gif）、第三方追蹤
+# png / svg 保留（按鈕、圖示多半是這兩種）；Runner 只讀 DOM 文字與元素狀態，不依賴這些資源
+LEAN_DEFAULT_BLOCKED_URLS = [
+    "*.mp4", "*.webm", "*.m3u8", "*.ts", "*.flv", "*.mp3", "*.ogg", "*.m4a", "*.wav",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.jpg", "*.jpeg", "*.webp", "*.gif",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*facebook.net*", "*hotjar.com*", "*clarity.ms*",
+]
+
+# 精簡模式的啟動參數：headless、關閉背景節流（視窗不在前景時計時器 / 渲染不降速）、靜音、不載入擴充功能
+LEAN_EDGE_ARGS = [
+    "--headless=new",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-features=CalculateNativeWinOcclusion",
+    "--mute-audio",
+    "--disable-extensions",
+]
+
+
+def build_edge_options(incognito: bool = True, lean: bool = False) -> "webdriver.EdgeOptions":
+    """
+    機台用的 Edge 選項：偽裝 iPhone UA（頁面走行動版流程）、行動版視窗大小、無痕模式
+    lean=True 時改為精簡模式：headless、較小的視窗（LEAN_WINDOW_SIZE）、關閉背景節流
+    """
+    edge_options = webdriver.EdgeOptions()
+    edge_options.add_argument(f"--user-agent={MOBILE_USER_AGENT}")
+    w, h = LEAN_WINDOW_SIZE if lean else MOBILE_WINDOW_SIZE
+    edge_options.add_argument(f"--window-size={w},{h}")
+    if incognito:
+        edge_options.add_argument("--incognito")
+    if lean:
+        for arg in LEAN_EDGE_ARGS:
+            edge_options.add_argument(arg)
+    return edge_options
+
+
+def apply_lean_blocking(driver) -> int:
+    """
+    以 DevTools Network.setBlockedURLs 擋掉精簡模式不需要的資源（需在載入遊戲 URL 前呼叫）
+
+    返回:
+        int: 生效的 URL 樣式數量
+    """
+    patterns = LEAN_BLOCKED_URLS or LEAN_DEFAULT_BLOCKED_URLS
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    return len(patterns)
+
+
+def edgedriver_service() -> Service:
+    """
+    優先使用同目錄的 msedgedriver.exe；若不存在，嘗試使用 webdriver_manager 自動下載
+    （路徑每個程序只解析一次，多台機台同時啟動也只會下載一次）
+
+    異常:
+        RuntimeError: 找不到 msedgedriver.exe 且未安裝 webdriver_manager
+    """
+    installer = (lambda: EdgeChromiumDriverManager().install()) if EdgeChromiumDriverManager is not None else None
+    try:
+        path = resolve_driver_path(EDGEDRIVER_EXE, installer)
+    except FileNotFoundError:
+        raise RuntimeError("找不到 msedgedriver.exe，且未安裝 webdriver_manager")
+    return Service(executable_path=path)
+
+
+def new_edge_driver(lean: bool = False):
+    """啟動一個獨立的 Edge（停在 about:blank）；預熱池與冷啟動共用"""
+    return webdriver.Edge(service=edgedriver_service(), options=build_edge_options(lean=lean))
+
+
+def new_browser_pool(contexts_per_host: int) -> BrowserPool:
+    """
+    建立機台共用的瀏覽器池（共用 Edge 不開無痕：各機台的 browser context 本身即彼此隔離的無痕環境）
+    profile="lean" 的機台（lean_browser）使用另外的 headless 共用 Edge
+    """
+    def attach(address: str):
+        options = webdriver.EdgeOptions()
+        options.debugger_address = address
+        return webdriver.Edge(service=edgedriver_service(), options=options)
+
+    return BrowserPool(
+        new_host=lambda profile: webdriver.Edge(
+            service=edgedriver_service(), options=build_edge_options(incognito=False, lean=(profile == "lean"))
+        ),
+        attach=attach,
+        contexts_per_host=contexts_per_host,
+        window_size=MOBILE_WINDOW_SIZE,
+    )
+
+
 # =========================== Lark 機器人 ===========================
 class LarkClient:
-    """極簡 Lark 文本通知客戶端，內建重試機制與明確日誌"""
+    """
+    非同步 Lark 文本通知客戶端：
+    - send_text() 只把訊息放進有界佇列就返回，永遠不會卡住 Spin 迴圈（佇列滿時丟棄並記錄）
+    - 單一背景執行緒以 requests.Session 發送（連線池 + keep-alive），內建重試機制與明確日誌
+    - 帶 key 的訊息在 coalesce_window 秒內合併成一則彙整；同一 key 兩次發送至少間隔 key_interval 秒，
+      期間累積的訊息併入下一則彙整（例如多台機台同時推播「RTMP 畫面連續重複」）
+    - 未帶 key 的訊息不合併、不限流，依序立即發送
+    """
 
-    def __init__(self, webhook: Optional[str]):
+    def __init__(
+        self,
+        webhook: Optional[str],
+        queue_size: int = 200,
+        coalesce_window: float = 3.0,
+        key_interval: float = 30.0,
+        max_digest_lines: int = 20,
+    ):
         self.webhook = (webhook or "").strip()
         self.enabled = bool(self.webhook)
+        self.coalesce_window = float(coalesce_window)
+        self.key_interval = float(key_interval)
+        self.max_digest_lines = int(max_digest_lines)
+        self._queue: "queue.Queue[Optional[Tuple[Optional[str], str, float]]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._session: Optional[requests.Session] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "dropped": 0, "coalesced": 0}
         if not self.enabled:
             logging.warning("[Lark] LARK_WEBHOOK_URL 未設定，推播停用")
         else:
             logging.info(f"[Lark] Webhook 已載入（長度={len(self.webhook)}）")
 
-    def send_text(self, text: str, retries: int = 2, timeout: float = 6.0):
+    def send_text(self, text: str, key: Optional[str] = None) -> bool:
         """
-        發送文本訊息到 Lark Webhook
+        把文本訊息排入背景發送佇列（不等待網路）
         
         參數:
             text (str): 要發送的訊息內容
-            retries (int): 重試次數，預設 2 次
-            timeout (float): 請求超時時間（秒），預設 6.0 秒
+            key (Optional[str]): 合併 / 限流用的類別鍵（例如 "dup"）；None 表示不合併、立即發送
             
         返回:
-            bool: True 表示發送成功，False 表示失敗或未啟用
-            
-        流程:
-        1. 檢查是否啟用（webhook 是否存在）
-        2. 建立請求 payload
-        3. 發送 POST 請求（帶重試機制）
-        4. 檢查回應狀態碼
+            bool: True 表示已排入佇列，False 表示未啟用、已關閉或佇列已滿
+        """
+        if not self.enabled or self._closed:
+            logging.debug("[Lark] 已停用，略過訊息：%s", text[:60])
+            return False
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((key, text, time.time()))
+        except queue.Full:
+            self._count("dropped")
+            logging.warning("[Lark] 發送佇列已滿，丟棄訊息：%s", text[:60])
+            return False
+        self._count("queued")
+        return True
+
+    def flush(self, timeout: float = 10.0) -> None:
+        """關閉佇列並等待背景執行緒把剩餘訊息（含尚未到期的彙整）送完，程式結束時呼叫"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logging.warning("[Lark] 佇列已滿，結束時可能遺失部分訊息")
+        thread.join(timeout=timeout)
+        if self._session is not None:
+            self._session.close()
+        stats = self.snapshot_stats()
+        logging.info(
+            "[Lark] 統計：排入 %d、發送成功 %d、失敗 %d、丟棄 %d、合併 %d",
+            stats["queued"], stats["sent"], stats["failed"], stats["dropped"], stats["coalesced"],
+        )
+
+    def snapshot_stats(self) -> Dict[str, int]:
+        """回傳統計數字的副本（各機台執行緒與背景執行緒都會更新，讀取時同樣要持鎖）"""
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    # ---------- 背景執行緒 ----------
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="LarkNotifier", daemon=True)
+                self._thread.start()
+
+    def _worker(self) -> None:
+        pending: "OrderedDict[str, List[str]]" = OrderedDict()  # key -> 待合併訊息
+        due_at: Dict[str, float] = {}        # key -> 最早可發送時間
+        last_sent: Dict[str, float] = {}     # key -> 上次發送時間（限流用）
+        seq = 0
+        closing = False
+        while True:
+            now = time.time()
+            # 到期（或結束中）的 key 依排入順序發送
+            for k in [k for k in pending if closing or due_at[k] <= now]:
+                lines = pending.pop(k)
+                due_at.pop(k, None)
+                self._post(self._digest(lines))
+                last_sent[k] = time.time()
+            if closing and self._queue.empty():
+                return
+            wait = min(due_at.values()) - time.time() if due_at else 1.0
+            try:
+                item = self._queue.get(timeout=max(0.01, min(wait, 1.0)))
+            except queue.Empty:
+                continue
+            if item is None:
+                closing = True
+                continue
+            key, text, ts = item
+            if key is None:
+                seq += 1
+                k = f"#{seq}"  # 不合併：每則獨立、立即到期
+                pending[k] = [text]
+                due_at[k] = ts
+                continue
+            k = f"key:{key}"
+            if k in pending:
+                pending[k].append(text)
+                self._count("coalesced")
+            else:
+                pending[k] = [text]
+                due_at[k] = max(ts + self.coalesce_window, last_sent.get(k, 0.0) + self.key_interval)
+
+    def _digest(self, lines: List[str]) -> str:
+        if len(lines) == 1:
+            return lines[0]
+        shown = lines[: self.max_digest_lines]
+        body = "\n".join(f"• {t}" for t in shown)
+        more = len(lines) - len(shown)
+        tail = f"\n…另有 {more} 則未列出" if more > 0 else ""
+        return f"📦 彙整 {len(lines)} 則通知：\n{body}{tail}"
+
+    def _post(self, text: str, retries: int = 2, timeout: float = 6.0) -> bool:
+        """
+        實際發送到 Lark Webhook（只在背景執行緒呼叫）
         
         異常處理:
-        - 未啟用：直接返回 False，不記錄敏感資訊
         - 請求失敗：記錄錯誤但不洩露 webhook URL
         - 非 2xx 回應：記錄狀態碼和錯誤訊息（截取前 200 字元）
         - 最終失敗：記錄最後一次錯誤
-        
-        注意:
-        - 不會在日誌中記錄完整的 webhook URL
-        - 錯誤訊息會截取前 200 字元以避免過長
         """
-        if not self.enabled:
-            logging.debug("[Lark] 已停用，略過訊息：%s", text[:60])
-            return False
-
+        if self._session is None:
+            self._session = requests.Session()
         payload = {"msg_type": "text", "content": {"text": text}}
         last_err = None
         for i in range(retries + 1):
             try:
-                r = requests.post(self.webhook, json=payload, timeout=timeout)
+                r = self._session.post(self.webhook, json=payload, timeout=timeout)
                 if r.status_code >= 200 and r.status_code < 300:
                     logging.info("[Lark] 推播成功")
+                    self._count("sent")
                     return True
                 else:
                     # 只記錄狀態碼和錯誤訊息，不記錄完整回應（可能包含敏感資訊）
@@ -296,22 +923,141 @@ class LarkClient:
             except Exception as e:
                 last_err = e
                 logging.warning("[Lark] 未知錯誤 (try %d/%d)：%s", i+1, retries+1, str(e))
-            time.sleep(0.8 * (i + 1))  # backoff
+            time.sleep(0.8 * (i + 1))  # backoff（只影響背景執行緒）
 
         logging.error("[Lark] 最終失敗：%s", last_err)
+        self._count("failed")
         return False
 
 # =========================== 模板比對（OpenCV） ===========================
+@dataclass
+class CompiledTemplate:
+    """manifest 中單一模板規格編譯後的結果：影像、遮罩、門檻都已就緒，比對時不需再查表"""
+    file: str
+    image: np.ndarray
+    mask: Optional[np.ndarray] = None
+    threshold: Optional[float] = None  # 模板 > 類型；皆未設定時為 None（比對時套用 default_threshold）
+    when: Optional[dict] = None
+    roi: Optional[Tuple[float, float, float, float]] = None  # 搜尋區域 [x, y, w, h]（像素，或 0~1 的畫面比例）
+    roi_units: str = "auto"  # "px" / "ratio"；"auto" 時四個值都在 0~1 之間即視為比例
+    roi_margin: int = 32  # 搜尋區域外擴像素
+    roi_learn: bool = False  # 是否依歷次最佳比對位置自動學習搜尋區域
+    match_mode: str = "exact"  # "exact"：全解析度比對；"pyramid"：先縮小粗比對，再只在前 top_k 個峰值附近精比對
+    pyramid_scale: float = 0.5
+    pyramid_top_k: int = 3
+    image_small: Optional[np.ndarray] = None  # pyramid 用的縮小模板（編譯時預先算好）
+    mask_small: Optional[np.ndarray] = None
+
+
+@dataclass
+class LearnedRoi:
+    """自動學習的搜尋區域：歷次「未觸發（模板確實存在）」時最佳比對位置的外框"""
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+    samples: int = 1
+    # 落在外框以外的位置先記在這裡 [x, y, 次數]，同一位置再出現才擴張外框（單次離群值不會把區域永久撐大）
+    pending: List[List[int]] = field(default_factory=list)
+
+
+@dataclass
+class TemplateScore:
+    """單張模板在一張畫面上的比對結果"""
+    file: str
+    score: float
+    thr: float
+    loc: Tuple[int, int] = (0, 0)
+
+
+@dataclass
+class BatchMatchResult:
+    """
+    一次批次比對的結果：每個類型所有模板的分數（依 manifest 順序），畫面前處理只做一次
+    - low_hits：分數 <= 門檻（一般模板，低分觸發）
+    - high_hits：分數 >= 門檻（錯誤模板，高分觸發）
+    """
+    scores: Dict[str, List[TemplateScore]]
+    elapsed_ms: float = 0.0
+
+    def low_hits(self, type_name: Optional[str]) -> List[TemplateScore]:
+        return [t for t in self.scores.get(type_name or "", []) if t.score <= t.thr]
+
+    def high_hits(self, type_name: Optional[str]) -> List[TemplateScore]:
+        return [t for t in self.scores.get(type_name or "", []) if t.score >= t.thr]
+
+    def report(self, type_name: Optional[str]) -> dict:
+        """轉成 detect_by_manifest(return_report=True) 的舊格式（hit 依低分觸發判斷）"""
+        return {
+            "type": type_name,
+            "templates": [
+                {"file": t.file, "score": t.score, "thr": t.thr, "hit": t.score <= t.thr}
+                for t in self.scores.get(type_name or "", [])
+            ],
+        }
+
+
+@dataclass
+class DetectionVerdict:
+    """
+    一般模板 + 錯誤模板合併判定的結果
+    - kind="normal"：一般模板低分觸發（score <= thr）→ 錄影
+    - kind="error"：錯誤模板高分觸發（score >= thr）→ 只截圖
+    - kind="none"：皆未觸發
+    file / score / thr 為觸發的那張模板；result 保留本次所有模板分數
+    """
+    NORMAL = "normal"
+    ERROR = "error"
+    NONE = "none"
+
+    kind: str
+    file: Optional[str] = None
+    score: Optional[float] = None
+    thr: Optional[float] = None
+    result: Optional[BatchMatchResult] = None
+
+    @property
+    def triggered(self) -> bool:
+        return self.kind != self.NONE
+
+
+class _FrameContext:
+    """單張畫面的前處理快取：灰階只轉一次，pyramid 縮小圖依（區域, 倍率）快取，供同一張畫面的所有模板共用"""
+
+    def __init__(self, image_bgr: np.ndarray):
+        self.gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY) if image_bgr.ndim == 3 else image_bgr
+        self._levels: Dict[Tuple[int, int, int, int, float], np.ndarray] = {}
+
+    def level(self, region: Tuple[int, int, int, int], scale: float) -> np.ndarray:
+        key = (*region, scale)
+        small = self._levels.get(key)
+        if small is None:
+            x0, y0, x1, y1 = region
+            w, h = x1 - x0, y1 - y0
+            small = cv2.resize(
+                self.gray[y0:y1, x0:x1], (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA
+            )
+            self._levels[key] = small
+        return small
+
+
 class TemplateMatcher:
     """
     以 OpenCV 做模板比對。
     ✅ 增強：
       - 支援讀取 templates_manifest.json，依「類型」精準指定模板與門檻
       - 支援每模板專屬 threshold 與可選 mask
+      - manifest 於啟動時編譯成模板庫：(type, rtmp, title) → 已就緒的模板清單，比對只需一次查表
+      - 比對所需的 rtmp / title 由呼叫端以參數帶入，不再寫入共用 matcher 的屬性（多執行緒安全）
       - 仍保留原本 detect()/detect_by_type() 介面以相容舊呼叫
     """
 
-    def __init__(self, template_dir: Path, manifest_path: Optional[Path] = None):
+    ROI_LEARN_MIN_SAMPLES = 5     # 學習區域至少累積幾次觀測才啟用
+    ROI_LEARN_CONFIRM = 2         # 外框以外的位置需出現幾次才擴張外框
+    ROI_LEARN_MAX_PENDING = 8     # 每個學習區域最多記住幾個待確認位置
+    ROI_LEARN_SAVE_INTERVAL = 60  # 學習結果寫檔的最短間隔（秒）
+
+    def __init__(self, template_dir: Path, manifest_path: Optional[Path] = None, roi_learn_path: Optional[Path] = None):
         if not template_dir.is_dir():
             raise RuntimeError(f"找不到模板資料夾: {template_dir}")
 
@@ -321,6 +1067,8 @@ class TemplateMatcher:
         self.manifest = None
         if manifest_path is None:
             manifest_path = template_dir.parent / "templates_manifest.json"
+        if roi_learn_path is None:
+            roi_learn_path = manifest_path.parent / "templates_roi_learned.json"
         if manifest_path.exists():
             try:
                 self.manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
@@ -343,22 +1091,29 @@ class TemplateMatcher:
                 else:
                     logging.warning(f"[Template] 載入失敗：{p}")
 
-        # mask 採 lazy 載入：先設 None
-        for name in self.templates_all.keys():
-            self.masks_all[name] = None
-
         # 舊介面（無 manifest 時使用）
         self.templates: List[Tuple[str, np.ndarray]] = [(n, self.templates_all[n]) for n in sorted(self.templates_all.keys())]
         logging.info(f"[Template] 可用模板數：{len(self.templates_all)}（有/無 manifest 均可運作）")
 
+        # ── 編譯 manifest：type → 已就緒的模板清單（含 when 條件），(type, rtmp, title) 索引於 prepare/首次查詢時建立 ──
+        self._type_bank: Dict[str, List[CompiledTemplate]] = self._compile_manifest()
+        self._index: Dict[Tuple[str, str, str], List[CompiledTemplate]] = {}
+        self._index_lock = threading.Lock()
+
+        # ── 自動學習的搜尋區域：(模板檔名, rtmp) → LearnedRoi，跨次啟動沿用 ──
+        self.roi_learn_path = roi_learn_path
+        self._learned_roi: Dict[Tuple[str, str], LearnedRoi] = self._load_learned_roi()
+        self._learned_lock = threading.Lock()
+        self._learned_dirty = False
+        self._learned_saved_at = 0.0
+
     # ---------- 基礎工具 ----------
     def _resolve_mask(self, mask_name: Optional[str]) -> Optional[np.ndarray]:
         """依檔名回傳灰階遮罩（0/255）。不存在或讀取失敗則回 None。"""
         if not mask_name:
             return None
-        cached = self.masks_all.get(mask_name, None)
-        if cached is not None:
-            return cached
+        if mask_name in self.masks_all:
+            return self.masks_all[mask_name]
 
         candidates = list(self.template_dir.rglob(mask_name))
         if not candidates:
@@ -381,17 +1136,367 @@ class TemplateMatcher:
         """由檔名取出已載入的模板影像"""
         return self.templates_all.get(file_name)
 
+    # ---------- Manifest 編譯與索引 ----------
+    def _compile_manifest(self) -> Dict[str, List[CompiledTemplate]]:
+        """啟動時把 manifest 每個 type 的模板規格編譯成 CompiledTemplate（影像、遮罩、有效門檻一次備妥）"""
+        bank: Dict[str, List[CompiledTemplate]] = {}
+        if self.manifest is None:
+            return bank
+
+        manifest_margin = int(self.manifest.get("roi_margin", 32))
+        manifest_learn = bool(self.manifest.get("roi_learn", False))
+        for type_name, type_cfg in (self.manifest.get("types", {}) or {}).items():
+            type_threshold = type_cfg.get("threshold", None)
+            type_roi = type_cfg.get("roi")
+            type_roi_units = str(type_cfg.get("roi_units", "auto")).lower()
+            type_margin = int(type_cfg.get("roi_margin", manifest_margin))
+            type_learn = bool(type_cfg.get("roi_learn", manifest_learn))
+            type_mode = str(type_cfg.get("match_mode", "exact")).lower()
+            type_pyramid = type_cfg.get("pyramid", {}) or {}
+            compiled: List[CompiledTemplate] = []
+            for spec in type_cfg.get("templates", []) or []:
+                file = spec.get("file")
+                if not file:
+                    continue
+                tpl_img = self._find_file_image(file)
+                if tpl_img is None:
+                    logging.warning(f"[Template] 類型 {type_name}：找不到模板影像 {file}，已略過")
+                    continue
+                mask = self._resolve_mask(spec.get("mask"))
+                if mask is not None and mask.shape != tpl_img.shape:
+                    logging.warning(f"[Template] 類型 {type_name}：{file} 的 mask 尺寸不符，改為不使用 mask")
+                    mask = None
+                thr = spec.get("threshold", type_threshold)
+                roi = spec.get("roi", type_roi)
+                if roi is not None and (not isinstance(roi, (list, tuple)) or len(roi) != 4):
+                    logging.warning(f"[Template] 類型 {type_name}：{file} 的 roi 格式應為 [x, y, w, h]，已忽略")
+                    roi = None
+                roi_units = str(spec.get("roi_units", type_roi_units)).lower()
+                if roi_units not in ("auto", "px", "ratio"):
+                    logging.warning(f"[Template] 類型 {type_name}：{file} 未知的 roi_units '{roi_units}'，改用 auto")
+                    roi_units = "auto"
+                mode = str(spec.get("match_mode", type_mode)).lower()
+                if mode not in ("exact", "pyramid"):
+                    logging.warning(f"[Template] 類型 {type_name}：未知的 match_mode '{mode}'，改用 exact")
+                    mode = "exact"
+                pyramid = {**type_pyramid, **(spec.get("pyramid", {}) or {})}
+                tpl = CompiledTemplate(
+                    file=file,
+                    image=tpl_img,
+                    mask=mask,
+                    threshold=float(thr) if thr is not None else None,
+                    when=spec.get("when"),
+                    roi=tuple(roi) if roi is not None else None,
+                    roi_units=roi_units,
+                    roi_margin=int(spec.get("roi_margin", type_margin)),
+                    roi_learn=bool(spec.get("roi_learn", type_learn)),
+                    match_mode=mode,
+                    pyramid_scale=float(pyramid.get("scale", 0.5)),
+                    pyramid_top_k=int(pyramid.get("top_k", 3)),
+                )
+                if mode == "pyramid":
+                    self._build_pyramid_level(tpl)
+                compiled.append(tpl)
+            bank[type_name] = compiled
+        logging.info(f"[Template] manifest 編譯完成：{len(bank)} 個類型，{sum(len(v) for v in bank.values())} 張模板")
+        return bank
+
+    @staticmethod
+    def _when_matches(cond: Optional[dict], rtmp: str, title: str) -> bool:
+        """when 條件：rtmp/title 精確比對，contains 為包含判斷"""
+        if not cond:
+            return True
+        if "rtmp" in cond and cond["rtmp"] != rtmp:
+            return False
+        if "title" in cond and cond["title"] != title:
+            return False
+        contains = cond.get("contains", {})
+        if isinstance(contains, dict):
+            for k, v in contains.items():
+                if k == "rtmp":
+                    src = rtmp
+                elif k == "title":
+                    src = title
+                else:
+                    continue
+                if v not in src:
+                    return False
+        return True
+
+    def prepare(self, type_name: Optional[str], rtmp: Optional[str] = None, title: Optional[str] = None) -> List[CompiledTemplate]:
+        """
+        取得 (type, rtmp, title) 對應的模板清單；第一次查詢時依 when 條件過濾並寫入索引。
+        main / GameRunner 啟動時先對每台機台呼叫一次，之後偵測只是一次 dict 查表。
+        """
+        key = (type_name or "", rtmp or "", title or "")
+        entries = self._index.get(key)
+        if entries is not None:
+            return entries
+        with self._index_lock:
+            entries = self._index.get(key)
+            if entries is None:
+                entries = [t for t in self._type_bank.get(key[0], []) if self._when_matches(t.when, key[1], key[2])]
+                self._index[key] = entries
+        return entries
+
+    # ---------- 搜尋區域（ROI） ----------
+    def _load_learned_roi(self) -> Dict[Tuple[str, str], LearnedRoi]:
+        if self.roi_learn_path is None or not self.roi_learn_path.exists():
+            return {}
+        try:
+            raw = json.loads(self.roi_learn_path.read_text(encoding="utf-8"))
+            learned = {}
+            for key, v in raw.items():
+                file, _, rtmp = key.partition("|")
+                learned[(file, rtmp)] = LearnedRoi(*[int(x) for x in v["box"]], samples=int(v.get("samples", 0)))
+            logging.info(f"[Template] 載入已學習搜尋區域 {len(learned)} 筆：{self.roi_learn_path.name}")
+            return learned
+        except Exception as e:
+            logging.warning(f"[Template] 讀取已學習搜尋區域失敗（忽略）：{e}")
+            return {}
+
+    def _learned_roi_snapshot(self) -> Dict[str, dict]:
+        """學習區域的序列化格式（與 JSON 檔相同）；呼叫端需持有 _learned_lock"""
+        return {
+            f"{file}|{rtmp}": {"box": [r.x0, r.y0, r.x1, r.y1], "samples": r.samples}
+            for (file, rtmp), r in self._learned_roi.items()
+        }
+
+    def export_learned_roi(self, min_interval: float = 0.0) -> Optional[Dict[str, dict]]:
+        """
+        取出學習區域快照並清除變更旗標（無變更或距上次匯出未滿 min_interval 秒則回傳 None）
+        供比對工作程序把學到的區域回傳給主程序，由主程序統一寫檔
+        """
+        with self._learned_lock:
+            if not self._learned_dirty or time.time() - self._learned_saved_at < min_interval:
+                return None
+            self._learned_dirty = False
+            self._learned_saved_at = time.time()
+            return self._learned_roi_snapshot()
+
+    def merge_learned_roi(self, data: Dict[str, dict]) -> None:
+        """合併其他程序學到的區域（取外框聯集、樣本數取大），之後照常節流寫檔"""
+        with self._learned_lock:
+            for key, v in data.items():
+                file, _, rtmp = key.partition("|")
+                x0, y0, x1, y1 = [int(x) for x in v["box"]]
+                samples = int(v.get("samples", 0))
+                r = self._learned_roi.get((file, rtmp))
+                if r is None:
+                    self._learned_roi[(file, rtmp)] = LearnedRoi(x0, y0, x1, y1, samples=samples)
+                else:
+                    r.x0, r.y0 = min(r.x0, x0), min(r.y0, y0)
+                    r.x1, r.y1 = max(r.x1, x1), max(r.y1, y1)
+                    r.samples = max(r.samples, samples)
+            self._learned_dirty = True
+        self.save_learned_roi()
+
+    def save_learned_roi(self, force: bool = False) -> None:
+        """把自動學習的搜尋區域寫回 JSON（有變更且距上次寫檔超過間隔才寫，force=True 則立即寫）"""
+        with self._learned_lock:
+            if not self._learned_dirty or self.roi_learn_path is None:
+                return
+            if not force and time.time() - self._learned_saved_at < self.ROI_LEARN_SAVE_INTERVAL:
+                return
+            data = self._learned_roi_snapshot()
+            self._learned_dirty = False
+            self._learned_saved_at = time.time()
+        try:
+            self.roi_learn_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        except Exception as e:
+            logging.warning(f"[Template] 寫入已學習搜尋區域失敗：{e}")
+
+    def _learn_roi(self, tpl: CompiledTemplate, rtmp: str, loc: Tuple[int, int]) -> None:
+        """
+        記錄一次模板確實出現的位置，外框逐步擴張成學習到的搜尋區域
+        - 落在外框內：只累計樣本數
+        - 落在外框外：先記為待確認，同一位置（誤差半個模板內）出現 ROI_LEARN_CONFIRM 次才擴張外框
+        """
+        th, tw = tpl.image.shape[:2]
+        x, y = int(loc[0]), int(loc[1])
+        key = (tpl.file, rtmp)
+        with self._learned_lock:
+            r = self._learned_roi.get(key)
+            if r is None:
+                self._learned_roi[key] = LearnedRoi(x, y, x + tw, y + th)
+            elif r.x0 <= x and r.y0 <= y and x + tw <= r.x1 and y + th <= r.y1:
+                r.samples += 1
+            else:
+                near = next((p for p in r.pending if abs(p[0] - x) <= tw // 2 and abs(p[1] - y) <= th // 2), None)
+                if near is None:
+                    r.pending.append([x, y, 1])
+                    del r.pending[:-self.ROI_LEARN_MAX_PENDING]
+                    return
+                near[2] += 1
+                if near[2] < self.ROI_LEARN_CONFIRM:
+                    return
+                r.pending.remove(near)
+                r.x0, r.y0 = min(r.x0, x), min(r.y0, y)
+                r.x1, r.y1 = max(r.x1, x + tw), max(r.y1, y + th)
+                r.samples += 1
+            self._learned_dirty = True
+        self.save_learned_roi()
+
+    def _search_region(self, tpl: CompiledTemplate, rtmp: str, frame_shape) -> Optional[Tuple[int, int, int, int]]:
+        """
+        回傳此模板的搜尋區域 (x0, y0, x1, y1)；None 代表整張畫面
+        - 優先使用 manifest 的 roi（像素或 0~1 比例，依 roi_units；auto 時四個值都在 0~1 之間即為比例），
+          其次使用學習到的區域（樣本數足夠才啟用）
+        - 皆外擴 roi_margin 像素並裁在畫面內；區域比模板還小時退回整張畫面
+        """
+        fh, fw = frame_shape[:2]
+        box = None
+        if tpl.roi is not None:
+            x, y, w, h = tpl.roi
+            ratio = tpl.roi_units == "ratio" or (
+                tpl.roi_units == "auto" and all(0.0 <= float(v) <= 1.0 for v in tpl.roi)
+            )
+            if ratio:
+                x, y, w, h = x * fw, y * fh, w * fw, h * fh
+            box = (int(x), int(y), int(x + w), int(y + h))
+        elif tpl.roi_learn:
+            r = self._learned_roi.get((tpl.file, rtmp))
+            if r is not None and r.samples >= self.ROI_LEARN_MIN_SAMPLES:
+                box = (r.x0, r.y0, r.x1, r.y1)
+        if box is None:
+            return None
+
+        m = tpl.roi_margin
+        x0, y0 = max(0, box[0] - m), max(0, box[1] - m)
+        x1, y1 = min(fw, box[2] + m), min(fh, box[3] + m)
+        th, tw = tpl.image.shape[:2]
+        if x1 - x0 < tw or y1 - y0 < th:
+            return None
+        if x0 == 0 and y0 == 0 and x1 == fw and y1 == fh:
+            return None
+        return x0, y0, x1, y1
+
+    # ---------- 比對核心（exact / pyramid） ----------
+    @staticmethod
+    def _build_pyramid_level(tpl: CompiledTemplate) -> None:
+        """預先算好 pyramid 用的縮小模板；縮小後太小（< 8px）則不建立，比對時自動退回 exact"""
+        th, tw = tpl.image.shape[:2]
+        sw, sh = int(tw * tpl.pyramid_scale), int(th * tpl.pyramid_scale)
+        if not (0.0 < tpl.pyramid_scale < 1.0) or sw < 8 or sh < 8:
+            tpl.image_small = tpl.mask_small = None
+            return
+        tpl.image_small = cv2.resize(tpl.image, (sw, sh), interpolation=cv2.INTER_AREA)
+        tpl.mask_small = (
+            cv2.resize(tpl.mask, (sw, sh), interpolation=cv2.INTER_NEAREST) if tpl.mask is not None else None
+        )
+
+    @staticmethod
+    def _match_exact(gray: np.ndarray, tpl_img: np.ndarray, mask: Optional[np.ndarray]) -> Tuple[float, Tuple[int, int]]:
+        res = cv2.matchTemplate(gray, tpl_img, cv2.TM_CCOEFF_NORMED, mask=mask)
+        _, max_val, _, max_loc = cv2.minMaxLoc(res)
+        return float(max_val), (int(max_loc[0]), int(max_loc[1]))
+
+    @classmethod
+    def _match_pyramid(
+        cls,
+        gray: np.ndarray,
+        tpl: CompiledTemplate,
+        use_mask: bool = True,
+        level: Optional[Callable[[], np.ndarray]] = None,
+    ) -> Tuple[float, Tuple[int, int]]:
+        """
+        粗到細比對：
+        1. 畫面與模板都縮小 pyramid_scale 倍做一次粗比對
+        2. 取前 top_k 個峰值（每取一個就把附近區域抑制掉，避免重複）
+        3. 只在各峰值對應的全解析度小窗內精比對，回傳最高分
+        可比對位置很少（例如模板與畫面幾乎同尺寸）時直接用 exact，省去縮放成本
+        level：取得呼叫端快取之縮小畫面的函式（同一張畫面多張模板共用），未提供時在此縮放
+        """
+        mask = tpl.mask if use_mask else None
+        th, tw = tpl.image.shape[:2]
+        gh, gw = gray.shape[:2]
+        if tpl.image_small is None or (gh - th + 1) * (gw - tw + 1) <= 64:
+            return cls._match_exact(gray, tpl.image, mask)
+
+        s = tpl.pyramid_scale
+        if level is not None:
+            small = level()
+        else:
+            small = cv2.resize(gray, (max(1, int(gw * s)), max(1, int(gh * s))), interpolation=cv2.INTER_AREA)
+        sth, stw = tpl.image_small.shape[:2]
+        if small.shape[0] < sth or small.shape[1] < stw:
+            return cls._match_exact(gray, tpl.image, mask)
+
+        res = cv2.matchTemplate(small, tpl.image_small, cv2.TM_CCOEFF_NORMED, mask=tpl.mask_small if use_mask else None)
+        if use_mask and tpl.mask_small is not None:
+            res = np.nan_to_num(res, nan=-1.0, posinf=-1.0, neginf=-1.0)
+
+        pad = int(np.ceil(1.0 / s)) + 2
+        best, best_loc = float("-inf"), (0, 0)
+        for _ in range(max(1, tpl.pyramid_top_k)):
+            _, peak, _, (px, py) = cv2.minMaxLoc(res)
+            if peak < -1.0:
+                break
+            fx, fy = int(px / s), int(py / s)
+            x0, y0 = max(0, fx - pad), max(0, fy - pad)
+            x1, y1 = min(gw, fx + tw + pad), min(gh, fy + th + pad)
+            if x1 - x0 >= tw and y1 - y0 >= th:
+                score, loc = cls._match_exact(gray[y0:y1, x0:x1], tpl.image, mask)
+                if score > best:
+                    best, best_loc = score, (loc[0] + x0, loc[1] + y0)
+            # 抑制此峰值附近，下一輪取下一個獨立的峰值
+            res[max(0, py - sth // 2):py + sth // 2 + 1, max(0, px - stw // 2):px + stw // 2 + 1] = -2.0
+        if best == float("-inf"):
+            return cls._match_exact(gray, tpl.image, mask)
+        return best, best_loc
+
+    def _match_template(
+        self,
+        gray: np.ndarray,
+        tpl: CompiledTemplate,
+        rtmp: str,
+        thr: float,
+        use_mask: bool = True,
+        ctx: Optional[_FrameContext] = None,
+        trigger: str = "low",
+    ) -> Tuple[float, Tuple[int, int]]:
+        """
+        單張模板比對，回傳 (最高分, 左上角座標)
+        - 有搜尋區域時只比對該區域；match_mode=pyramid 時先粗後細
+        - 快速路徑的分數只會比整張 exact 低（搜尋範圍較小 / 粗比對可能漏掉峰值），因此只在「低分會觸發」的一側複查：
+          trigger="low"（一般模板）時快速路徑得到低分，再以整張畫面 exact 確認一次，不會造成誤觸發；
+          trigger="high"（錯誤模板）時低分本來就是不觸發，不再複查
+        - 開啟 roi_learn 時，分數高於門檻（模板確實出現）的最佳位置會回饋給學習區域
+        """
+        mask = tpl.mask if use_mask else None
+        region = self._search_region(tpl, rtmp, gray.shape)
+        fast = region is not None or tpl.match_mode == "pyramid"
+        score, loc = float("-inf"), (0, 0)
+        if fast:
+            x0, y0, x1, y1 = region if region is not None else (0, 0, gray.shape[1], gray.shape[0])
+            sub = gray[y0:y1, x0:x1]
+            if tpl.match_mode == "pyramid":
+                level = (lambda: ctx.level((x0, y0, x1, y1), tpl.pyramid_scale)) if ctx is not None else None
+                score, loc = self._match_pyramid(sub, tpl, use_mask, level=level)
+            else:
+                score, loc = self._match_exact(sub, tpl.image, mask)
+            loc = (loc[0] + x0, loc[1] + y0)
+        if not fast or (trigger == "low" and score <= thr):
+            score, loc = self._match_exact(gray, tpl.image, mask)
+        if tpl.roi_learn and tpl.roi is None and score > thr:
+            self._learn_roi(tpl, rtmp, loc)
+        return score, loc
+
     # ---------- Manifest 驅動偵測 ----------
     def detect_by_manifest(
         self,
         image_bgr: np.ndarray,
         type_name: Optional[str],
         *,
+        rtmp: Optional[str] = None,
+        title: Optional[str] = None,
+        game: Optional[str] = None,
         default_threshold: Optional[float] = None,
         return_report: bool = False,
     ):
         """
         依 manifest 設定只比對指定 type 的模板；回傳 (命中模板名 or None, 報告 or None)
+        - rtmp / title：用於 when 條件過濾（由呼叫端帶入當前機台設定）；game 僅用於日誌
         - 命中邏輯：低於門檻觸發（分數 <= threshold）
         - 命中邏輯：優先用模板 threshold；無則用類型 threshold；再無則用 default_threshold / manifest.default_threshold
         - report=True 會回傳一個 JSON-like dict，包含每模板分數與命中判斷
@@ -447,95 +1552,32 @@ class TemplateMatcher:
                 return None, report
             return None
 
-        gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
-
-        types = self.manifest.get("types", {})
-        type_cfg = types.get(type_name or "", {})
-        type_threshold = type_cfg.get("threshold", None)
-        eff_default_thr = default_threshold if default_threshold is not None else self.manifest.get("default_threshold", 0.8)
-        tpl_specs = type_cfg.get("templates", [])
-
-        # ===== 依 when 條件過濾可用模板（方案 B 核心）=====
-        # 讓 matcher 能讀到當前 Runner 的設定（由呼叫端注入 self.matcher.cfg）
-        rtmp  = getattr(getattr(self, "cfg", None), "rtmp", "") or ""
-        title = getattr(getattr(self, "cfg", None), "game_title_code", "") or ""
+        rtmp = rtmp or ""
+        title = title or ""
+        game = game or "NA"
 
-        def _match_when(cond: Optional[dict]) -> bool:
-            if not cond:
-                return True
-            # 精確比對
-            if "rtmp" in cond and cond["rtmp"] != rtmp:
-                return False
-            if "title" in cond and cond["title"] != title:
-                return False
-            # 包含判斷（可選）
-            contains = cond.get("contains", {})
-            if isinstance(contains, dict):
-                for k, v in contains.items():
-                    src = ""
-                    if k == "rtmp":
-                        src = rtmp
-                    elif k == "title":
-                        src = title
-                    else:
-                        continue
-                    if v not in src:
-                        return False
-            return True
-        
-        filtered_specs = [s for s in tpl_specs if _match_when(s.get("when"))]
-        if not filtered_specs:
+        # 一次查表取得已編譯、已依 when 過濾的模板清單
+        entries = self.prepare(type_name, rtmp, title)
+        if not entries:
             logging.info(f"[Template] 類型 {type_name} 在當前條件下無可用模板（rtmp='{rtmp}', title='{title}'）")
-            return None
-        
-        tpl_specs = filtered_specs
-        logging.info(f"[Template] 類型 {type_name}：符合條件模板 {len(tpl_specs)} 張（rtmp='{rtmp}', title='{title}'）")
-        # ===== 過濾結束 =====
-
-        if not tpl_specs:
-            logging.warning(f"[Template] manifest 中類型 '{type_name}' 沒有模板清單，略過")
-            return None
-       
-        # 逐一比對，任何一張「分數 <= 自己門檻」即觸發
-        for spec in tpl_specs:
-            file = spec.get("file")
-            if not file:
-                continue
-
-            tpl_img = self._find_file_image(file)
-            if tpl_img is None:
-                logging.warning(f"[Template] 找不到模板影像：{file}")
-                continue
+            return (None, report) if return_report else None
 
-            # 尺寸檢查
-            if gray.shape[0] < tpl_img.shape[0] or gray.shape[1] < tpl_img.shape[1]:
-                logging.info(f"[Template] 跳過（畫面比模板小）：{file}")
-                continue
-
-            # 取得遮罩（若有）
-            mask = self._resolve_mask(spec.get("mask"))
-
-            # 以 TM_CCOEFF_NORMED 比對（OpenCV 4.2+ 支援 mask）
-            res = cv2.matchTemplate(gray, tpl_img, cv2.TM_CCOEFF_NORMED, mask=mask)
-            _, max_val, _, max_loc = cv2.minMaxLoc(res)
-
-            # 此模板有效門檻（模板 > 類型 > 預設）
-            tpl_thr = float(spec.get("threshold", type_threshold if type_threshold is not None else eff_default_thr))
-            hit = (max_val <= tpl_thr)  # ★ 低於門檻觸發
-            logging.info(f"[Template][{type_name}][{getattr(self, 'current_game', 'NA')}] {file} → score={max_val:.5f} thr={tpl_thr:.2f} hit={hit}")
+        # 逐一比對，任何一張「分數 <= 自己門檻」即觸發（觸發後不再比對後面的模板）
+        scores = self._score_type(_FrameContext(image_bgr), type_name, rtmp, title, default_threshold, stop_on_low_hit=True)
+        for t in scores:
+            hit = (t.score <= t.thr)  # ★ 低於門檻觸發
+            logging.info(f"[Template][{type_name}][{game}] {t.file} → score={t.score:.5f} thr={t.thr:.2f} hit={hit}")
 
             if return_report:
-                report["templates"].append(
-                    {"file": file, "score": float(max_val), "thr": float(tpl_thr), "hit": bool(hit)}
-                )
+                report["templates"].append({"file": t.file, "score": t.score, "thr": t.thr, "hit": bool(hit)})
 
             if hit:
-                logging.warning(f"[Template][{type_name}][{getattr(self, 'current_game', 'NA')}] 低分觸發：{file} (score={max_val:.3f} <= thr {tpl_thr:.2f})")
+                logging.warning(f"[Template][{type_name}][{game}] 低分觸發：{t.file} (score={t.score:.3f} <= thr {t.thr:.2f})")
                 if return_report:
-                    return file, report
-                return file
-        
-        logging.info(f"[Template][{type_name}][{getattr(self, 'current_game', 'NA')}] 未觸發（已比對 {len(tpl_specs)} 張模板）")
+                    return t.file, report
+                return t.file
+
+        logging.info(f"[Template][{type_name}][{game}] 未觸發（已比對 {len(scores)} 張模板）")
         if return_report:
             return None, report
         return None
@@ -545,14 +1587,16 @@ class TemplateMatcher:
         image_bgr: np.ndarray,
         type_name: Optional[str],
         *,
+        rtmp: Optional[str] = None,
+        title: Optional[str] = None,
         default_threshold: Optional[float] = None,
         max_templates: int = 2,
     ) -> Optional[str]:
         """
         快速模板比對版本：
         - 限制比對的模板數量
-        - 跳過複雜的條件過濾
-        - 優化性能，適合超快頻率使用
+        - 不使用 mask、不輸出逐張日誌
+        - 優化性能，適合超快頻率使用（模板清單同樣走已編譯的索引，when 條件一併生效）
         """
         if image_bgr is None or image_bgr.size == 0:
             return None
@@ -564,7 +1608,7 @@ class TemplateMatcher:
             best_name, best_score = None, float("-inf")
             
             # 限制比對數量
-            templates_to_check = list(self.templates.items())[:max_templates]
+            templates_to_check = self.templates[:max_templates]
             for name, tpl in templates_to_check:
                 if gray.shape[0] < tpl.shape[0] or gray.shape[1] < tpl.shape[1]:
                     continue
@@ -577,48 +1621,159 @@ class TemplateMatcher:
                 return best_name
             return None
 
-        gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
-        types = self.manifest.get("types", {})
-        type_cfg = types.get(type_name or "", {})
-        type_threshold = type_cfg.get("threshold", None)
-        eff_default_thr = default_threshold if default_threshold is not None else self.manifest.get("default_threshold", 0.8)
-        tpl_specs = type_cfg.get("templates", [])
-
-        if not tpl_specs:
+        # 限制比對數量；快速比對不使用 mask
+        if not self.prepare(type_name, rtmp, title):
             return None
-        
-        # 限制比對數量
-        tpl_specs = tpl_specs[:max_templates]
-        
-        # 快速比對（跳過複雜的條件過濾）
-        for spec in tpl_specs:
-            file = spec.get("file")
-            if not file:
-                continue
-
-            tpl_img = self._find_file_image(file)
-            if tpl_img is None:
-                continue
+        scores = self._score_type(
+            _FrameContext(image_bgr), type_name, rtmp or "", title or "", default_threshold,
+            use_mask=False, limit=max_templates, stop_on_low_hit=True,
+        )
+        for t in scores:
+            if t.score <= t.thr:
+                return t.file
+        return None
 
+    # ---------- 批次比對 ----------
+    def _score_type(
+        self,
+        ctx: _FrameContext,
+        type_name: Optional[str],
+        rtmp: str,
+        title: str,
+        default_threshold: Optional[float],
+        *,
+        use_mask: bool = True,
+        limit: Optional[int] = None,
+        stop_on_low_hit: bool = False,
+        trigger: str = "low",
+    ) -> List[TemplateScore]:
+        """
+        以共用的畫面前處理比對某類型的模板（依 manifest 順序），回傳每張模板的分數與有效門檻（模板 > 類型 > 預設）
+        trigger："low"（一般模板，低分觸發）或 "high"（錯誤模板，高分觸發），決定快速路徑要在哪一側複查
+        """
+        eff_default_thr = default_threshold if default_threshold is not None else self.manifest.get("default_threshold", 0.8)
+        entries = self.prepare(type_name, rtmp, title)
+        if limit is not None:
+            entries = entries[:limit]
+        gray = ctx.gray
+        out: List[TemplateScore] = []
+        for tpl in entries:
             # 尺寸檢查
-            if gray.shape[0] < tpl_img.shape[0] or gray.shape[1] < tpl_img.shape[1]:
+            if gray.shape[0] < tpl.image.shape[0] or gray.shape[1] < tpl.image.shape[1]:
+                logging.info(f"[Template] 跳過（畫面比模板小）：{tpl.file}")
+                continue
+            tpl_thr = tpl.threshold if tpl.threshold is not None else float(eff_default_thr)
+            # 以 TM_CCOEFF_NORMED 比對（OpenCV 4.2+ 支援 mask；有搜尋區域時只比對該區域）
+            score, loc = self._match_template(gray, tpl, rtmp, tpl_thr, use_mask=use_mask, ctx=ctx, trigger=trigger)
+            out.append(TemplateScore(tpl.file, float(score), float(tpl_thr), (int(loc[0]), int(loc[1]))))
+            if stop_on_low_hit and score <= tpl_thr:
+                break
+        return out
+
+    def _score_legacy(self, ctx: _FrameContext, default_threshold: Optional[float], limit: Optional[int]) -> List[TemplateScore]:
+        """無 manifest：全模板掃描，只回傳最高分的那一張（與舊邏輯相同）"""
+        thr = default_threshold if default_threshold is not None else 0.8
+        best: Optional[TemplateScore] = None
+        for name, tpl in self.templates[:limit] if limit is not None else self.templates:
+            if ctx.gray.shape[0] < tpl.shape[0] or ctx.gray.shape[1] < tpl.shape[1]:
                 continue
+            score, loc = self._match_exact(ctx.gray, tpl, None)
+            if best is None or score > best.score:
+                best = TemplateScore(name, score, float(thr), loc)
+        return [best] if best is not None else []
+
+    def _scores_for(
+        self, ctx: _FrameContext, type_name: str, rtmp: str, title: str, default_threshold: Optional[float], **kw
+    ) -> List[TemplateScore]:
+        """有 manifest 走 _score_type；無 manifest 退回全模板掃描（與 detect_by_manifest 相同）"""
+        if self.manifest is None:
+            return self._score_legacy(ctx, default_threshold, kw.get("limit"))
+        return self._score_type(ctx, type_name, rtmp, title, default_threshold, **kw)
 
-            # 快速比對（不使用 mask）
-            res = cv2.matchTemplate(gray, tpl_img, cv2.TM_CCOEFF_NORMED)
-            _, max_val, _, _ = cv2.minMaxLoc(res)
+    def evaluate(
+        self,
+        image_bgr: np.ndarray,
+        type_names: List[Optional[str]],
+        *,
+        rtmp: Optional[str] = None,
+        title: Optional[str] = None,
+        default_threshold: Optional[float] = None,
+        use_mask: bool = True,
+        max_templates: Optional[int] = None,
+    ) -> BatchMatchResult:
+        """
+        批次比對：一張畫面對多個類型（例如 template_type + error_template_type）的所有模板一次算完
+        - 灰階轉換只做一次；pyramid 縮小圖依（區域, 倍率）快取，跨模板、跨類型共用
+          （積分圖 / DFT 由 OpenCV matchTemplate 內部自行計算，無法從外部共用）
+        - 不因第一張觸發就中止：每張模板都有分數，觸發規則交給呼叫端（BatchMatchResult.low_hits / high_hits）
+        - 同一類型重複出現只算一次；None 略過
+        """
+        t0 = time.perf_counter()
+        if image_bgr is None or image_bgr.size == 0:
+            logging.warning("[Template] 輸入影像為空，略過比對")
+            return BatchMatchResult({})
+        ctx = _FrameContext(image_bgr)
+        scores: Dict[str, List[TemplateScore]] = {}
+        for type_name in type_names:
+            if not type_name or type_name in scores:
+                continue
+            scores[type_name] = self._scores_for(
+                ctx, type_name, rtmp or "", title or "", default_threshold, use_mask=use_mask, limit=max_templates
+            )
+        return BatchMatchResult(scores, elapsed_ms=(time.perf_counter() - t0) * 1000.0)
 
-            # 此模板有效門檻
-            tpl_thr = float(spec.get("threshold", type_threshold if type_threshold is not None else eff_default_thr))
-            hit = (max_val <= tpl_thr)
-            
-            if hit:
-                return file
-        
-        return None
-            
-        logging.info(f"[Template] 未觸發（類型 {type_name} 的所有模板皆高於各自門檻）")
-        return None
+    def detect_verdict(
+        self,
+        image_bgr: np.ndarray,
+        template_type: Optional[str],
+        error_template_type: Optional[str] = None,
+        *,
+        rtmp: Optional[str] = None,
+        title: Optional[str] = None,
+        game: Optional[str] = None,
+        default_threshold: Optional[float] = None,
+        fast: bool = False,
+    ) -> DetectionVerdict:
+        """
+        一次呼叫完成 RTMP 檢測的兩段判定（畫面前處理只做一次）：
+        1. template_type：依 manifest 順序，第一張 score <= thr 即為 normal（之後的模板不再比對）
+        2. 未觸發且 error_template_type 與 template_type 不同：所有錯誤模板中 score >= thr 且最高分者為 error
+        fast=True 時一般模板只比前 2 張且不使用 mask（超快頻率用）；錯誤模板一律完整比對
+        """
+        t0 = time.perf_counter()
+        if image_bgr is None or image_bgr.size == 0:
+            logging.warning("[Template] 輸入影像為空，略過比對")
+            return DetectionVerdict(DetectionVerdict.NONE, result=BatchMatchResult({}))
+        ctx = _FrameContext(image_bgr)
+        rtmp, title, game = rtmp or "", title or "", game or "NA"
+        scores: Dict[str, List[TemplateScore]] = {}
+        result = BatchMatchResult(scores)
+        verdict = DetectionVerdict(DetectionVerdict.NONE, result=result)
+
+        if template_type:
+            normal = self._scores_for(
+                ctx, template_type, rtmp, title, default_threshold,
+                use_mask=not fast, limit=2 if fast else None, stop_on_low_hit=True,
+            )
+            scores[template_type] = normal
+            for t in normal:
+                if not fast:
+                    logging.info(f"[Template][{template_type}][{game}] {t.file} → score={t.score:.5f} thr={t.thr:.2f} hit={t.score <= t.thr}")
+                if t.score <= t.thr:
+                    logging.warning(f"[Template][{template_type}][{game}] 低分觸發：{t.file} (score={t.score:.3f} <= thr {t.thr:.2f})")
+                    verdict = DetectionVerdict(DetectionVerdict.NORMAL, t.file, t.score, t.thr, result)
+                    break
+
+        if not verdict.triggered and error_template_type and error_template_type != template_type:
+            errors = self._scores_for(ctx, error_template_type, rtmp, title, default_threshold, use_mask=True, trigger="high")
+            scores[error_template_type] = errors
+            high = [t for t in errors if t.score >= t.thr]
+            if high:
+                best = max(high, key=lambda t: t.score)
+                verdict = DetectionVerdict(DetectionVerdict.ERROR, best.file, best.score, best.thr, result)
+
+        result.elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        return verdict
 
     # ---------- 原本 detect_by_type / detect（保留相容） ----------
     def detect_by_type(
@@ -673,9 +1828,228 @@ class TemplateMatcher:
         return best_name if best_score >= threshold else None
 
 
-# =========================== FFmpeg 截圖 ===========================
-class FFmpegRunner:
-    """以 FFmpeg 針對 RTMP 取單張快照；若失敗或逾時回傳 False"""
+# =========================== 模板比對工作池（多程序） ===========================
+# 工作程序內的 matcher（每個程序於初始化時各自載入一次模板庫）
+_worker_matcher: Optional[TemplateMatcher] = None
+_worker_shm: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _attach_shm(name: str) -> shared_memory.SharedMemory:
+    """附掛主程序建立的共享記憶體（建立與 unlink 都由主程序負責，這裡只 close）"""
+    shm = _worker_shm.get(name)
+    if shm is not None:
+        return shm
+    shm = shared_memory.SharedMemory(name=name)
+    # 主程序換掉過小的 slot 時名稱會變，舊的附掛不會再用到
+    if len(_worker_shm) >= 64:
+        for old in _worker_shm.values():
+            old.close()
+        _worker_shm.clear()
+    _worker_shm[name] = shm
+    return shm
+
+
+def _detect_worker_init(template_dir: str, manifest_path: str, roi_learn_path: str) -> None:
+    global _worker_matcher
+    # 並行交給多個程序；每個程序內 OpenCV 只用單執行緒，避免 N 個程序 × 全核心執行緒互搶
+    cv2.setNumThreads(1)
+    _worker_matcher = TemplateMatcher(Path(template_dir), manifest_path=Path(manifest_path), roi_learn_path=Path(roi_learn_path))
+    # 學習區域只在記憶體中累積，定期回傳主程序統一寫檔（避免多個程序同時寫同一個檔）
+    _worker_matcher.roi_learn_path = None
+    logging.info(f"[Detect] 比對程序就緒 pid={os.getpid()}")
+
+
+def _detect_worker_run(method: str, src: tuple, kwargs: dict):
+    """
+    在工作程序內執行 matcher.<method>(frame, **kwargs)；畫面直接映射共享記憶體，不複製
+    src：("shm", 名稱, shape, dtype) 為工作池自己的畫面 slot；("ring", 名稱, 格, 序號) 為取幀環形緩衝中的一格
+    """
+    kind, shm = src[0], _attach_shm(src[1])
+    meta = None
+    if kind == "ring":
+        slot, seq = src[2], src[3]
+        _, meta, frames = FrameRing.views(shm)
+        frame = frames[slot]
+        del frames
+    else:
+        frame = np.ndarray(src[2], dtype=np.dtype(src[3]), buffer=shm.buf)
+    try:
+        if meta is not None and int(meta[slot, 0]) != seq:
+            raise StaleFrameError("畫面在送達比對程序前已被覆寫")
+        result = getattr(_worker_matcher, method)(frame, **kwargs)
+        if meta is not None and int(meta[slot, 0]) != seq:
+            raise StaleFrameError("畫面在比對途中被覆寫")
+    finally:
+        del frame, meta  # 不留下指向共享記憶體的參照
+    return result, _worker_matcher.export_learned_roi(min_interval=TemplateMatcher.ROI_LEARN_SAVE_INTERVAL)
+
+
+class DetectionPool:
+    """
+    模板比對工作池：N 個程序各自預載模板庫，機台執行緒送出畫面、取回 Future
+    - 取幀環形緩衝中的畫面（FrameRef）只傳名稱與格號，比對程序直接附掛讀取，完全不複製
+    - 其他畫面（單張截圖）經由可重複使用的共享記憶體 slot 傳遞（不 pickle 畫面本身）；slot 用完時不等待，該次直接同程序比對
+    - 比對途中畫面被覆寫時，Future 以 StaleFrameError 結束（該輪結果不可信）
+    - workers=0 時直接在呼叫端執行緒比對，介面不變；環形緩衝的畫面先複製一份再比對
+      （同程序比對可能比畫面被覆寫還慢，複製約 1ms，複製完確認沒被覆寫即可放心比對）
+    - 工作池異常（程序崩潰）時自動退回同程序比對，已送出、尚未完成的比對也改在本程序重跑，不影響 spin 迴圈
+    """
+
+    METHODS = {"detect_by_manifest", "detect_by_manifest_fast", "evaluate", "detect_verdict"}
+
+    def __init__(self, matcher: TemplateMatcher, workers: int = 0, slots: Optional[int] = None):
+        self.matcher = matcher
+        self.workers = max(0, int(workers))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: List[Optional[shared_memory.SharedMemory]] = []
+        self._free: "queue.Queue[int]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        if self.workers <= 0:
+            return
+
+        manifest_path = Path(TEMPLATES_MANIFEST)
+        roi_learn_path = matcher.roi_learn_path or manifest_path.parent / "templates_roi_learned.json"
+        # spawn：主程序已有取幀/機台執行緒，fork 不安全；Windows 本來就只有 spawn
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_detect_worker_init,
+            initargs=(str(matcher.template_dir), str(manifest_path), str(roi_learn_path)),
+        )
+        n_slots = slots or self.workers * 2
+        self._slots = [None] * n_slots
+        for i in range(n_slots):
+            self._free.put(i)
+        logging.info(f"[Detect] 模板比對工作池啟動：{self.workers} 個程序、{n_slots} 個共享畫面 slot")
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None and not self._closed
+
+    def _acquire_slot(self, nbytes: int) -> Optional[Tuple[int, shared_memory.SharedMemory]]:
+        """取一個空閒 slot（不夠大就換一塊）；沒有空閒代表工作池塞車，不等待、回傳 None 由呼叫端改為同程序比對"""
+        try:
+            idx = self._free.get_nowait()
+        except queue.Empty:
+            return None
+        shm = self._slots[idx]
+        if shm is None or shm.size < nbytes:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._slots[idx] = shm
+        return idx, shm
+
+    def _run_inline(self, method: str, frame: Union[np.ndarray, "FrameRef"], kwargs: dict) -> Future:
+        fut: Future = Future()
+        try:
+            if isinstance(frame, FrameRef):
+                img = frame.array.copy()
+                if not frame.is_current():
+                    raise StaleFrameError("畫面在複製途中被覆寫")
+                result = getattr(self.matcher, method)(img, **kwargs)
+            else:
+                result = getattr(self.matcher, method)(frame, **kwargs)
+            fut.set_result(result)
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    def submit(self, method: str, frame: Union[np.ndarray, "FrameRef"], **kwargs) -> Future:
+        """送出一次比對（method 為 TemplateMatcher 的比對方法名，frame 可為畫面或環形緩衝參照），回傳結果的 Future"""
+        if method not in self.METHODS:
+            raise ValueError(f"不支援的比對方法：{method}")
+        if not self.enabled:
+            return self._run_inline(method, frame, kwargs)
+
+        idx = None
+        if isinstance(frame, FrameRef):
+            src = ("ring", frame.ring.shm_name, frame.slot, frame.seq)
+        else:
+            frame = np.ascontiguousarray(frame)
+            slot = self._acquire_slot(frame.nbytes)
+            if slot is None:
+                logging.warning("[Detect] 沒有空閒的畫面 slot（工作池忙碌），本次改為同程序比對")
+                return self._run_inline(method, frame, kwargs)
+            idx, shm = slot
+            np.ndarray(frame.shape, dtype=frame.dtype, buffer=shm.buf)[...] = frame
+            src = ("shm", shm.name, frame.shape, frame.dtype.str)
+        try:
+            inner = self._executor.submit(_detect_worker_run, method, src, kwargs)
+        except Exception as e:
+            if idx is not None:
+                self._free.put(idx)
+            if isinstance(e, (BrokenProcessPool, RuntimeError)):
+                self._mark_broken(e)
+                return self._run_inline(method, frame, kwargs)
+            raise
+
+        outer: Future = Future()
+
+        def _done(f: Future) -> None:
+            if idx is not None:
+                self._free.put(idx)  # 工作程序已用完這個 slot
+            try:
+                result, learned = f.result()
+            except (BrokenProcessPool, CancelledError) as e:
+                # 工作池崩潰（或被關閉而取消）：這一輪改在本程序重跑，不讓該輪偵測遺失
+                if isinstance(e, BrokenProcessPool):
+                    self._mark_broken(e)
+                inline = self._run_inline(method, frame, kwargs)
+                exc = inline.exception()
+                if exc is not None:
+                    outer.set_exception(exc)
+                else:
+                    outer.set_result(inline.result())
+                return
+            except Exception as e:
+                outer.set_exception(e)
+                return
+            if learned:
+                try:
+                    self.matcher.merge_learned_roi(learned)
+                except Exception as e:
+                    logging.warning(f"[Detect] 合併學習區域失敗：{e}")
+            outer.set_result(result)
+
+        inner.add_done_callback(_done)
+        return outer
+
+    def detect(self, method: str, frame: np.ndarray, timeout: Optional[float] = None, **kwargs):
+        """submit 後等待結果（機台執行緒的同步用法）"""
+        return self.submit(method, frame, **kwargs).result(timeout=timeout if timeout is not None else DETECTION_TIMEOUT)
+
+    def _mark_broken(self, err: Exception) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            logging.error(f"[Detect] 模板比對工作池異常，改為同程序比對：{err}")
+            self._shutdown_locked()
+
+    def _shutdown_locked(self) -> None:
+        self._closed = True
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        for shm in self._slots:
+            if shm is not None:
+                try:
+                    shm.close()
+                    shm.unlink()
+                except Exception:
+                    pass
+        self._slots = [None] * len(self._slots)
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._closed and self._executor is not None:
+                self._shutdown_locked()
+
+
+# =========================== FFmpeg 截圖 ===========================
+class FFmpegRunner:
+    """以 FFmpeg 針對 RTMP 取單張快照；若失敗或逾時回傳 False"""
 
     def __init__(self, ffmpeg_path: Path):
         self.ffmpeg = ffmpeg_path
@@ -721,6 +2095,950 @@ class FFmpegRunner:
             logging.warning(f"FFmpeg 截圖失敗: {e}")
             return False
 
+    def snapshot_frame(self, rtmp_url: str, timeout: float = 5.0) -> Optional[np.ndarray]:
+        """
+        從 RTMP 串流截取單張畫面，直接回傳 BGR numpy 陣列（不寫檔）
+
+        - FFmpeg 以 BMP（無損、免壓縮）輸出到 stdout pipe，再以 cv2.imdecode 解回陣列
+        - 失敗或逾時回傳 None；不會在日誌中記錄完整的 RTMP URL
+        """
+        cmd = [
+            str(self.ffmpeg), "-hide_banner", "-loglevel", "error",
+            "-i", rtmp_url, "-frames:v", "1",
+            "-f", "image2pipe", "-c:v", "bmp", "pipe:1",
+        ]
+        try:
+            r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout)
+            if not r.stdout:
+                return None
+            img = cv2.imdecode(np.frombuffer(r.stdout, dtype=np.uint8), cv2.IMREAD_COLOR)
+            return img if img is not None and img.size > 0 else None
+        except subprocess.TimeoutExpired:
+            logging.warning(f"FFmpeg 截圖超時（{timeout}s）")
+            return None
+        except FileNotFoundError:
+            logging.error("找不到 FFmpeg 執行檔")
+            return None
+        except Exception as e:
+            logging.warning(f"FFmpeg 截圖失敗: {e}")
+            return None
+
+
+# =========================== RTMP 常駐取幀 ===========================
+class StaleFrameError(RuntimeError):
+    """比對途中畫面所在的環形緩衝格已被新畫面覆寫（結果不可信，該輪略過即可）"""
+
+
+class FrameRing:
+    """
+    以 multiprocessing.shared_memory 實作的固定格數畫面環形緩衝（每個 RTMP 名稱一個）
+    版面：header（int64 × 8：magic, h, w, c, slots, 最新序號）→ 每格 meta（float64 × 2：序號, 時間戳）→ 每格畫面
+    - 寫入端（取幀執行緒）直接把 FFmpeg 輸出 readinto 進下一格，寫入期間該格序號設為 -1，完成後才寫入序號
+    - 讀取端永遠取最新一格，拿到的是共享記憶體上的唯讀 view（不複製）；其他程序可用 shm_name 附掛後同樣讀取
+    - 一格會在之後 slots - 1 張畫面後被覆寫；讀取端用完後以 is_current() 確認期間沒被覆寫
+    - 以參照計數管理生命週期：每個 FrameRef 與寫入執行緒各持有一份，close() 在最後一份釋放後才真正解除映射
+    """
+
+    MAGIC = 0x41535247  # "ASRG"
+    HEADER_BYTES = 64
+    META_BYTES = 16
+
+    def __init__(self, name: str, h: int, w: int, c: int = 3, slots: int = 8):
+        self.name = name
+        self.slots = max(2, int(slots))
+        self.shape = (h, w, c)
+        size = self.HEADER_BYTES + self.slots * (self.META_BYTES + h * w * c)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.shm_name = self.shm.name
+        np.ndarray((8,), dtype=np.int64, buffer=self.shm.buf)[:] = [self.MAGIC, h, w, c, self.slots, 0, 0, 0]
+        self._hdr, self._meta, self._frames = self.views(self.shm)
+        self._meta[:, 0] = -1
+        self._write_seq = 0
+        self._refs = 0
+        self._closing = False
+        self._ref_lock = threading.Lock()
+
+    @classmethod
+    def views(cls, shm: shared_memory.SharedMemory) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """由共享記憶體建立 (header, meta, frames) 三個 view；本程序與比對工作程序共用同一套版面解析"""
+        hdr = np.ndarray((8,), dtype=np.int64, buffer=shm.buf)
+        if hdr[0] != cls.MAGIC:
+            raise ValueError(f"共享記憶體 {shm.name} 不是畫面環形緩衝")
+        h, w, c, slots = (int(x) for x in hdr[1:5])
+        meta = np.ndarray((slots, 2), dtype=np.float64, buffer=shm.buf, offset=cls.HEADER_BYTES)
+        frames = np.ndarray(
+            (slots, h, w, c), dtype=np.uint8, buffer=shm.buf, offset=cls.HEADER_BYTES + slots * cls.META_BYTES
+        )
+        return hdr, meta, frames
+
+    # ---------- 寫入端（單一取幀執行緒） ----------
+    def begin_write(self) -> Tuple[int, memoryview]:
+        slot = self._write_seq % self.slots
+        self._meta[slot, 0] = -1  # 標記寫入中，讀取端看到序號不符即視為無效
+        return slot, memoryview(self._frames[slot]).cast("B")
+
+    def commit(self, slot: int, ts: float) -> int:
+        self._write_seq += 1
+        self._meta[slot, 1] = ts
+        self._meta[slot, 0] = self._write_seq
+        self._hdr[5] = self._write_seq
+        return self._write_seq
+
+    # ---------- 參照計數 ----------
+    def retain(self) -> bool:
+        """多持有一份參照；已在關閉中則回傳 False（不可再使用）"""
+        with self._ref_lock:
+            if self._closing:
+                return False
+            self._refs += 1
+            return True
+
+    def release(self) -> None:
+        with self._ref_lock:
+            self._refs -= 1
+            if self._refs > 0 or not self._closing:
+                return
+        self._unmap()
+
+    # ---------- 讀取端 ----------
+    def latest(self) -> Optional["FrameRef"]:
+        if not self.retain():
+            return None
+        for _ in range(3):  # 剛好碰上寫入端換格時重試
+            seq = int(self._hdr[5])
+            if seq <= 0:
+                break
+            slot = (seq - 1) % self.slots
+            ts = float(self._meta[slot, 1])
+            if int(self._meta[slot, 0]) == seq:
+                return FrameRef(self, slot, seq, ts)  # 這份參照交給 FrameRef，FrameRef 回收時釋放
+        self.release()
+        return None
+
+    def slot_seq(self, slot: int) -> int:
+        return int(self._meta[slot, 0]) if self._meta is not None else -1
+
+    def frame_view(self, slot: int) -> np.ndarray:
+        if self._frames is None:
+            raise StaleFrameError(f"[{self.name}] 環形緩衝已關閉")
+        view = self._frames[slot].view()
+        view.flags.writeable = False
+        return view
+
+    def close(self) -> None:
+        """不再發出新的參照；仍有 FrameRef 或寫入執行緒持有時，等最後一份釋放才解除映射"""
+        with self._ref_lock:
+            if self._closing:
+                return
+            self._closing = True
+            if self._refs > 0:
+                return
+        self._unmap()
+
+    def _unmap(self) -> None:
+        # 自己持有的 view 也算 export，要先放掉才能 close
+        self._hdr = self._meta = self._frames = None  # type: ignore[assignment]
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # 仍有讀取端持有 view；mapping 會在 view 釋放後由 GC 收掉
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+@dataclass
+class FrameRef:
+    """
+    環形緩衝中某一格畫面的參照：array 為共享記憶體上的唯讀 view，不複製
+    由 FrameRing.latest() 建立並持有環形緩衝的一份參照，物件回收時釋放（環形緩衝不會在使用中被解除映射）
+    """
+    ring: FrameRing
+    slot: int
+    seq: int
+    ts: float
+
+    def __del__(self):
+        self.ring.release()
+
+    @property
+    def array(self) -> np.ndarray:
+        return self.ring.frame_view(self.slot)
+
+    def is_current(self) -> bool:
+        """這一格是否仍是取得時的那張畫面（尚未被寫入端覆寫）"""
+        return self.ring.slot_seq(self.slot) == self.seq
+
+
+class RtmpFrameGrabber:
+    """
+    針對單一 RTMP 串流常駐一個 FFmpeg 解碼程序：
+    - FFmpeg 以 rawvideo/bgr24 持續把畫面寫進 stdout pipe，背景執行緒直接 readinto 共享記憶體環形緩衝（FrameRing）
+    - spin 迴圈呼叫 latest() 直接取最新一格的參照（FrameRef），不必每次重新握手、等關鍵幀，也不複製畫面
+    - 有 dup_detector 時，每張讀進來的畫面都做重複比對，last_change_seq 記錄最後一張「有變化」畫面的序號
+    - 程序結束或超過 stall_timeout 沒有新畫面時，自動重連（退避 1s → 最多 30s）
+    """
+
+    # 輸出串流資訊例：Stream #0:0: Video: rawvideo (BGR[24] / 0x18524742), bgr24, 1920x1080, ...
+    _SIZE_RE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+
+    def __init__(
+        self,
+        ffmpeg_path: Path,
+        rtmp_url: str,
+        name: Optional[str] = None,
+        fps: float = 5.0,
+        stall_timeout: float = 10.0,
+        open_timeout: float = 15.0,
+        ring_slots: int = 8,
+        dup_detector: Optional[FrameDupDetector] = None,
+    ):
+        self.ffmpeg = ffmpeg_path
+        self.rtmp_url = rtmp_url
+        self.name = name or "rtmp"
+        self.fps = fps
+        self.stall_timeout = stall_timeout
+        self.open_timeout = open_timeout
+        self.ring_slots = ring_slots
+        self.dup_detector = dup_detector
+        self.last_change_seq = 0  # 最後一張與前一張不同的畫面序號（凍結時不再前進）
+
+        self._lock = threading.Lock()
+        self._ring: Optional[FrameRing] = None
+        self._frame_ts = 0.0
+        self._seq = 0
+        self._new_frame = threading.Condition(self._lock)
+
+        self._proc = None  # type: Optional[subprocess.Popen]
+        self._size: Optional[Tuple[int, int]] = None
+        self._size_event = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reconnects = 0
+
+    # ---------- 生命週期 ----------
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._supervise, name=f"Grabber-{self.name}", daemon=True)
+        self._thread.start()
+        logging.info(f"[Grabber][{self.name}] 啟動常駐取幀（fps={self.fps}）")
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._kill_proc()
+        if self._thread is not None:
+            self._thread.join(timeout=3.0)
+        with self._lock:
+            ring, self._ring = self._ring, None
+        if ring is not None:
+            ring.close()
+        logging.info(f"[Grabber][{self.name}] 已停止")
+
+    # ---------- 對外讀取 ----------
+    def _latest_locked(self, max_age: Optional[float]) -> Optional[FrameRef]:
+        if self._ring is None:
+            return None
+        ref = self._ring.latest()
+        if ref is None or (max_age is not None and time.time() - ref.ts > max_age):
+            return None
+        return ref
+
+    def latest(self, max_age: Optional[float] = None) -> Optional[FrameRef]:
+        """
+        非阻塞取得最新畫面的參照（FrameRef：array / ts / seq）；
+        尚無畫面或畫面比 max_age 秒還舊時回傳 None。
+        ref.array 是共享記憶體上的唯讀 view，約 (ring_slots - 1) / fps 秒後會被新畫面覆寫，
+        用完後以 ref.is_current() 確認；要長期保留請自行 copy()。
+        """
+        with self._lock:
+            return self._latest_locked(max_age)
+
+    def wait_frame(self, timeout: float, max_age: Optional[float] = None) -> Optional[FrameRef]:
+        """等待至多 timeout 秒拿到一張（夠新的）畫面；主要用在剛啟動、尚未收到第一張時"""
+        deadline = time.time() + timeout
+        with self._new_frame:
+            while True:
+                ref = self._latest_locked(max_age)
+                if ref is not None:
+                    return ref
+                remaining = deadline - time.time()
+                if remaining <= 0 or self._stop.is_set():
+                    return None
+                self._new_frame.wait(remaining)
+
+    # ---------- 內部：FFmpeg 程序管理 ----------
+    def _build_cmd(self) -> List[str]:
+        return [
+            str(self.ffmpeg), "-hide_banner", "-nostats", "-loglevel", "info",
+            "-fflags", "nobuffer",
+            "-flags", "low_delay",
+            "-rtmp_live", "live",
+            "-i", self.rtmp_url,
+            "-an", "-sn", "-dn",
+            "-vf", f"fps={self.fps}",
+            "-pix_fmt", "bgr24",
+            "-f", "rawvideo",
+            "pipe:1",
+        ]
+
+    def _kill_proc(self) -> None:
+        proc = self._proc
+        if proc is None:
+            return
+        try:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait(timeout=3.0)
+        except Exception as e:
+            logging.debug(f"[Grabber][{self.name}] 結束 FFmpeg 程序時發生錯誤: {e}")
+        self._proc = None
+
+    def _read_stderr(self, proc) -> None:
+        """持續讀取 stderr（避免 pipe 塞滿卡住 FFmpeg），並從 Output 區段解析畫面尺寸"""
+        in_output = False
+        try:
+            for raw in iter(proc.stderr.readline, b""):
+                line = raw.decode("utf-8", errors="replace")
+                if line.startswith("Output #"):
+                    in_output = True
+                elif in_output and self._size is None and "Video:" in line:
+                    m = self._SIZE_RE.search(line)
+                    if m:
+                        self._size = (int(m.group(1)), int(m.group(2)))
+                        self._size_event.set()
+        except Exception:
+            pass
+
+    def _ensure_ring(self) -> FrameRing:
+        """依解析出的尺寸準備環形緩衝；重連後尺寸改變才換一塊新的"""
+        w, h = self._size
+        with self._lock:
+            ring = self._ring
+            if ring is not None and ring.shape == (h, w, 3):
+                return ring
+            self._ring = FrameRing(self.name, h, w, 3, slots=self.ring_slots)
+        if ring is not None:
+            ring.close()
+        return self._ring
+
+    def _read_frames(self, proc, ring: FrameRing) -> None:
+        """整張整張地把 stdout 的 BGR 畫面直接讀進環形緩衝的下一格（讀取期間持有環形緩衝的參照）"""
+        if not ring.retain():
+            return
+        try:
+            self._fill_ring(proc, ring)
+        finally:
+            ring.release()
+
+    def _fill_ring(self, proc, ring: FrameRing) -> None:
+        h, w, c = ring.shape
+        frame_bytes = h * w * c
+        stdout = proc.stdout
+        while not self._stop.is_set():
+            slot, view = ring.begin_write()
+            got = 0
+            while got < frame_bytes:
+                n = stdout.readinto(view[got:])
+                if not n:
+                    return  # EOF：程序結束或被 watchdog 砍掉（這一格維持「寫入中」，讀取端不會取用）
+                got += n
+            ts = time.time()
+            with self._new_frame:
+                seq = self._seq = ring.commit(slot, ts)
+                self._frame_ts = ts
+                self._new_frame.notify_all()
+            # 重複畫面：每張都比（縮圖約 0.1 ms）；本執行緒是唯一寫入端，這一格在下一輪 begin_write 前不會變
+            if self.dup_detector is not None and self.dup_detector.observe(self.name, ring.frame_view(slot)) == 0:
+                self.last_change_seq = seq
+
+    def _supervise(self) -> None:
+        """主監控迴圈：啟動 FFmpeg → 讀取畫面 → 斷線/卡住時重連"""
+        backoff = 1.0
+        while not self._stop.is_set():
+            self._size = None
+            self._size_event.clear()
+            try:
+                self._proc = subprocess.Popen(
+                    self._build_cmd(), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+                )
+            except FileNotFoundError:
+                logging.error(f"[Grabber][{self.name}] 找不到 FFmpeg 執行檔，停止常駐取幀")
+                return
+            except Exception as e:
+                logging.warning(f"[Grabber][{self.name}] FFmpeg 啟動失敗: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            proc = self._proc
+            threading.Thread(target=self._read_stderr, args=(proc,), daemon=True).start()
+
+            if not self._size_event.wait(self.open_timeout) or self._stop.is_set():
+                if not self._stop.is_set():
+                    logging.warning(f"[Grabber][{self.name}] {self.open_timeout:.0f}s 內未取得畫面尺寸，重連")
+                self._kill_proc()
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            logging.info(f"[Grabber][{self.name}] 串流已連線，畫面尺寸 {self._size[0]}x{self._size[1]}")
+            reader = threading.Thread(target=self._read_frames, args=(proc, self._ensure_ring()), daemon=True)
+            reader.start()
+            started_at = time.time()
+
+            # watchdog：程序結束或太久沒有新畫面 → 砍掉重連
+            while not self._stop.is_set() and reader.is_alive():
+                self._stop.wait(0.5)
+                with self._lock:
+                    last = self._frame_ts if self._frame_ts >= started_at else started_at
+                if time.time() - last > self.stall_timeout:
+                    logging.warning(f"[Grabber][{self.name}] 超過 {self.stall_timeout:.0f}s 無新畫面，重連")
+                    break
+
+            self._kill_proc()
+            reader.join(timeout=3.0)
+            if self._stop.is_set():
+                break
+
+            with self._lock:
+                got_frames = self._frame_ts >= started_at
+            backoff = 1.0 if got_frames else min(backoff * 2, 30.0)
+            self.reconnects += 1
+            logging.info(f"[Grabber][{self.name}] {backoff:.0f}s 後重連（第 {self.reconnects} 次）")
+            self._stop.wait(backoff)
+
+
+class FrameGrabberPool:
+    """以 rtmp_url 為 key 共用 RtmpFrameGrabber（同一串流只開一個解碼程序），lazy 啟動"""
+
+    def __init__(
+        self,
+        ffmpeg_path: Path,
+        fps: float = 5.0,
+        stall_timeout: float = 10.0,
+        ring_slots: int = 8,
+        dup_detector: Optional[FrameDupDetector] = None,
+    ):
+        self.ffmpeg = ffmpeg_path
+        self.fps = fps
+        self.stall_timeout = stall_timeout
+        self.ring_slots = ring_slots
+        self.dup_detector = dup_detector
+        self._grabbers: Dict[str, RtmpFrameGrabber] = {}
+        self._lock = threading.Lock()
+
+    def get(self, rtmp_url: str, name: Optional[str] = None) -> RtmpFrameGrabber:
+        with self._lock:
+            grabber = self._grabbers.get(rtmp_url)
+            if grabber is None:
+                grabber = RtmpFrameGrabber(
+                    self.ffmpeg, rtmp_url, name=name, fps=self.fps, stall_timeout=self.stall_timeout,
+                    ring_slots=self.ring_slots, dup_detector=self.dup_detector,
+                )
+                self._grabbers[rtmp_url] = grabber
+                grabber.start()
+            return grabber
+
+    def stop_all(self) -> None:
+        with self._lock:
+            grabbers = list(self._grabbers.values())
+            self._grabbers.clear()
+        for g in grabbers:
+            try:
+                g.stop()
+            except Exception as e:
+                logging.debug(f"[Grabber] 停止時發生錯誤: {e}")
+
+
+# =========================== 錄影（串流複製 + 預錄緩衝） ===========================
+class SegmentRecordingJob:
+    """
+    一次觸發錄影：等 post_roll 秒後，把緩衝中「觸發前 pre_roll 秒 ～ 觸發後 post_roll 秒」的切片以 -c copy 串接成 MP4
+    介面與 subprocess.Popen 相容（poll / wait / kill / returncode），可直接交給 RecordingScheduler 輪詢
+    """
+
+    def __init__(self, recorder: "SegmentRecorder", out_mp4: Path, trigger_at: float, pre_roll: float, post_roll: float):
+        self.recorder = recorder
+        self.out_mp4 = out_mp4
+        self.trigger_at = trigger_at
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.returncode: Optional[int] = None
+        self._cancel = threading.Event()
+        self._proc = None  # type: Optional[subprocess.Popen]
+        self._thread = threading.Thread(target=self._run, name=f"SegJob-{recorder.name}", daemon=True)
+        self._thread.start()
+
+    def poll(self) -> Optional[int]:
+        return None if self._thread.is_alive() else self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        self._thread.join(timeout)
+        return self.poll()
+
+    def kill(self) -> None:
+        self._cancel.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+
+    terminate = kill
+
+    def _run(self) -> None:
+        job_dir = None
+        try:
+            # 等觸發後的畫面錄完，再多等一個切片讓最後一段關檔
+            end_at = self.trigger_at + self.post_roll
+            if self._cancel.wait(max(0.0, end_at - time.time()) + self.recorder.segment_seconds + 1.0):
+                self.returncode = -1
+                return
+            # GOP 長時最後一段會更晚關檔：依 segment_list 再等到涵蓋 end_at（最多再等 4 個切片長）
+            deadline = time.time() + self.recorder.segment_seconds * 4
+            while time.time() < deadline:
+                covered = self.recorder.covered_until()
+                if covered is None or covered >= end_at:
+                    break
+                if self._cancel.wait(0.5):
+                    self.returncode = -1
+                    return
+            segments = self.recorder.segments_between(self.trigger_at - self.pre_roll, end_at)
+            if not segments:
+                logging.error(f"[Record][{self.recorder.name}] 緩衝中沒有可用切片，無法輸出 {self.out_mp4.name}")
+                self.returncode = 1
+                return
+            # 先複製到獨立資料夾再串接，避免串接途中切片被循環覆寫
+            job_dir = self.recorder.buffer_dir.parent / f"job_{self.out_mp4.stem}"
+            job_dir.mkdir(parents=True, exist_ok=True)
+            lines = []
+            for i, seg in enumerate(segments):
+                dst = job_dir / f"{i:04d}.ts"
+                shutil.copyfile(seg, dst)
+                lines.append(f"file '{dst.as_posix()}'")
+            list_file = job_dir / "list.txt"
+            list_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            cmd = [
+                str(self.recorder.ffmpeg), "-y", "-hide_banner", "-loglevel", "error",
+                "-f", "concat", "-safe", "0", "-i", str(list_file),
+                "-c", "copy",
+                "-movflags", "+faststart",
+                str(self.out_mp4),
+            ]
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            _, err = self._proc.communicate()
+            self.returncode = self._proc.returncode
+            if self.returncode == 0:
+                logging.info(f"[Record][{self.recorder.name}] 錄影完成（{len(segments)} 段，含觸發前 {self.pre_roll:.0f}s）→ {self.out_mp4.name}")
+            else:
+                logging.error(f"[Record][{self.recorder.name}] 串接輸出失敗：{(err or b'').decode(errors='replace').strip()[-300:]}")
+        except Exception as e:
+            logging.error(f"[Record][{self.recorder.name}] 錄影輸出發生例外：{e}\n{traceback.format_exc()}")
+            self.returncode = 1
+        finally:
+            if job_dir is not None:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+
+class SegmentRecorder:
+    """
+    針對單一 RTMP 串流常駐一個 -c copy 切片程序（不重新編碼，閒置時幾乎不吃 CPU）：
+    - 以 segment_wrap 循環覆寫，緩衝至少涵蓋 pre_roll + 最長 post_roll
+    - -c copy 只能在關鍵幀切段，GOP 長時實際切片會比 segment_seconds 長；
+      每段的實際起訖時間由 FFmpeg 寫進 segment_list（CSV：檔名, 開始, 結束），挑選切片以此為準
+    - trigger() 回傳 SegmentRecordingJob，post_roll 秒後輸出含觸發前畫面的 MP4
+    - 切片程序結束時自動重啟（退避 1s → 最多 30s）
+    """
+
+    LIST_NAME = "segments.csv"
+
+    def __init__(
+        self,
+        ffmpeg_path: Path,
+        rtmp_url: str,
+        name: str,
+        buffer_root: Path,
+        pre_roll: float = 20.0,
+        segment_seconds: float = 2.0,
+        max_post_roll: float = 120.0,
+    ):
+        self.ffmpeg = ffmpeg_path
+        self.rtmp_url = rtmp_url
+        self.name = name
+        self.pre_roll = pre_roll
+        self.segment_seconds = max(1.0, segment_seconds)
+        safe = re.sub(r"[^0-9A-Za-z_.-]", "_", name)
+        self.buffer_dir = buffer_root / safe
+        self.wrap = int(np.ceil((pre_roll + max_post_roll) / self.segment_seconds)) + 4
+        self.list_path = self.buffer_dir / self.LIST_NAME
+        self._proc = None  # type: Optional[subprocess.Popen]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self.buffer_dir.mkdir(parents=True, exist_ok=True)
+        for old in list(self.buffer_dir.glob("seg_*.ts")) + [self.list_path]:  # 上次執行留下的切片不屬於這次的串流時間軸
+            old.unlink(missing_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._supervise, name=f"SegRec-{self.name}", daemon=True)
+        self._thread.start()
+        logging.info(f"[Record][{self.name}] 啟動預錄緩衝（{self.wrap} 段 × {self.segment_seconds:.0f}s，stream copy）")
+
+    def stop(self) -> None:
+        self._stop.set()
+        proc = self._proc
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+        if self._thread is not None:
+            self._thread.join(timeout=3.0)
+
+    def _build_cmd(self) -> List[str]:
+        return [
+            str(self.ffmpeg), "-hide_banner", "-nostats", "-loglevel", "error",
+            "-rtmp_live", "live",
+            "-i", self.rtmp_url,
+            "-map", "0:v", "-map", "0:a?",
+            "-c", "copy",
+            "-f", "segment",
+            "-segment_time", f"{self.segment_seconds:g}",
+            "-segment_wrap", str(self.wrap),
+            "-segment_format", "mpegts",
+            # 已完成切片的實際起訖時間；只保留 wrap - 1 筆，清單中的檔案不會是正在覆寫的那一段
+            "-segment_list", str(self.list_path),
+            "-segment_list_type", "csv",
+            "-segment_list_size", str(self.wrap - 1),
+            "-reset_timestamps", "1",
+            str(self.buffer_dir / "seg_%04d.ts"),
+        ]
+
+    def _supervise(self) -> None:
+        backoff = 1.0
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self._proc = subprocess.Popen(
+                    self._build_cmd(), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+                )
+            except FileNotFoundError:
+                logging.error(f"[Record][{self.name}] 找不到 FFmpeg 執行檔，停止預錄緩衝")
+                return
+            except Exception as e:
+                logging.warning(f"[Record][{self.name}] 預錄緩衝啟動失敗: {e}")
+            else:
+                while self._proc.poll() is None and not self._stop.wait(1.0):
+                    pass
+            if self._stop.is_set():
+                break
+            backoff = 1.0 if time.time() - started > 30.0 else min(backoff * 2, 30.0)
+            logging.warning(f"[Record][{self.name}] 預錄緩衝中斷，{backoff:.0f}s 後重啟")
+            self._stop.wait(backoff)
+
+    def _listed_segments(self) -> List[Tuple[Path, float, float]]:
+        """
+        讀取 segment_list，回傳 [(切片, 開始, 結束)]（系統時間，舊到新）；清單不存在或讀不到時回傳空清單
+        清單內是串流時間，以最新一段的修改時間（= 該段關檔時間）對齊成系統時間
+        """
+        try:
+            text = self.list_path.read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            return []
+        rows = []
+        for line in text.splitlines():
+            parts = line.rsplit(",", 2)
+            if len(parts) != 3:
+                continue  # FFmpeg 改寫清單途中讀到的半行
+            try:
+                t0, t1 = float(parts[1]), float(parts[2])
+            except ValueError:
+                continue
+            rows.append((self.buffer_dir / parts[0].strip('"'), t0, t1))
+        if not rows:
+            return []
+        try:
+            offset = rows[-1][0].stat().st_mtime - rows[-1][2]
+        except OSError:
+            return []
+        return [(p, t0 + offset, t1 + offset) for p, t0, t1 in rows]
+
+    def covered_until(self) -> Optional[float]:
+        """已完成切片涵蓋到的系統時間；沒有清單時回傳 None"""
+        rows = self._listed_segments()
+        return rows[-1][2] if rows else None
+
+    def segments_between(self, start: float, end: float) -> List[Path]:
+        """
+        挑出與 [start, end] 有交集的完整切片，舊到新排序：
+        - 優先依 segment_list 的實際起訖時間（長 GOP 時切片比 segment_seconds 長也不會挑錯）
+        - 沒有清單時退回依修改時間推算（假設每段 segment_seconds 秒）；正在寫入的最新一段不列入
+        """
+        listed = self._listed_segments()
+        if listed:
+            return [p for p, t0, t1 in listed if t1 >= start and t0 <= end and p.exists()]
+
+        segs = []
+        for p in self.buffer_dir.glob("seg_*.ts"):
+            st = p.stat()
+            segs.append((st.st_mtime, -st.st_size, p))
+        # 新切片剛開檔時 mtime 可能與上一段相同：同時間以較小者（剛開始寫的那段）排在後面
+        segs.sort(key=lambda x: (x[0], x[1]))
+        if segs and self._proc is not None and self._proc.poll() is None:
+            segs = segs[:-1]
+        out = []
+        for mtime, neg_size, p in segs:
+            # 切片涵蓋 (mtime - 切片長, mtime]；與視窗有交集即納入
+            if neg_size < 0 and mtime >= start and mtime - self.segment_seconds <= end:
+                out.append(p)
+        return out
+
+    def trigger(self, out_mp4: Path, post_roll: float, trigger_at: Optional[float] = None) -> SegmentRecordingJob:
+        return SegmentRecordingJob(self, out_mp4, trigger_at or time.time(), self.pre_roll, post_roll)
+
+
+class SegmentRecorderPool:
+    """以 rtmp_url 為 key 共用 SegmentRecorder（同一串流只開一個切片程序），lazy 啟動"""
+
+    def __init__(self, ffmpeg_path: Path, buffer_root: Path, pre_roll: float = 20.0, segment_seconds: float = 2.0):
+        self.ffmpeg = ffmpeg_path
+        self.buffer_root = buffer_root
+        self.pre_roll = pre_roll
+        self.segment_seconds = segment_seconds
+        self._recorders: Dict[str, SegmentRecorder] = {}
+        self._lock = threading.Lock()
+
+    def get(self, rtmp_url: str, name: Optional[str] = None) -> SegmentRecorder:
+        with self._lock:
+            rec = self._recorders.get(rtmp_url)
+            if rec is None:
+                rec = SegmentRecorder(
+                    self.ffmpeg, rtmp_url, name or f"rtmp{len(self._recorders)}", self.buffer_root,
+                    pre_roll=self.pre_roll, segment_seconds=self.segment_seconds,
+                )
+                self._recorders[rtmp_url] = rec
+                rec.start()
+            return rec
+
+    def stop_all(self) -> None:
+        with self._lock:
+            recorders = list(self._recorders.values())
+            self._recorders.clear()
+        for r in recorders:
+            try:
+                r.stop()
+            except Exception as e:
+                logging.debug(f"[Record] 停止預錄緩衝時發生錯誤: {e}")
+
+
+@dataclass
+class RecordingTicket:
+    """一筆錄影請求的狀態；由 RecordingScheduler 的監控執行緒更新，機台執行緒只讀取"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    DROPPED = "dropped"
+
+    name: str
+    out_mp4: Path
+    kind: str
+    cost: float
+    encoder: bool
+    submitted_at: float
+    state: str = QUEUED
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    returncode: Optional[int] = None
+
+    @property
+    def pending(self) -> bool:
+        """排隊中或錄影中（尚未結束）：用來避免同一台重複排入錄影"""
+        return self.state in (self.QUEUED, self.RUNNING)
+
+    @property
+    def running(self) -> bool:
+        """錄影程序已真正開始"""
+        return self.state == self.RUNNING
+
+
+class RecordingScheduler:
+    """
+    全程序共用的錄影排程：
+    - 機台執行緒 submit() 後立即返回 RecordingTicket，不等錄影程序
+    - 依觸發類型排優先序（錯誤模板 > 低分觸發），同優先序先到先錄
+    - 同時執行的重新編碼錄影不超過 max_concurrent，重新編碼錄影的 cost 總和不超過 cpu_budget
+      （沒有重新編碼錄影在跑時一律放行一筆，避免單筆 cost 大於預算而永遠排不到）；重新編碼之間嚴格依優先序
+    - 串流複製錄影（encoder=False）幾乎不吃 CPU，不受上述限制、不排在重新編碼後面，輪到就立即開始
+    - 單一監控執行緒統一 poll() 所有錄影程序、更新 ticket 狀態，機台執行緒不必各自輪詢
+    - 重新編碼的請求排隊超過 queue_timeout 秒仍未開始直接放棄（異常畫面早已過去）；
+      串流複製的觸發時間在排入時已固定，晚點開始也不會漏掉畫面，因此不因排隊逾時而放棄
+    """
+
+    PRIORITY = {"error": 0, "low_score": 1}
+
+    def __init__(self, max_concurrent: int = 2, cpu_budget: float = 2.0, queue_timeout: float = 60.0, poll_interval: float = 0.5):
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.cpu_budget = float(cpu_budget)
+        self.queue_timeout = float(queue_timeout)
+        self.poll_interval = poll_interval
+        self._heap: List[Tuple[int, int, RecordingTicket, Callable[[], object], Optional[Callable]]] = []
+        self._running: List[Tuple[RecordingTicket, object, Optional[Callable]]] = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {"submitted": 0, "started": 0, "done": 0, "failed": 0, "dropped": 0, "max_queue_depth": 0}
+
+    # ---------- 對外 ----------
+    def submit(
+        self,
+        name: str,
+        out_mp4: Path,
+        starter: Callable[[], object],
+        *,
+        kind: str = "low_score",
+        cost: float = 1.0,
+        encoder: bool = True,
+        on_start: Optional[Callable[[RecordingTicket], None]] = None,
+    ) -> RecordingTicket:
+        """
+        排入一筆錄影；starter() 於輪到時在監控執行緒呼叫，回傳 Popen 相容物件（有 poll()），失敗回傳 None 或拋例外
+        on_start(ticket) 於錄影真正開始時呼叫
+        """
+        ticket = RecordingTicket(name, out_mp4, kind, float(cost), bool(encoder), submitted_at=time.time())
+        with self._cond:
+            self._seq += 1
+            heapq.heappush(self._heap, (self.PRIORITY.get(kind, 9), self._seq, ticket, starter, on_start))
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._heap))
+            depth = len(self._heap)
+            self._ensure_thread()
+            self._cond.notify()
+        logging.info(f"[RecordQ] 排入錄影 {out_mp4.name}（{kind}），排隊 {depth} 筆、執行中 {len(self._running)} 筆")
+        return ticket
+
+    @property
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def metrics(self) -> Dict[str, float]:
+        """目前排隊數、執行數、已用 CPU 預算，以及累計統計"""
+        with self._cond:
+            return {
+                "queued": len(self._heap),
+                "running": len(self._running),
+                "encoders_running": sum(1 for t, _, _ in self._running if t.encoder),
+                "cost_in_use": round(sum(t.cost for t, _, _ in self._running), 2),
+                **self._stats,
+            }
+
+    def stop(self) -> None:
+        """停止監控執行緒（已在跑的錄影程序不強制結束，讓它錄完）"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=3.0)
+        m = self.metrics()
+        if m["submitted"]:
+            logging.info(
+                f"[RecordQ] 統計：排入 {m['submitted']}、開始 {m['started']}、完成 {m['done']}、"
+                f"失敗 {m['failed']}、逾時放棄 {m['dropped']}、最大排隊 {m['max_queue_depth']}"
+            )
+
+    # ---------- 監控執行緒 ----------
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._monitor, name="RecordScheduler", daemon=True)
+            self._thread.start()
+
+    def _can_start(self, ticket: RecordingTicket) -> bool:
+        if not ticket.encoder:
+            return True
+        encoders = [t for t, _, _ in self._running if t.encoder]
+        if not encoders:
+            return True
+        if len(encoders) >= self.max_concurrent:
+            return False
+        return sum(t.cost for t in encoders) + ticket.cost <= self.cpu_budget
+
+    def _poll_running(self) -> None:
+        still = []
+        for ticket, proc, on_start in self._running:
+            try:
+                rc = proc.poll()
+            except Exception as e:
+                logging.debug(f"[RecordQ] 檢查錄影程序狀態時發生錯誤: {e}")
+                rc = -1
+            if rc is None:
+                still.append((ticket, proc, on_start))
+                continue
+            ticket.returncode = rc
+            ticket.finished_at = time.time()
+            ticket.state = RecordingTicket.DONE if rc == 0 else RecordingTicket.FAILED
+            self._stats["done" if rc == 0 else "failed"] += 1
+            logging.info(f"[RecordQ] 錄影結束 {ticket.out_mp4.name} rc={rc}（{ticket.finished_at - ticket.started_at:.0f}s）")
+        self._running = still
+
+    def _start_queued(self) -> None:
+        now = time.time()
+        waiting = []
+        encoder_blocked = False
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            _, _, ticket, starter, on_start = item
+            if ticket.encoder and now - ticket.submitted_at > self.queue_timeout:
+                ticket.state = RecordingTicket.DROPPED
+                ticket.finished_at = now
+                self._stats["dropped"] += 1
+                logging.warning(f"[RecordQ] 排隊超過 {self.queue_timeout:.0f}s，放棄錄影 {ticket.out_mp4.name}")
+                continue
+            if ticket.encoder and (encoder_blocked or not self._can_start(ticket)):
+                encoder_blocked = True  # 重新編碼嚴格依優先序：最前面的排不進去，後面的重新編碼也等
+                waiting.append(item)
+                continue
+            self._launch(ticket, starter, on_start)
+        for item in waiting:
+            heapq.heappush(self._heap, item)
+
+    def _launch(self, ticket: RecordingTicket, starter: Callable[[], object], on_start: Optional[Callable]) -> None:
+        try:
+            proc = starter()
+        except Exception as e:
+            logging.error(f"[RecordQ] 啟動錄影失敗 {ticket.out_mp4.name}: {e}")
+            proc = None
+        if proc is None:
+            ticket.state = RecordingTicket.FAILED
+            ticket.finished_at = time.time()
+            self._stats["failed"] += 1
+            return
+        ticket.state = RecordingTicket.RUNNING
+        ticket.started_at = time.time()
+        self._stats["started"] += 1
+        self._running.append((ticket, proc, on_start))
+        waited = ticket.started_at - ticket.submitted_at
+        logging.info(
+            f"[RecordQ] 開始錄影 {ticket.out_mp4.name}（排隊 {waited:.1f}s），"
+            f"執行中 {len(self._running)} 筆、剩餘排隊 {len(self._heap)} 筆"
+        )
+        if on_start is not None:
+            try:
+                on_start(ticket)
+            except Exception as e:
+                logging.debug(f"[RecordQ] on_start 回呼發生錯誤: {e}")
+
+    def _monitor(self) -> None:
+        # 一律在 _cond 上等待：submit() / stop() 的 notify 能立即喚醒，新請求不必等到下一次輪詢
+        while not self._stop.is_set():
+            with self._cond:
+                self._poll_running()
+                self._start_queued()
+                if self._stop.is_set():
+                    break
+                self._cond.wait(5.0 if not self._heap and not self._running else self.poll_interval)
+
 
 # =========================== 404 頁面檢測 ===========================
 def is_404_page(driver):
@@ -733,9 +3051,9 @@ def is_404_page(driver):
     返回:
         bool: True 表示是 404 頁面，False 表示不是
         
-    檢測方法:
+    檢測方法（在頁面內以一次 execute_script 完成，不下載 page_source）:
         1. 檢查頁面標題（包含 "404" 或 "not found"）
-        2. 檢查頁面內容（包含 "404 not found" 或 "nginx/1.20.1"）
+        2. 檢查頁面內文前 2000 字（包含 "404 not found" 或 "nginx/1.20.1"）
         3. 檢查 URL（包含 "404"）
         
     異常處理:
@@ -746,24 +3064,10 @@ def is_404_page(driver):
         - 避免誤判導致不必要的刷新
     """
     try:
-        # 檢查頁面標題
-        page_title = driver.title.lower()
-        if "404" in page_title or "not found" in page_title:
-            logging.warning("🚨 檢測到 404 頁面（通過標題）")
+        source = driver.execute_script(_ERROR_PAGE_JS)
+        if source:
+            logging.warning(f"🚨 檢測到 404 頁面（通過{_ERROR_PAGE_SOURCES.get(source, source)}）")
             return True
-        
-        # 檢查頁面內容
-        page_source = driver.page_source.lower()
-        if "404 not found" in page_source or "nginx/1.20.1" in page_source:
-            logging.warning("🚨 檢測到 404 頁面（通過內容）")
-            return True
-        
-        # 檢查 URL
-        current_url = driver.current_url.lower()
-        if "404" in current_url:
-            logging.warning("🚨 檢測到 404 頁面（通過 URL）")
-            return True
-        
         return False
         
     except Exception as e:
@@ -771,6 +3075,250 @@ def is_404_page(driver):
         return False
 
 
+# =========================== Spin 節奏（spin_profiles.json） ===========================
+@dataclass
+class SpinProfile:
+    """
+    單一機台解析後的 Spin 節奏設定（毫秒為單位，與 spin_profiles.json 一致）
+
+    mode:
+        - fixed：每次間隔 interval_ms ± jitter_ms
+        - burst：連續 burst_count 次以 burst_gap_ms 間隔快速 Spin，之後休息 interval_ms ± jitter_ms
+        - adaptive：餘額低於 low_balance_threshold 時改用 slow_interval_ms（其餘同 fixed）
+    """
+    mode: str = "fixed"
+    interval_ms: int = 1000
+    jitter_ms: int = 0
+    after_recording_delay_sec: float = 10.0
+    on_fail_backoff_ms: List[int] = field(default_factory=lambda: [1000])
+    cooldown_ms: int = 0
+    burst_count: int = 1
+    burst_gap_ms: int = 0
+    low_balance_threshold: Optional[int] = None
+    slow_interval_ms: Optional[int] = None
+    source: str = "default"  # 套用了哪些層（例如 "default+types.MOREPUFF+machines.WF9051"），供日誌辨識
+
+    @classmethod
+    def from_dict(cls, raw: dict, source: str) -> "SpinProfile":
+        burst = raw.get("burst") or {}
+        adaptive = raw.get("adaptive") or {}
+        backoff = raw.get("on_fail_backoff_ms")
+        if isinstance(backoff, (int, float)):
+            backoff = [backoff]
+        mode = str(raw.get("mode", "fixed")).lower()
+        if mode not in ("fixed", "burst", "adaptive"):
+            logging.warning(f"[Pacing] {source} 未知的 mode '{mode}'，改用 fixed")
+            mode = "fixed"
+        return cls(
+            mode=mode,
+            interval_ms=max(0, int(raw.get("interval_ms", 1000))),
+            jitter_ms=max(0, int(raw.get("jitter_ms", 0))),
+            after_recording_delay_sec=float(raw.get("after_recording_delay_sec", 10.0)),
+            on_fail_backoff_ms=[max(0, int(x)) for x in (backoff or [1000])],
+            cooldown_ms=max(0, int(raw.get("cooldown_ms", 0))),
+            burst_count=max(1, int(burst.get("count", 1))),
+            burst_gap_ms=max(0, int(burst.get("gap_ms", 0))),
+            low_balance_threshold=adaptive.get("low_balance_threshold"),
+            slow_interval_ms=adaptive.get("slow_interval_ms"),
+            source=source,
+        )
+
+
+def _merge_profile(base: dict, override: dict) -> dict:
+    """逐層覆蓋：巢狀的 burst / adaptive 合併欄位，其餘欄位直接覆蓋"""
+    out = dict(base)
+    for k, v in (override or {}).items():
+        if isinstance(v, dict) and isinstance(out.get(k), dict):
+            out[k] = {**out[k], **v}
+        else:
+            out[k] = v
+    return out
+
+
+class SpinProfileStore:
+    """
+    spin_profiles.json 的載入與熱重載（全程序共用）：
+    - resolve() 依 default → types → machines → named_profiles 逐層覆蓋，得出單一機台的 SpinProfile
+    - 每 reload_interval 秒最多檢查一次檔案 mtime，有變更才重新讀取；
+      讀取失敗（例如編輯到一半的 JSON）時沿用上一版設定
+    - 檔案不存在時 available 為 False，呼叫端維持全域頻率（熱鍵）控制
+    """
+
+    def __init__(self, path: Path, reload_interval: float = 2.0):
+        self.path = Path(path)
+        self.reload_interval = max(0.0, reload_interval)
+        self._lock = threading.Lock()
+        self._data: Optional[dict] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.version = 0  # 每成功載入一次 + 1，PacingScheduler 據此判斷是否需要重新解析
+        self._load()
+
+    @property
+    def available(self) -> bool:
+        return self._data is not None
+
+    def _load(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            if self._data is not None:
+                logging.warning(f"[Pacing] {self.path.name} 已被移除，沿用上一版設定")
+            self._mtime = None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if not isinstance(data, dict):
+                raise ValueError("最外層必須是物件")
+        except Exception as e:
+            logging.error(f"[Pacing] 讀取 {self.path.name} 失敗，沿用上一版設定：{e}")
+            self._mtime = mtime  # 同一版壞檔不重複報錯
+            return
+        self._data = data
+        self._mtime = mtime
+        self.version += 1
+        logging.info(f"[Pacing] 載入 {self.path.name}（第 {self.version} 版）")
+
+    def maybe_reload(self) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            self._load()
+
+    @staticmethod
+    def _pick(section: dict, exact: List[Optional[str]], contains: Optional[str]) -> Optional[str]:
+        """先找完全相同的 key，再找被 contains（game_title_code）包含的 key"""
+        for k in exact:
+            if k and k in section:
+                return k
+        if contains:
+            for k in section:
+                if k and k in contains:
+                    return k
+        return None
+
+    def resolve(self, cfg: "GameConfig", template_type: Optional[str]) -> Optional[SpinProfile]:
+        """依機台設定解析節奏；檔案不存在時回傳 None"""
+        self.maybe_reload()
+        with self._lock:
+            data = self._data
+        if data is None:
+            return None
+        merged = dict(data.get("default") or {})
+        layers = ["default"]
+        types = data.get("types") or {}
+        k = self._pick(types, [template_type], cfg.game_title_code)
+        if k:
+            merged = _merge_profile(merged, types[k])
+            layers.append(f"types.{k}")
+        machines = data.get("machines") or {}
+        k = self._pick(machines, [cfg.rtmp, cfg.game_title_code], cfg.game_title_code)
+        if k:
+            merged = _merge_profile(merged, machines[k])
+            layers.append(f"machines.{k}")
+        if cfg.spin_profile:
+            named = (data.get("named_profiles") or {}).get(cfg.spin_profile)
+            if named is None:
+                logging.warning(f"[Pacing] 找不到 named_profiles.{cfg.spin_profile}，略過")
+            else:
+                merged = _merge_profile(merged, named)
+                layers.append(f"named_profiles.{cfg.spin_profile}")
+        return SpinProfile.from_dict(merged, "+".join(layers))
+
+
+class PacingScheduler:
+    """
+    單一機台的 Spin 節奏（每個 GameRunner 一個）：
+    - next_delay()：一次成功 Spin 後要等多久，間隔以「本輪開始 → 下輪開始」計算，本輪已花掉的時間會扣掉；
+      cooldown_ms 為扣除後仍至少要休息的時間
+    - on_failure()：Spin 失敗 / 例外時的退避時間，依 on_fail_backoff_ms 逐次拉長（超過清單長度取最後一個）
+    - spin_frequency_hint()：換算成秒數給沿用 spin_frequency 的判斷（超快頻率流程、結算等待上限）
+    - 設定檔熱重載後自動重新解析；burst 進度與失敗次數在重新解析後保留
+    """
+
+    def __init__(self, store: SpinProfileStore, cfg: "GameConfig", template_type: Optional[str]):
+        self.store = store
+        self.cfg = cfg
+        self.template_type = template_type
+        self.name = cfg.rtmp or cfg.game_title_code or "NA"
+        self._version = -1
+        self._profile: Optional[SpinProfile] = None
+        self._burst_pos = 0       # 目前 burst 內已 Spin 幾次
+        self._fail_streak = 0     # 連續失敗次數
+        self._slow = False        # adaptive：目前是否處於低餘額慢速
+
+    @property
+    def profile(self) -> Optional[SpinProfile]:
+        self.store.maybe_reload()
+        if self._version != self.store.version:
+            self._version = self.store.version
+            self._profile = self.store.resolve(self.cfg, self.template_type)
+            if self._profile is not None:
+                p = self._profile
+                logging.info(
+                    f"[Pacing][{self.name}] 套用 {p.source}：mode={p.mode} interval={p.interval_ms}ms "
+                    f"jitter={p.jitter_ms}ms backoff={p.on_fail_backoff_ms}"
+                )
+        return self._profile
+
+    def _interval_ms(self, p: SpinProfile, balance: Optional[int]) -> int:
+        if p.mode == "adaptive" and p.low_balance_threshold is not None and p.slow_interval_ms is not None:
+            if balance is not None:
+                slow = balance < p.low_balance_threshold
+                if slow != self._slow:
+                    self._slow = slow
+                    logging.info(
+                        f"[Pacing][{self.name}] 餘額 {balance:,} {'低於' if slow else '不低於'} "
+                        f"{p.low_balance_threshold:,}，間隔改為 {p.slow_interval_ms if slow else p.interval_ms}ms"
+                    )
+            if self._slow:
+                return int(p.slow_interval_ms)
+        return p.interval_ms
+
+    def spin_frequency_hint(self) -> float:
+        """目前的基本間隔（秒）；burst 進行中回傳 burst 間隔"""
+        p = self.profile
+        if p is None:
+            return 1.0
+        if p.mode == "burst" and 0 < self._burst_pos < p.burst_count:
+            return p.burst_gap_ms / 1000.0
+        return self._interval_ms(p, None) / 1000.0
+
+    def next_delay(self, balance: Optional[int], loop_elapsed: float) -> float:
+        p = self.profile
+        if p is None:
+            return 1.0
+        self._fail_streak = 0
+        if p.mode == "burst":
+            self._burst_pos += 1
+            if self._burst_pos < p.burst_count:
+                target = p.burst_gap_ms
+            else:
+                self._burst_pos = 0
+                target = p.interval_ms + np.random.uniform(-p.jitter_ms, p.jitter_ms)
+        else:
+            target = self._interval_ms(p, balance) + np.random.uniform(-p.jitter_ms, p.jitter_ms)
+        return max(target / 1000.0 - loop_elapsed, p.cooldown_ms / 1000.0, 0.0)
+
+    def on_failure(self) -> float:
+        p = self.profile
+        backoff = p.on_fail_backoff_ms if p is not None else [1000]
+        self._fail_streak += 1
+        self._burst_pos = 0
+        delay = backoff[min(self._fail_streak, len(backoff)) - 1] / 1000.0
+        if self._fail_streak > 1:
+            logging.info(f"[Pacing][{self.name}] 連續失敗 {self._fail_streak} 次，退避 {delay:.2f}s")
+        return delay
+
+    def after_recording_delay(self) -> float:
+        p = self.profile
+        return p.after_recording_delay_sec if p is not None else 10.0
+
+
 # =========================== 域模型（設定） ===========================
 @dataclass
 class GameConfig:
@@ -786,6 +3334,11 @@ class GameConfig:
     enabled: bool = True
     enable_recording: bool = True  # ✅ 新增：是否啟用錄製功能
     enable_template_detection: bool = True  # ✅ 新增：是否啟用模板偵測（高頻率時可關閉）
+    enable_frame_grabber: bool = True  # ✅ 新增：RTMP 改用常駐取幀（False 則每次啟動 FFmpeg 截單張）
+    recording_mode: str = "reencode"  # ✅ 新增：錄影方式，"reencode"（觸發後重新編碼）或 "copy"（串流複製 + 觸發前預錄）
+    record_error_hits: bool = False  # ✅ 新增：錯誤模板高分觸發時也錄影（排程優先於低分觸發）
+    spin_profile: Optional[str] = None  # ✅ 新增：套用 spin_profiles.json 的 named_profiles（覆蓋 types / machines）
+    lean_browser: bool = False  # ✅ 新增：精簡瀏覽器（headless、擋影音 / 字型 / 大圖 / 追蹤，只跑 Spin 與餘額時使用）
 
 
 # =========================== 遊戲執行器 ===========================
@@ -821,24 +3374,51 @@ class GameRunner:
         lark: LarkClient,
         keyword_actions: Dict[str, List[str]],
         machine_actions: Dict[str, Tuple[List[str], bool]],
+        grabbers: Optional[FrameGrabberPool] = None,
+        dup_detector: Optional[FrameDupDetector] = None,
+        detector: Optional[DetectionPool] = None,
+        recorders: Optional[SegmentRecorderPool] = None,
+        recording_scheduler: Optional[RecordingScheduler] = None,
+        pacing_store: Optional[SpinProfileStore] = None,
+        browser_pool: Optional[BrowserPool] = None,
+        warm_drivers: Optional[WarmDriverPool] = None,
     ):
         self.cfg = config
         self.matcher = matcher
+        # 模板比對一律經由 DetectionPool（未提供工作池時即同程序比對）
+        self.detector = detector or DetectionPool(matcher, workers=0)
+        # recording_mode="copy" 時使用的預錄緩衝（未提供則退回重新編碼錄影）
+        self.recorders = recorders if config.recording_mode == "copy" else None
+        # 錄影一律經由排程器啟動（控制全程序同時錄影數與 CPU 用量）
+        self.recording_scheduler = recording_scheduler or RecordingScheduler(
+            RECORD_MAX_CONCURRENT, RECORD_CPU_BUDGET, RECORD_QUEUE_TIMEOUT
+        )
         self.ffmpeg = ffmpeg
         self.lark = lark
+        self.grabbers = grabbers if config.enable_frame_grabber else None
+        self.dup_detector = dup_detector or FrameDupDetector(tolerance=DUP_TOLERANCE)
+        self._dup_change_seq: Optional[int] = None  # 上次檢測時取幀端的 last_change_seq
+        self._dup_streak = 0                         # 連續幾次檢測之間畫面完全沒有變化
+        self._stale_drops = 0                        # 連續幾輪因畫面被覆寫而略過偵測
         self.keyword_actions = keyword_actions          # ex: {"BULL": ["X1","X2"]}
         self.machine_actions = machine_actions          # ex: {"BULL": (["X1","X2"], True)}
         self.driver = None
-        self._rec_proc = None          # type: Optional[subprocess.Popen]
-        self._rec_end_at = 0.0         # 錄影結束時間（epoch 秒）
-        self._rec_name = None          # 正在錄的檔名前綴（rtmp 名稱）
-        self._auto_pause = False   # 只暫停本 GameRunner，不影響別台
+        self.browser_pool = browser_pool  # 有值時與其他機台共用 Edge 程序（各自獨立的 browser context）
+        self._lease: Optional[BrowserLease] = None
+        self.warm_drivers = warm_drivers  # 預熱好的獨立 Edge（與本機台的 lean_browser 設定相同）
+        self._rec_ticket = None        # type: Optional[RecordingTicket]  # 最近一次錄影請求（狀態由排程器更新）
+        self._rec_started_at: Optional[float] = None  # 最近一次錄影真正開始的時間（排程器執行緒寫入，以 _lock 保護）
+        self._lock = threading.Lock()
         self._last_balance = None      # 記錄上次的餘額，用於檢測變化
         self._no_change_count = 0      # 記錄連續無變化的次數
         self._check_interval = 10      # 每 10 次檢查一次
         self._spin_count = 0          # 用於間隔檢測的計數器
         self._last_404_check_time = 0.0  # 上次 404 檢測的時間戳
-        self._404_check_interval = 30.0  # 404 檢測間隔（秒）
+        self._404_check_interval = ERROR_PAGE_CHECK_INTERVAL  # 404 檢測間隔（秒）
+        self._last_nav_seq = 0           # 上次 404 檢測時的頁面導覽事件計數
+        self._elements = ElementCache()  # 熱門元素（Spin、餘額、Cashout）快取
+        self._lobby = LobbyIndex()       # 大廳卡片索引（找卡片 + 點擊一次來回）
+        self._cashout_selector: Optional[str] = None  # 上次找到 Cashout 按鈕的 selector
 
         # ✅ 依 game_config 指定或 game_title_code 推斷模板類型，供比對時只用該類型模板
         self.template_type: Optional[str] = (
@@ -854,13 +3434,27 @@ class GameRunner:
                 f"[Template] 錯誤畫面類型設定：game='{config.game_title_code}' → error_type='{self.error_template_type}'"
             )
 
+        # ✅ 啟動時先建立本機台的模板索引，spin 迴圈中的比對只需查表
+        for t in (self.template_type, self.error_template_type):
+            if t:
+                n = len(self.matcher.prepare(t, config.rtmp, config.game_title_code))
+                logging.info(f"[Template] 索引建立：type='{t}' rtmp='{config.rtmp or ''}' → {n} 張模板")
+
+        # ✅ 本機台的 Spin 節奏（spin_profiles.json 依 type / 機台 / named_profiles 解析）
+        self.pacing: Optional[PacingScheduler] = (
+            PacingScheduler(pacing_store, config, self.template_type) if pacing_store is not None else None
+        )
+
     # ----------------- 404 頁面檢測與刷新 -----------------
-    def _check_and_refresh_if_404(self):
+    def _check_and_refresh_if_404(self, snapshot: Optional[PageSnapshot] = None):
         """
         定時檢測 404 頁面並自動刷新
         
+        參數:
+            snapshot (Optional[PageSnapshot]): 本輪的頁面快照；提供時直接使用其中的 404 標記，不再另外查詢
+        
         流程:
-        1. 檢查是否到達檢測間隔（預設 30 秒）
+        1. 檢查是否到達檢測間隔（預設 5 秒）；快照顯示頁面重新載入或 SPA 換頁時立即檢測
         2. 檢測當前頁面是否為 404（檢查標題、內容、URL）
         3. 若為 404，執行刷新流程：
            - 先嘗試 refresh()
@@ -881,15 +3475,25 @@ class GameRunner:
         try:
             current_time = time.time()
             
-            # 檢查是否到達檢測間隔
-            if current_time - self._last_404_check_time < self._404_check_interval:
+            # 檢查是否到達檢測間隔（頁面重新載入或 SPA 換頁時不等間隔）
+            navigated = snapshot is not None and (snapshot.fresh_document or snapshot.nav_seq != self._last_nav_seq)
+            if snapshot is not None:
+                self._last_nav_seq = snapshot.nav_seq
+            if not navigated and current_time - self._last_404_check_time < self._404_check_interval:
                 return False  # 尚未到達檢測時間
             
             # 更新檢測時間
             self._last_404_check_time = current_time
             
-            # 檢測 404 頁面
-            if is_404_page(self.driver):
+            # 檢測 404 頁面（快照已檢測時直接使用其中的標記）
+            if snapshot is not None and snapshot.error_checked:
+                found = snapshot.error_page is not None
+                if found:
+                    source = _ERROR_PAGE_SOURCES.get(snapshot.error_page, snapshot.error_page)
+                    logging.warning(f"🚨 檢測到 404 頁面（通過{source}）")
+            else:
+                found = is_404_page(self.driver)
+            if found:
                 logging.warning(f"🚨 [{self.cfg.rtmp or 'Unknown'}] 檢測到 404 頁面，準備刷新...")
                 
                 # 刷新頁面
@@ -933,10 +3537,11 @@ class GameRunner:
         建立與回傳 Edge WebDriver
         
         流程：
-        1. 設定 Edge 選項（User-Agent、視窗大小、無痕模式）
-        2. 優先使用同目錄的 msedgedriver.exe
-        3. 若不存在，嘗試使用 webdriver_manager 自動下載
-        4. 建立 WebDriver 並載入遊戲 URL
+        1. 有瀏覽器池時：向池借一個獨立 browser context 的視窗（共用 Edge 程序）
+        2. 否則取一個預熱好的 Edge（有預熱池時），或設定 Edge 選項（User-Agent、視窗大小、無痕模式）冷啟動獨立的 Edge；
+           msedgedriver 優先使用同目錄的 msedgedriver.exe，不存在時以 webdriver_manager 下載（每個程序只解析一次）
+        3. lean_browser 時改用 headless 精簡選項，並在載入前設定要擋掉的資源
+        4. 載入遊戲 URL
         
         返回:
             webdriver.Edge: 已載入遊戲 URL 的 WebDriver 實例
@@ -945,24 +3550,26 @@ class GameRunner:
             RuntimeError: 找不到 msedgedriver.exe 且未安裝 webdriver_manager
             Exception: 瀏覽器啟動或載入 URL 失敗
         """
-        edge_options = webdriver.EdgeOptions()
-        # 偽裝 iPhone UA（頁面走行動版流程）
-        edge_options.add_argument(
-            "--user-agent=Mozilla/5.0 (iPhone; CPU iPhone OS 14_0 like Mac OS X) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/85.0.4183.127 Mobile Safari/537.36"
-        )
-        edge_options.add_argument("--window-size=432,859")
-        edge_options.add_argument("--incognito")
-
         try:
-            if EDGEDRIVER_EXE.exists():
-                service = Service(executable_path=str(EDGEDRIVER_EXE))
+            lean = self.cfg.lean_browser
+            if self.browser_pool is not None:
+                self._lease = self.browser_pool.acquire(
+                    self.cfg.rtmp or self.cfg.game_title_code or "NA",
+                    profile="lean" if lean else "default",
+                    window_size=LEAN_WINDOW_SIZE if lean else None,
+                )
+                drv = self._lease.driver
+            elif self.warm_drivers is not None:
+                drv = self.warm_drivers.take()
             else:
-                if EdgeChromiumDriverManager is None:
-                    raise RuntimeError("找不到 msedgedriver.exe，且未安裝 webdriver_manager")
-                path = EdgeChromiumDriverManager().install()
-                service = Service(executable_path=path)
-
-            drv = webdriver.Edge(service=service, options=edge_options)
+                drv = new_edge_driver(lean=lean)
+            if lean:
+                try:
+                    n = apply_lean_blocking(drv)
+                    logging.info(f"精簡瀏覽器：headless，擋掉 {n} 種資源（rtmp={self.cfg.rtmp or 'N/A'}）")
+                except Exception as e:
+                    logging.warning(f"精簡瀏覽器設定資源封鎖失敗，照常載入: {e}")
+            drv.set_script_timeout(max(30.0, SPIN_SETTLE_TIMEOUT + 5.0))  # execute_async_script（結算等待、批次點擊）的上限
             # 載入 URL（不記錄完整 URL 以避免洩露敏感資訊）
             drv.get(self.cfg.url)
             logging.info(f"瀏覽器已載入遊戲 URL（rtmp={self.cfg.rtmp or 'N/A'}）")
@@ -971,58 +3578,47 @@ class GameRunner:
             raise
         except Exception as e:
             logging.error(f"建立或載入瀏覽器時發生錯誤: {e}")
+            if self._lease is not None:
+                self.browser_pool.release(self._lease)
+                self._lease = None
             raise
     
-    def _is_recording_active(self) -> bool:
+    def _is_recording_pending(self) -> bool:
         """
-        檢查目前是否有錄影進行中
+        檢查目前是否有錄影排隊中或進行中
         
         返回:
-            bool: True 表示錄影進行中，False 表示未錄影或已結束
+            bool: True 表示錄影排隊中或進行中，False 表示未錄影或已結束
             
-        流程:
-        1. 檢查錄影程序是否存在
-        2. 檢查程序是否仍在運行（poll() 返回 None 表示運行中）
-        3. 若程序已結束，清理內部狀態
-        
         注意:
-        - 程序結束後會自動清理狀態，無需手動調用清理函數
+        - 只讀取 RecordingTicket 狀態，錄影程序由 RecordingScheduler 統一 poll()，這裡不碰子程序
+        - 排隊中並沒有在錄影：偵測照常進行，只是不再重複排入錄影
         """
-        if self._rec_proc is None:
-            return False
-        try:
-            if self._rec_proc.poll() is None:
-                return True
-        except Exception as e:
-            logging.debug(f"檢查錄影程序狀態時發生錯誤: {e}")
-            # 程序可能已異常終止，清理狀態
-            self._rec_proc = None
-            self._rec_end_at = 0.0
-            self._rec_name = None
-            return False
-        # 程序已結束，清掉狀態
-        self._rec_proc = None
-        self._rec_end_at = 0.0
-        self._rec_name = None
-        return False
+        return self._rec_ticket is not None and self._rec_ticket.pending
+
+    def _is_recording_running(self) -> bool:
+        """檢查錄影程序是否已真正開始（排隊中回傳 False）"""
+        return self._rec_ticket is not None and self._rec_ticket.running
     
-    def _start_recording(self, name: str, url: str, duration_sec: int = 120, ts: Optional[str] = None) -> None:
+    def _start_recording(
+        self, name: str, url: str, duration_sec: int = 120, ts: Optional[str] = None, kind: str = "low_score"
+    ) -> None:
         """
-        使用 FFmpeg 錄製 RTMP 串流
+        使用 FFmpeg 錄製 RTMP 串流（交由 RecordingScheduler 排程啟動）
         
         參數:
             name (str): 錄影檔名前綴（通常是 RTMP 名稱）
             url (str): RTMP 串流 URL
             duration_sec (int): 錄影時長（秒），預設 120 秒
             ts (Optional[str]): 時間戳，用於檔案命名。若為 None，自動生成
+            kind (str): 觸發類型，"error"（錯誤模板）優先於 "low_score"（低分觸發）
             
         流程:
         1. 檢查是否啟用錄製功能
         2. 生成輸出檔案路徑
-        3. 建立 FFmpeg 命令（H.264 + AAC 編碼）
-        4. 啟動 FFmpeg 子程序
-        5. 記錄錄影狀態（程序、結束時間、檔名）
-        6. 推播 Lark 通知（可選）
+        3. 建立 FFmpeg 命令（H.264 + AAC 編碼）；recording_mode="copy" 時改由預錄緩衝輸出（不重新編碼）
+        4. 排入錄影排程，輪到時才啟動 FFmpeg 子程序（立即返回，不等待）
+        5. 啟動後推播 Lark 通知（可選）
         
         異常處理:
         - 錄製功能停用：直接返回，不執行錄影
@@ -1033,9 +3629,41 @@ class GameRunner:
             logging.info(f"[{name}] 錄製功能已停用，跳過錄影")
             return
             
+        # 已有錄影排隊中或進行中：不重複排入
+        if self._is_recording_pending():
+            logging.info(f"[{name}] 已有錄影排隊中或進行中，不重複排入")
+            return
+
         if ts is None:
             ts = time.strftime("%Y%m%d_%H%M%S")
         out_mp4 = SCREENSHOT_RTMP / f"{name}_{ts}.mp4"
+
+        def _on_start(ticket: RecordingTicket) -> None:
+            # 排程器執行緒呼叫：記錄錄影開始時間，後面 spin_forever 會用
+            with self._lock:
+                self._rec_started_at = ticket.started_at
+
+        # 串流複製模式：從預錄緩衝取出觸發前後的切片，不重新編碼
+        if self.recorders is not None:
+            recorder = self.recorders.get(url, name=self.cfg.rtmp or name)
+            trigger_at = time.time()  # 以觸發當下為準，排隊等待不影響預錄範圍
+
+            def _start_copy():
+                job = recorder.trigger(out_mp4, post_roll=duration_sec, trigger_at=trigger_at)
+                logging.warning(f"[Record] 開始錄影（stream copy，含觸發前 {recorder.pre_roll:.0f}s）{duration_sec}s → {out_mp4.name}")
+                try:
+                    self.lark.send_text(
+                        f"📹 [{name}] 開始錄影 {duration_sec}s（含觸發前 {recorder.pre_roll:.0f}s）：{out_mp4.name}"
+                    )
+                except Exception as e:
+                    logging.debug(f"推播錄影通知失敗: {e}")
+                return job
+
+            self._rec_ticket = self.recording_scheduler.submit(
+                name, out_mp4, _start_copy, kind=kind, cost=0.1, encoder=False, on_start=_on_start
+            )
+            return
+
         cmd = [
             str(FFMPEG_EXE), "-y",
              
@@ -1066,33 +3694,39 @@ class GameRunner:
             str(out_mp4),
             ]
 
-        try:
-            self._rec_proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            self._rec_end_at = time.time() + duration_sec
-            self._rec_name = name
+        def _start_encode():
+            try:
+                proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except FileNotFoundError as e:
+                logging.error(f"[Record] 找不到 FFmpeg 執行檔: {e}")
+                return None
+            except subprocess.SubprocessError as e:
+                logging.error(f"[Record] FFmpeg 子程序啟動失敗: {e}")
+                return None
+            except Exception as e:
+                logging.error(f"[Record] 無法啟動 FFmpeg 錄影: {e}\n{traceback.format_exc()}")
+                return None
             logging.warning(f"[Record] 開始錄影 {duration_sec}s → {out_mp4.name}")
-
-            # 記錄錄影開始時間，後面 spin_forever 會用
-            self._rec_started_at = time.time()
             # 可選：推播開始錄影（不包含完整路徑，避免洩露系統路徑）
             try:
                 self.lark.send_text(f"📹 [{name}] 開始錄影 {duration_sec}s：{out_mp4.name}")
             except Exception as e:
                 logging.debug(f"推播錄影通知失敗: {e}")
-        except FileNotFoundError as e:
-            logging.error(f"[Record] 找不到 FFmpeg 執行檔: {e}")
-        except subprocess.SubprocessError as e:
-            logging.error(f"[Record] FFmpeg 子程序啟動失敗: {e}")
-        except Exception as e:
-            logging.error(f"[Record] 無法啟動 FFmpeg 錄影: {e}\n{traceback.format_exc()}")
+            return proc
+
+        self._rec_ticket = self.recording_scheduler.submit(
+            name, out_mp4, _start_encode, kind=kind, cost=1.0, encoder=True, on_start=_on_start
+        )
 
     def _maybe_cleanup_finished_recording(self):
-        """如果錄影已結束，清理內部狀態（非必要，但讓狀態即時）"""
-        if self._rec_proc is not None and self._rec_proc.poll() is not None:
-            logging.info("[Record] 錄影結束")
-            self._rec_proc = None
-            self._rec_end_at = 0.0
-            self._rec_name = None
+        """如果錄影已結束（或排隊逾時被放棄），清掉票據參照（非必要，但讓狀態即時）"""
+        t = self._rec_ticket
+        if t is not None and not t.pending:
+            if t.state == RecordingTicket.DROPPED:
+                logging.warning(f"[Record] 錄影排隊逾時未開始：{t.out_mp4.name}")
+            else:
+                logging.info(f"[Record] 錄影結束（{t.state}）")
+            self._rec_ticket = None
 
 
     # ----------------- Lobby / Join 流程 -----------------
@@ -1124,59 +3758,56 @@ class GameRunner:
         - 即使 Join 失敗，也會嘗試執行 keyword_actions
         """
         try:
-            items = wait_for_all(self.driver, By.ID, "grid_gm_item", timeout=10)
-            for item in items:
-                title = item.get_attribute("title")
-                if title and game_title_code in title:
-                    if not safe_click(self.driver, item):
-                        continue
-                    logging.info(f"點擊遊戲卡片: {title}")
-                    time.sleep(1.2)
-
-                    # Join 按鈕不一定是卡片內部 DOM；改抓全局 gm-info-box
-                    # 注意：Join 按鈕可能不會每次出現，這是正常的
-                    try:
-                        join_btns = wait_for_all(
-                            self.driver,
-                            By.XPATH,
-                            "//div[contains(@class, 'gm-info-box')]//span[normalize-space(text())='Join']",
-                            timeout=3,  # 縮短超時時間，快速判斷是否存在
-                        )
-                        for btn in join_btns:
+            # 一次 execute_script 找卡片並點擊（大廳未重建時沿用上次的 title 索引，不再逐張讀 title）
+            title = self._lobby.click_card(self.driver, game_title_code, timeout=10)
+            if title:
+                logging.info(f"點擊遊戲卡片: {title}")
+                time.sleep(1.2)
+
+                # Join 按鈕不一定是卡片內部 DOM；改抓全局 gm-info-box
+                # 注意：Join 按鈕可能不會每次出現，這是正常的
+                try:
+                    join_btns = wait_for_all(
+                        self.driver,
+                        By.XPATH,
+                        "//div[contains(@class, 'gm-info-box')]//span[normalize-space(text())='Join']",
+                        timeout=3,  # 縮短超時時間，快速判斷是否存在
+                    )
+                    for btn in join_btns:
+                        try:
+                            if btn.is_displayed() and safe_click(self.driver, btn):
+                                logging.info("點擊 Join 進入遊戲")
+                                wait_page_state(self.driver, "game", timeout=5.0)  # 等到遊戲畫面出現
+                                break
+                        except Exception as e:
+                            # 處理 stale element reference 或其他錯誤，直接跳過
+                            logging.debug(f"點擊 Join 時發生錯誤（已跳過）: {e}")
+                except TimeoutException:
+                    # Join 按鈕不存在是正常的，直接跳過
+                    logging.info("Join 按鈕未出現（這是正常的），跳過 Join 步驟")
+                except Exception as e:
+                    # 其他錯誤也直接跳過，不重試
+                    logging.info(f"Join 按鈕查找失敗（已跳過）: {e}")
+            
+                # ✅ 無論 Join 是否成功，都嘗試執行 keyword_actions
+                # 因為可能已經通過其他方式進入遊戲（例如直接點擊卡片就進入）
+                if game_title_code:
+                    for kw, positions in self.keyword_actions.items():
+                        if kw in game_title_code:
+                            logging.info(f"嘗試執行 keyword_actions: {kw} -> {positions}")
                             try:
-                                if btn.is_displayed() and safe_click(self.driver, btn):
-                                    logging.info("點擊 Join 進入遊戲")
-                                    time.sleep(3.0)
-                                    break
-                            except Exception as e:
-                                # 處理 stale element reference 或其他錯誤，直接跳過
-                                logging.debug(f"點擊 Join 時發生錯誤（已跳過）: {e}")
-                    except TimeoutException:
-                        # Join 按鈕不存在是正常的，直接跳過
-                        logging.info("Join 按鈕未出現（這是正常的），跳過 Join 步驟")
-                    except Exception as e:
-                        # 其他錯誤也直接跳過，不重試
-                        logging.info(f"Join 按鈕查找失敗（已跳過）: {e}")
-                    
-                    # ✅ 無論 Join 是否成功，都嘗試執行 keyword_actions
-                    # 因為可能已經通過其他方式進入遊戲（例如直接點擊卡片就進入）
-                    if game_title_code:
-                        for kw, positions in self.keyword_actions.items():
-                            if kw in game_title_code:
-                                logging.info(f"嘗試執行 keyword_actions: {kw} -> {positions}")
-                                try:
-                                    # 等待一下確保頁面穩定
-                                    time.sleep(1.0)
-                                    self.click_multiple_positions(positions)
-                                    logging.info(f"✅ keyword_actions 執行成功: {kw} -> {positions}")
-                                    time.sleep(1.0)
-                                except Exception as kw_err:
-                                    logging.warning(f"執行 keyword_actions 時發生錯誤: {kw_err}")
-                                break  # 只執行第一個匹配的關鍵字
-                    
-                    # 無論 Join 是否成功，都返回 True 讓流程繼續
-                    return True
-                        
+                                # 等待一下確保頁面穩定
+                                time.sleep(1.0)
+                                self.click_multiple_positions(positions)
+                                logging.info(f"✅ keyword_actions 執行成功: {kw} -> {positions}")
+                                time.sleep(1.0)
+                            except Exception as kw_err:
+                                logging.warning(f"執行 keyword_actions 時發生錯誤: {kw_err}")
+                            break  # 只執行第一個匹配的關鍵字
+            
+                # 無論 Join 是否成功，都返回 True 讓流程繼續
+                return True
+
             logging.warning(f"大廳找不到遊戲: {game_title_code}")
         except Exception as e:
             logging.error(f"scroll_and_click_game 失敗: {e}")
@@ -1193,32 +3824,21 @@ class GameRunner:
             click_take (bool): 是否在點擊完所有座標後，額外點擊 Take 按鈕，預設 False
             
         流程:
-        1. 依序遍歷 positions 清單
-        2. 對每個座標，尋找頁面上文字內容為該座標的 span 元素
-        3. 點擊找到的元素
-        4. 若 click_take=True，額外點擊 Take 按鈕
+        1. 以 web_helpers.click_positions 一次 execute_async_script 在頁面內找出所有座標 span
+        2. 依序點擊，每次間隔 CLICK_PACE_MS 毫秒
+        3. 若 click_take=True，額外點擊 Take 按鈕
         
         異常處理:
-        - 找不到座標元素：記錄警告但繼續下一個座標
+        - 找不到座標元素：整批最多等 2.5 秒，仍找不到的座標記錄警告，其餘照常點擊
         - 點擊失敗：記錄警告但繼續下一個座標
         - Take 按鈕不存在：靜默失敗（不記錄錯誤）
         
         注意:
         - 座標格式為 "X,Y"（例如："5,32"）
-        - 每個座標點擊後等待 0.2 秒
         - 即使部分座標失敗，也會繼續執行剩餘座標
         """
-        for pos in positions:
-            try:
-                elems = wait_for_all(self.driver, By.XPATH, f"//span[normalize-space(text())='{pos}']", timeout=2.5)
-                if elems:
-                    safe_click(self.driver, elems[0])
-                    logging.info(f"已點擊座標位: {pos}")
-                    time.sleep(0.4)
-            except TimeoutException:
-                logging.warning(f"找不到座標位 {pos}（超時 2.5 秒）")
-            except Exception as e:
-                logging.warning(f"點擊座標位 {pos} 時發生錯誤: {e}")
+        if positions:
+            click_positions(self.driver, positions, pace_ms=CLICK_PACE_MS, wait_timeout=2.5)
 
         if click_take:
             try:
@@ -1320,8 +3940,9 @@ class GameRunner:
         """
         sel = ".h-balance.hand_balance .text2" if is_special else ".balance-bg.hand_balance .text2"
         try:
-            el = self.driver.find_element(By.CSS_SELECTOR, sel)
-            txt = (el.text or "").replace(",", "").strip()
+            # 元素參照快取在 ElementCache，失效（DOM 重建）時才重新查詢
+            txt = self._elements.call(self.driver, "balance", By.CSS_SELECTOR, sel, lambda el: el.text)
+            txt = (txt or "").replace(",", "").strip()
             # 容錯：只保留數字
             nums = "".join(ch for ch in txt if ch.isdigit())
             return int(nums) if nums else None
@@ -1335,6 +3956,92 @@ class GameRunner:
             logging.debug(f"解析餘額時發生錯誤: {e}")
             return None
 
+    def _probe_page(self, is_special: bool) -> Optional[PageSnapshot]:
+        """
+        一次 execute_script 取得本輪 Spin 迴圈需要的所有頁面狀態（同時安裝 Spin 觀察器）
+        
+        返回:
+            Optional[PageSnapshot]: 頁面快照；查詢失敗時回傳 None（呼叫端退回逐項查詢）
+        """
+        bal_sel = ".h-balance.hand_balance .text2" if is_special else ".balance-bg.hand_balance .text2"
+        spin_sel = ".btn_spin .my-button" if is_special else ".my-button.btn_spin"
+        try:
+            due = time.time() - self._last_404_check_time >= self._404_check_interval
+            raw = self.driver.execute_script(_PAGE_PROBE_JS, bal_sel, spin_sel, due, self._last_nav_seq)
+        except Exception as e:
+            logging.debug(f"頁面快照查詢失敗: {e}")
+            return None
+        return PageSnapshot.from_probe(raw) if isinstance(raw, dict) else None
+
+    def _click_spin_and_wait(self, snap: PageSnapshot, is_special: bool, timeout: float) -> Tuple[bool, Optional[int]]:
+        """
+        以快照安裝的觀察器點擊 Spin 並等待結算（快照已確認 Spin 按鈕可點時使用）
+        
+        點擊腳本確定沒有點到（觀察器或按鈕不存在）才改用 _click_spin；
+        點擊腳本本身拋出例外時可能已經點過，視為已點擊、只讀取餘額，絕不再點第二次
+        
+        返回:
+            Tuple[bool, Optional[int]]: (是否點擊成功, 結算後餘額)
+        """
+        try:
+            res = self.driver.execute_script(_SPIN_CLICK_JS)
+        except Exception as e:
+            logging.warning(f"點擊 Spin 的腳本中斷，可能已點擊，本輪不再重點: {e}")
+            return True, self._parse_balance(is_special)
+        if not isinstance(res, dict) or not res.get("clicked"):
+            logging.debug("觀察器找不到 Spin 按鈕，改用逐步流程")
+            armed = self._arm_spin_watch(is_special)
+            if not self._click_spin(is_special):
+                return False, None
+            return True, self._wait_spin_settled(armed, is_special, timeout)
+        return True, self._wait_spin_settled(snap.armed, is_special, timeout)
+
+    def _arm_spin_watch(self, is_special: bool) -> Optional[dict]:
+        """
+        點擊 Spin 前安裝 / 重置頁面內的 Spin 狀態觀察器，回傳點擊前的 {seq, text, busy}；失敗回傳 None
+        """
+        bal_sel = ".h-balance.hand_balance .text2" if is_special else ".balance-bg.hand_balance .text2"
+        spin_sel = ".btn_spin .my-button" if is_special else ".my-button.btn_spin"
+        try:
+            return self.driver.execute_script(_SPIN_WATCH_ARM_JS, bal_sel, spin_sel)
+        except Exception as e:
+            logging.debug(f"安裝 Spin 狀態觀察器失敗: {e}")
+            return None
+
+    @staticmethod
+    def _settle_timeout(current_freq: float) -> float:
+        """依 Spin 頻率決定結算等待上限：頻率越快越早放棄等待，避免拖慢迴圈"""
+        if current_freq <= 0.1:
+            return min(SPIN_SETTLE_TIMEOUT, 0.3)
+        if current_freq <= 0.5:
+            return min(SPIN_SETTLE_TIMEOUT, 0.8)
+        return SPIN_SETTLE_TIMEOUT
+
+    def _wait_spin_settled(self, armed: Optional[dict], is_special: bool, timeout: float) -> Optional[int]:
+        """
+        等待 Spin 結算（頁面內觀察到餘額或 Spin 按鈕變動並安靜下來），回傳結算後餘額
+        
+        參數:
+            armed (Optional[dict]): _arm_spin_watch 的回傳值；None 時退回直接讀取餘額
+            is_special (bool): 是否為特殊機台（影響 selector 選擇）
+            timeout (float): 最多等待秒數；逾時視為本輪沒有變化，仍回傳當下餘額
+        """
+        if armed is None:
+            return self._parse_balance(is_special)
+        try:
+            res = self.driver.execute_async_script(
+                _SPIN_WATCH_WAIT_JS, armed.get("seq", 0), SPIN_SETTLE_QUIET_MS, SPIN_SETTLE_IDLE_MS, int(timeout * 1000)
+            )
+        except Exception as e:
+            logging.debug(f"等待 Spin 結算失敗，改為直接讀取餘額: {e}")
+            return self._parse_balance(is_special)
+        logging.debug(
+            "Spin 結算：settled=%s changed=%s busy_seen=%s %.0fms",
+            res.get("settled"), res.get("changed"), res.get("busy_seen"), res.get("ms", 0.0),
+        )
+        nums = "".join(ch for ch in (res.get("text") or "") if ch.isdigit())
+        return int(nums) if nums else self._parse_balance(is_special)
+
     def _click_spin(self, is_special: bool) -> bool:
         """
         點擊 Spin 按鈕
@@ -1347,8 +4054,8 @@ class GameRunner:
             
         流程:
         1. 根據機台類型選擇對應的 CSS selector
-        2. 等待 Spin 按鈕出現（超時 8 秒）
-        3. 使用 safe_click 安全點擊
+        2. 從元素快取取得 Spin 按鈕（未快取時等待出現，超時 8 秒）
+        3. 以 JS 滾動並點擊（與 safe_click 相同），元素失效時重新查詢
         
         異常處理:
         - 按鈕不存在或超時：記錄警告並返回 False
@@ -1360,8 +4067,15 @@ class GameRunner:
         """
         spin_selector = ".btn_spin .my-button" if is_special else ".my-button.btn_spin"
         try:
-            btn = wait_for(self.driver, By.CSS_SELECTOR, spin_selector, timeout=8)
-            return safe_click(self.driver, btn)
+            # 按鈕參照快取在 ElementCache（第一次最多等 8 秒出現），失效時重新查詢並重試一次
+            self._elements.call(
+                self.driver, "spin", By.CSS_SELECTOR, spin_selector,
+                lambda btn: self.driver.execute_script(
+                    "arguments[0].scrollIntoView({block: 'center'}); arguments[0].click();", btn
+                ),
+                timeout=8,
+            )
+            return True
         except TimeoutException:
             logging.warning(f"找不到 Spin 按鈕（selector: {spin_selector}，超時 8 秒）")
             return False
@@ -1369,67 +4083,64 @@ class GameRunner:
             logging.warning(f"點擊 Spin 時發生錯誤: {e}")
             return False
 
-    def _find_cashout_button(self):
-        """
-        尋找 Cashout 按鈕，直接定位到 handle-main 底層的按鈕
-        避免被 select-main 遮罩層阻擋
-        """
-        # 優先使用 handle-main 底層的選擇器
-        handle_main_selectors = [
-            ".handle-main .my-button.btn_cashout",                    # handle-main 內的 cashout 按鈕
-            ".handle-main .my-button--normal.btn_cashout",             # handle-main 內的 normal cashout 按鈕
-            ".handle-main .my-button.my-button--normal.btn_cashout",  # handle-main 內的完整類別 cashout 按鈕
-            ".handle-main .btn_cashout",                               # handle-main 內的簡化 cashout 按鈕
-            ".handle-main div[class*='btn_cashout']",                 # handle-main 內包含 cashout 的 div
-            ".handle-main button[class*='cashout']",                   # handle-main 內包含 cashout 的 button
-        ]
+    def _cashout_usable(self, elem, require_handle_main: bool) -> bool:
+        """檢查 Cashout 候選元素是否可見、可點、有大小（handle-main 選擇器另需確認位於 handle-main 內）"""
+        # 詳細檢查元素狀態
+        is_displayed = elem.is_displayed()
+        is_enabled = elem.is_enabled()
         
-        # 嘗試 handle-main 底層的選擇器
-        for selector in handle_main_selectors:
+        # 檢查元素位置和大小
+        try:
+            size = elem.size
+            has_size = size['width'] > 0 and size['height'] > 0
+        except StaleElementReferenceException:
+            raise
+        except Exception:
+            has_size = True
+        
+        # 檢查元素是否在 handle-main 內
+        in_handle_main = True
+        if require_handle_main:
             try:
-                logging.debug(f"🔍 嘗試 handle-main 選擇器: {selector}")
-                elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                
-                for elem in elements:
-                    try:
-                        # 詳細檢查元素狀態
-                        is_displayed = elem.is_displayed()
-                        is_enabled = elem.is_enabled()
-                        
-                        # 檢查元素位置和大小
-                        try:
-                            location = elem.location
-                            size = elem.size
-                            has_size = size['width'] > 0 and size['height'] > 0
-                        except Exception:
-                            has_size = True
-                        
-                        # 檢查元素是否在 handle-main 內
-                        try:
-                            handle_main_parent = elem.find_element(By.XPATH, "./ancestor::div[contains(@class, 'handle-main')]")
-                            in_handle_main = handle_main_parent is not None
-                        except Exception:
-                            in_handle_main = False
-                        
-                        logging.debug(f"🔍 handle-main 元素狀態: displayed={is_displayed}, enabled={is_enabled}, has_size={has_size}, in_handle_main={in_handle_main}")
-                        
-                        if is_displayed and is_enabled and has_size and in_handle_main:
-                            logging.info(f"✅ 找到 handle-main 底層 Cashout 按鈕，使用選擇器: {selector}")
-                            logging.debug(f"📍 元素位置: {location}, 大小: {size}")
-                            return elem
-                        else:
-                            logging.debug(f"⚠️ handle-main 元素狀態不符合要求")
-                            
-                    except Exception as e:
-                        logging.debug(f"檢查 handle-main 元素狀態時發生錯誤: {e}")
-                        continue
-                        
-            except Exception as e:
-                logging.debug(f"handle-main 選擇器 {selector} 失敗: {e}")
-                continue
+                handle_main_parent = elem.find_element(By.XPATH, "./ancestor::div[contains(@class, 'handle-main')]")
+                in_handle_main = handle_main_parent is not None
+            except Exception:
+                in_handle_main = False
+        
+        logging.debug(f"🔍 Cashout 元素狀態: displayed={is_displayed}, enabled={is_enabled}, has_size={has_size}, in_handle_main={in_handle_main}")
+        return is_displayed and is_enabled and has_size and in_handle_main
+
+    def _find_cashout_button(self):
+        """
+        尋找 Cashout 按鈕，直接定位到 handle-main 底層的按鈕
+        避免被 select-main 遮罩層阻擋
         
-        # 如果 handle-main 選擇器都失敗，嘗試其他備用選擇器
-        logging.info("⚠️ handle-main 選擇器都失敗，嘗試備用選擇器...")
+        - 上次找到的按鈕仍可用時直接重用（ElementCache，key="cashout"）
+        - 否則先試上次成功的 selector，再依序嘗試其餘 selector
+        """
+        # 快取中的按鈕仍可見可點就直接使用
+        cached = self._elements.peek(self.driver, "cashout")
+        if cached is not None:
+            try:
+                if cached.is_displayed() and cached.is_enabled():
+                    self._elements.record("cashout", hit=True)
+                    return cached
+            except StaleElementReferenceException:
+                self._elements.record("cashout", hit=False, stale=True)
+            except Exception:
+                pass
+            self._elements.invalidate("cashout")
+        t0 = time.perf_counter()
+
+        # 優先使用 handle-main 底層的選擇器
+        handle_main_selectors = [
+            ".handle-main .my-button.btn_cashout",                    # handle-main 內的 cashout 按鈕
+            ".handle-main .my-button--normal.btn_cashout",             # handle-main 內的 normal cashout 按鈕
+            ".handle-main .my-button.my-button--normal.btn_cashout",  # handle-main 內的完整類別 cashout 按鈕
+            ".handle-main .btn_cashout",                               # handle-main 內的簡化 cashout 按鈕
+            ".handle-main div[class*='btn_cashout']",                 # handle-main 內包含 cashout 的 div
+            ".handle-main button[class*='cashout']",                   # handle-main 內包含 cashout 的 button
+        ]
         
         # 多個可能的備用選擇器
         backup_selectors = [
@@ -1456,37 +4167,33 @@ class GameRunner:
             "//div[contains(@class, 'my-button') and contains(@class, 'my-button--normal') and contains(@class, 'btn_cashout')]", # XPath 完整版本
         ]
         
-        for selector in backup_selectors:
+        # 上次成功的 selector 排最前面（保留原本的 handle-main 檢查條件）
+        candidates = [(sel, True) for sel in handle_main_selectors] + [(sel, False) for sel in backup_selectors]
+        if self._cashout_selector is not None:
+            candidates.sort(key=lambda c: c[0] != self._cashout_selector)
+        warned_handle_main = False
+        
+        for selector, require_handle_main in candidates:
+            if not require_handle_main and not warned_handle_main:
+                # 如果 handle-main 選擇器都失敗，嘗試其他備用選擇器
+                warned_handle_main = True
+                if selector != self._cashout_selector:
+                    logging.info("⚠️ handle-main 選擇器都失敗，嘗試備用選擇器...")
             try:
-                if selector.startswith("//"):
-                    # XPath 選擇器
-                    elements = self.driver.find_elements(By.XPATH, selector)
-                else:
-                    # CSS 選擇器
-                    elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
+                logging.debug(f"🔍 嘗試 Cashout 選擇器: {selector}")
+                by = By.XPATH if selector.startswith("//") else By.CSS_SELECTOR
+                elements = self.driver.find_elements(by, selector)
                 
                 for elem in elements:
                     try:
-                        # 詳細檢查元素狀態
-                        is_displayed = elem.is_displayed()
-                        is_enabled = elem.is_enabled()
-                        
-                        # 檢查元素位置和大小
-                        try:
-                            location = elem.location
-                            size = elem.size
-                            has_size = size['width'] > 0 and size['height'] > 0
-                        except Exception:
-                            has_size = True
-                        
-                        logging.debug(f"🔍 元素狀態檢查: displayed={is_displayed}, enabled={is_enabled}, has_size={has_size}")
-                        
-                        if is_displayed and is_enabled and has_size:
+                        if self._cashout_usable(elem, require_handle_main):
                             logging.info(f"✅ 找到 Cashout 按鈕，使用選擇器: {selector}")
-                            logging.debug(f"📍 元素位置: {location}, 大小: {size}")
+                            self._cashout_selector = selector
+                            self._elements.put(self.driver, "cashout", elem)
+                            self._elements.record("cashout", hit=False, lookup_ms=(time.perf_counter() - t0) * 1000)
                             return elem
                         else:
-                            logging.debug(f"⚠️ 元素狀態不符合要求: displayed={is_displayed}, enabled={is_enabled}, has_size={has_size}")
+                            logging.debug("⚠️ 元素狀態不符合要求")
                             
                     except Exception as e:
                         logging.debug(f"檢查元素狀態時發生錯誤: {e}")
@@ -1496,6 +4203,7 @@ class GameRunner:
                 logging.debug(f"選擇器 {selector} 失敗: {e}")
                 continue
         
+        self._elements.record("cashout", hit=False, lookup_ms=(time.perf_counter() - t0) * 1000)
         logging.warning("⚠️ 所有 Cashout 按鈕選擇器都失敗")
         
         # 增強診斷：檢查遮罩層問題
@@ -1581,33 +4289,30 @@ class GameRunner:
             quit_btn = self._find_cashout_button()
             if quit_btn:
                 safe_click(self.driver, quit_btn)
-                time.sleep(1.0)
             else:
                 logging.error("❌ 找不到 Cashout 按鈕，無法執行退出流程")
                 return False
 
+            # 各步驟改為等待下一個按鈕可點擊（上限沿用原本「固定等待 + 查找」的總時間）
             try:
-                exit_btn = WebDriverWait(self.driver, 2).until(
+                exit_btn = WebDriverWait(self.driver, 3).until(
                     EC.element_to_be_clickable((By.CSS_SELECTOR, ".function-btn .reserve-btn-gray"))
                     )
                 safe_click(self.driver, exit_btn)
                 logging.info("[ExitFlow] 已點擊 Exit / Exit To Lobby")
-                time.sleep(1.0)
             except TimeoutException:
                 logging.info("[ExitFlow] 找不到 Exit，直接嘗試 Confirm")
 
-            confirm_btn = WebDriverWait(self.driver, 2).until(
+            confirm_btn = WebDriverWait(self.driver, 3).until(
                 EC.element_to_be_clickable((By.XPATH, "//button[.//div[normalize-space(text())='Confirm']]"))
             )
             safe_click(self.driver, confirm_btn)
-            time.sleep(3.0)
             
-            # ✅ 驗證是否成功回到大廳
-            if not self._is_in_game():
+            # ✅ 等待回到大廳（最多 5 秒）
+            if wait_page_state(self.driver, "lobby", timeout=5.0):
                 logging.info("[ExitFlow] 已成功回到大廳")
             else:
-                logging.warning("[ExitFlow] 退出後仍在遊戲中，可能需要額外等待")
-                time.sleep(2.0)
+                logging.warning("[ExitFlow] 退出 5 秒後仍未回到大廳")
         except Exception as e:
             logging.error(f"退出流程失敗: {e}\n{traceback.format_exc()}")
             return False
@@ -1616,13 +4321,11 @@ class GameRunner:
         if game_title_code:
             logging.info(f"[ExitFlow] 準備重新進入遊戲: {game_title_code}")
             if self.scroll_and_click_game(game_title_code):
-                # 等待遊戲加載並驗證是否成功進入
-                time.sleep(3.0)
-                if self._is_in_game():
+                # 等待遊戲加載（出現 Spin 按鈕或餘額）並驗證是否成功進入
+                if wait_page_state(self.driver, "game", timeout=5.0):
                     logging.info("[ExitFlow] 成功重新進入遊戲")
                 else:
-                    logging.warning("[ExitFlow] 重新進入遊戲後仍在大廳，可能需要額外等待")
-                    time.sleep(2.0)
+                    logging.warning("[ExitFlow] 重新進入遊戲 5 秒後仍未進入遊戲畫面")
             else:
                 logging.warning("[ExitFlow] 重新進入遊戲失敗")
 
@@ -1637,33 +4340,29 @@ class GameRunner:
             quit_btn = self._find_cashout_button()
             if quit_btn:
                 safe_click(self.driver, quit_btn)
-                time.sleep(0.5)  # 減少等待時間
             else:
                 logging.error("❌ 找不到 Cashout 按鈕，無法執行快速退出流程")
                 return False
 
             try:
-                exit_btn = WebDriverWait(self.driver, 1).until(  # 減少等待時間
+                exit_btn = WebDriverWait(self.driver, 1.5).until(  # 減少等待時間
                     EC.element_to_be_clickable((By.CSS_SELECTOR, ".function-btn .reserve-btn-gray"))
                     )
                 safe_click(self.driver, exit_btn)
                 logging.info("[FastExitFlow] 已點擊 Exit / Exit To Lobby")
-                time.sleep(0.5)  # 減少等待時間
             except TimeoutException:
                 logging.info("[FastExitFlow] 找不到 Exit，直接嘗試 Confirm")
 
-            confirm_btn = WebDriverWait(self.driver, 1).until(  # 減少等待時間
+            confirm_btn = WebDriverWait(self.driver, 1.5).until(  # 減少等待時間
                 EC.element_to_be_clickable((By.XPATH, "//button[.//div[normalize-space(text())='Confirm']]"))
             )
             safe_click(self.driver, confirm_btn)
-            time.sleep(1.5)  # 減少等待時間
             
-            # ✅ 驗證是否成功回到大廳
-            if not self._is_in_game():
+            # ✅ 等待回到大廳（最多 2.5 秒）
+            if wait_page_state(self.driver, "lobby", timeout=2.5):
                 logging.info("[FastExitFlow] 已成功回到大廳")
             else:
-                logging.warning("[FastExitFlow] 退出後仍在遊戲中，可能需要額外等待")
-                time.sleep(1.0)
+                logging.warning("[FastExitFlow] 退出 2.5 秒後仍未回到大廳")
         except Exception as e:
             logging.error(f"快速退出流程失敗: {e}")
 
@@ -1671,16 +4370,113 @@ class GameRunner:
         if game_title_code:
             logging.info(f"[FastExitFlow] 準備重新進入遊戲: {game_title_code}")
             if self.scroll_and_click_game(game_title_code):
-                # 等待遊戲加載並驗證是否成功進入
-                time.sleep(2.0)  # 快速流程使用較短等待時間
-                if self._is_in_game():
+                # 等待遊戲加載並驗證是否成功進入（快速流程使用較短上限）
+                if wait_page_state(self.driver, "game", timeout=3.0):
                     logging.info("[FastExitFlow] 成功重新進入遊戲")
                 else:
-                    logging.warning("[FastExitFlow] 重新進入遊戲後仍在大廳，可能需要額外等待")
-                    time.sleep(1.0)
+                    logging.warning("[FastExitFlow] 重新進入遊戲 3 秒後仍未進入遊戲畫面")
             else:
                 logging.warning("[FastExitFlow] 重新進入遊戲失敗")
 
+    def _grab_frame(self, name: str, url: str, timeout: float) -> Optional[Tuple[np.ndarray, Optional[FrameRef]]]:
+        """
+        取得一張 RTMP 畫面，回傳 (BGR 畫面, 環形緩衝參照 or None)；只在記憶體中，不落地
+
+        - 有常駐取幀時：直接取環形緩衝中的最新畫面（不超過 GRABBER_MAX_AGE 秒），畫面為共享記憶體上的唯讀 view，
+          剛啟動尚無畫面時最多等 timeout 秒
+        - 常駐取幀停用或取不到畫面時：退回 FFmpegRunner.snapshot_frame 單張截圖（走 pipe），參照為 None
+        """
+        if self.grabbers is not None:
+            grabber = self.grabbers.get(url, name=self.cfg.rtmp or name)
+            ref = grabber.latest(max_age=GRABBER_MAX_AGE) or grabber.wait_frame(timeout, max_age=GRABBER_MAX_AGE)
+            if ref is not None:
+                return ref.array, ref
+            logging.warning(f"[{name}] 常駐取幀 {timeout:.1f}s 內無可用畫面，改用單張截圖")
+        img = self.ffmpeg.snapshot_frame(url, timeout=timeout)
+        if img is None or img.size == 0:
+            return None
+        return img, None
+
+    def _dup_count(self, name: str, url: str, img: np.ndarray, ref: Optional[FrameRef]) -> int:
+        """
+        回傳連續重複次數（0 表示畫面有變化）：
+        - 常駐取幀：取幀端每張畫面都已比對過，兩次檢測之間 last_change_seq 沒前進即視為重複
+        - 單張截圖：只能拿這張與上一張截圖比對
+        """
+        grabber = self.grabbers.get(url, name=self.cfg.rtmp or name) if self.grabbers is not None and ref is not None else None
+        if grabber is None or grabber.dup_detector is None:
+            return self.dup_detector.observe(name, img)
+        change = grabber.last_change_seq
+        self._dup_streak = self._dup_streak + 1 if change == self._dup_change_seq else 0
+        self._dup_change_seq = change
+        return self._dup_streak
+
+    def _reset_dup_count(self, name: str) -> None:
+        self._dup_streak = 0
+        self.dup_detector.reset_count(name)
+
+    def _save_evidence(self, name: str, ts: str, frame: np.ndarray, ref: Optional[FrameRef] = None) -> Optional[Path]:
+        """只有畫面成為證據（模板觸發、比對例外）時才寫檔；檔名沿用 {name}_{ts}.jpg 以便與錄影對照"""
+        out = SCREENSHOT_RTMP / f"{name}_{ts}.jpg"
+        if ref is not None:
+            # 環形緩衝中的畫面之後會被覆寫：先複製一份，複製完仍是比對的那張才算數
+            # （寫入端動筆前會先把該格序號改掉，複製後序號沒變即代表複製期間沒被寫過）
+            frame = frame.copy()
+            if not ref.is_current():
+                logging.warning(f"[{name}] 證據畫面已被新畫面覆寫，不保存截圖（請以錄影檔為準）")
+                return None
+        try:
+            if cv2.imwrite(str(out), frame):
+                return out
+            logging.warning(f"[{name}] 證據截圖寫檔失敗：{out.name}")
+        except Exception as e:
+            logging.warning(f"[{name}] 證據截圖寫檔發生例外: {e}")
+        return None
+
+    def _detect_verdict(self, src: Union[np.ndarray, FrameRef], threshold: float, fast: bool = False) -> DetectionVerdict:
+        """一般模板 + 錯誤模板一次判定（經由 DetectionPool，畫面前處理只做一次）"""
+        return self.detector.detect(
+            "detect_verdict",
+            src,
+            template_type=self.template_type,           # 僅比對該遊戲類型
+            error_template_type=self.error_template_type,
+            rtmp=self.cfg.rtmp,                          # when 條件以參數帶入（不改共用 matcher 的狀態）
+            title=self.cfg.game_title_code,
+            game=self.cfg.game_title_code or "UnknownGame",
+            default_threshold=threshold,                 # fallback 門檻
+            fast=fast,
+        )
+
+    def _note_stale_frame(self, name: str, tag: str = "") -> None:
+        """畫面在比對途中被覆寫、本輪偵測作廢；連續 STALE_WARN_STREAK 輪以上改記 WARNING（比對跟不上取幀速度）"""
+        self._stale_drops += 1
+        if self._stale_drops >= STALE_WARN_STREAK:
+            logging.warning(
+                f"[{name}] {tag}畫面在比對途中被新畫面覆寫，已連續 {self._stale_drops} 輪略過偵測"
+                f"（比對太慢，請檢查 DETECTION_WORKERS 或主機負載）"
+            )
+        else:
+            logging.info(f"[{name}] {tag}畫面在比對途中被新畫面覆寫，本輪略過")
+
+    def _log_error_scores(self, name: str, verdict: DetectionVerdict, tag: str = "") -> None:
+        """輸出錯誤模板（高分觸發）的逐張分數與判定；本輪沒有比對錯誤模板時不輸出"""
+        if not self.error_template_type or verdict.result is None:
+            return
+        errors = verdict.result.scores.get(self.error_template_type)
+        if errors is None:
+            return
+        for t in errors:
+            logging.info(
+                f"[{name}] ErrorTemplateScore{tag} file={t.file} "
+                f"score={t.score:.5f} thr={t.thr:.2f} hit_high={t.score >= t.thr} (高分觸發: score>=thr)"
+            )
+        if verdict.kind == DetectionVerdict.ERROR:
+            logging.warning(
+                f"[{name}] 🎯 錯誤模板高分觸發{tag}：{verdict.file} (score={verdict.score:.5f} >= thr={verdict.thr:.2f})"
+            )
+        else:
+            logging.info(f"[{name}] 錯誤模板未觸發{tag}（所有模板分數皆 < 門檻）")
+
     def _fast_rtmp_check(self, name: str, url: str, threshold: float = 0.80) -> bool:
         """
         超快頻率專用的快速 RTMP 檢測
@@ -1694,11 +4490,10 @@ class GameRunner:
             bool: True 表示觸發錄影（一般模板低分觸發），False 表示未觸發或錯誤模板觸發
             
         流程:
-        1. 使用較短超時時間（2秒）截圖
-        2. 讀取圖片並驗證
-        3. 先用原本的模板類型比對（低分觸發）
-        4. 若未觸發，檢查錯誤模板類型（高分觸發，只截圖不錄影）
-        5. 立即清理截圖（錯誤模板除外）
+        1. 取得記憶體中的畫面（常駐取幀；退回單張截圖時超時 2 秒）
+        2. 以 detect_verdict 一次比對：先用原本的模板類型（低分觸發）
+        3. 若未觸發，檢查錯誤模板類型（高分觸發，只截圖不錄影）
+        4. 只有觸發時才把畫面寫成截圖檔
         
         優化:
         - 跳過重複畫面檢測（節省時間）
@@ -1706,116 +4501,52 @@ class GameRunner:
         - 錯誤模板觸發時保留截圖但不觸發錄影
         
         異常處理:
-        - FFmpeg 截圖失敗：返回 False
-        - 圖片讀取失敗：清理截圖後返回 False
-        - 模板比對例外：清理截圖後返回 False
+        - 取不到畫面：返回 False
+        - 模板比對例外：返回 False
         """
         logging.info(f"[{name}] 超快頻率快速 RTMP 檢測")
         
         # 使用較短的截圖超時 (2秒)
         ts = time.strftime("%Y%m%d_%H%M%S")
-        out = SCREENSHOT_RTMP / f"{name}_{ts}.jpg"
-        if not self.ffmpeg.snapshot(url, out, timeout=2.0):
-            logging.warning(f"[{name}] 快速檢測 - FFmpeg 擷取失敗或逾時")
-            return False
-
-        # 讀取圖片
-        img = cv2.imread(str(out))
-        if img is None or img.size == 0:
-            logging.warning(f"[{name}] 快速檢測 - 讀圖失敗，刪除後跳過")
-            try:
-                out.unlink(missing_ok=True)
-            except Exception:
-                pass
+        got = self._grab_frame(name, url, timeout=2.0)
+        if got is None:
+            logging.warning(f"[{name}] 快速檢測 - 取得畫面失敗或逾時")
             return False
+        img, ref = got
+        src = ref if ref is not None else img  # 有環形緩衝參照時，比對程序直接讀共享記憶體
         
-        # 快速模板比對（限制模板數量）
+        # 一次比對完成一般模板（限制模板數量、低分觸發）與錯誤模板（高分觸發）
         try:
-            self.matcher.current_game = self.cfg.game_title_code or "UnknownGame"
-            self.matcher.cfg = self.cfg
-
-            hit = None
-
-            # 1) 先用原本的模板類型比對（維持舊流程，低分觸發）
-            if self.template_type:
-                hit = self.matcher.detect_by_manifest_fast(
-                    img,
-                    type_name=self.template_type,
-                    default_threshold=threshold,
-                    max_templates=2,  # 限制比對數量
-                )
-
-            # 2) 若原本類型未觸發，且有為此機台額外指定 error_template_type，
-            #    則改用「高分觸發」邏輯再比一次（比分數大則觸發）
-            error_hit_file_fast = None
-            if hit is None and self.error_template_type and self.error_template_type != self.template_type:
-                logging.info(
-                    f"[{name}] 快速檢測 - 進行錯誤畫面模板比對（高分觸發），type='{self.error_template_type}'"
-                )
-                # 為了取得分數細節，error 類型改用完整版 detect_by_manifest
-                _, report = self.matcher.detect_by_manifest(
-                    img,
-                    type_name=self.error_template_type,
-                    default_threshold=threshold,
-                    return_report=True,
-                )
-                best_file = None
-                best_score = float("-inf")
-                error_hit = False
-                for item in report.get("templates", []):
-                    score = item["score"]
-                    thr = item["thr"]
-                    hit_high = (score >= thr)
-                    logging.info(
-                        f"[{name}] ErrorTemplateScore(fast) file={item['file']} "
-                        f"score={score:.5f} thr={thr:.2f} hit_high={hit_high} (高分觸發: score>=thr)"
-                    )
-                    if hit_high:
-                        error_hit = True
-                        if score > best_score:
-                            best_score = score
-                            best_file = item["file"]
-
-                if error_hit:
-                    error_hit_file_fast = best_file
-                    hit = best_file
-                    logging.warning(
-                        f"[{name}] 🎯 錯誤模板高分觸發（快速檢測）：{best_file} "
-                        f"(score={best_score:.5f} >= thr={thr:.2f})"
-                    )
-                else:
-                    logging.info(
-                        f"[{name}] 錯誤模板未觸發（快速檢測，所有模板分數皆 < 門檻）"
-                    )
-
+            verdict = self._detect_verdict(src, threshold, fast=True)
+        except StaleFrameError:
+            self._note_stale_frame(name, tag="快速檢測 - ")
+            return False
         except Exception as e:
             logging.error(f"[{name}] 快速檢測 - 模板比對發生例外：{e}\n{traceback.format_exc()}")
-            try:
-                out.unlink(missing_ok=True)
-            except Exception as cleanup_err:
-                logging.debug(f"清理截圖失敗: {cleanup_err}")
             return False
-        
-        # 針對 error 模板：只截圖、不錄影 → 不刪除截圖並直接返回 False
-        if 'error_hit_file_fast' in locals() and error_hit_file_fast:
-            logging.info(f"[{name}] 快速檢測：錯誤模板高分觸發，已保留截圖，不觸發錄影")
+        self._stale_drops = 0
+        self._log_error_scores(name, verdict, tag="(fast)")
+
+        # 針對 error 模板：預設只截圖、不錄影 → 保存截圖並直接返回 False
+        if verdict.kind == DetectionVerdict.ERROR:
+            self._save_evidence(name, ts, img, ref)
+            if self.cfg.record_error_hits and self.cfg.enable_recording and not self._is_recording_pending():
+                logging.warning(f"[{name}] 快速檢測：錯誤模板高分觸發，優先排入錄影")
+                self._start_recording(name, url, duration_sec=120, ts=ts, kind="error")
+            else:
+                logging.info(f"[{name}] 快速檢測：錯誤模板高分觸發，已保留截圖，不觸發錄影")
             return False
 
-        # 其他情況：維持原本流程，立即清理截圖
-        try:
-            out.unlink(missing_ok=True)
-        except Exception:
-            pass
-        
-        if hit is not None:
-            logging.warning(f"[{name}] 快速檢測 - 低分觸發：{hit}")
+        if verdict.kind == DetectionVerdict.NORMAL:
+            self._save_evidence(name, ts, img, ref)
+            logging.warning(f"[{name}] 快速檢測 - 低分觸發：{verdict.file}")
             return True
-        
+
         return False
 
     def _rtmp_once_check(self, name: str, url: str, threshold: float = 0.80, max_dup: int = 3) -> None:
         """
-        針對 RTMP 執行一次截圖 + 模板偵測
+        針對 RTMP 執行一次取幀 + 模板偵測
         
         參數:
             name (str): RTMP 識別名稱（用於日誌和檔案命名）
@@ -1824,181 +4555,108 @@ class GameRunner:
             max_dup (int): 連續重複畫面次數門檻，預設 3
             
         流程:
-        1. 檢查是否正在錄影（錄影中跳過檢測，只清理截圖）
-        2. 使用 FFmpeg 截圖（超時 5 秒）
-        3. 重複畫面檢測（MD5 比對，連續 max_dup 次推播通知）
-        4. 模板比對：
+        1. 檢查是否正在錄影（錄影中跳過檢測）
+        2. 取得記憶體中的畫面（常駐取幀；退回單張截圖時超時 5 秒）
+        3. 重複畫面檢測（常駐取幀在讀取端逐張比對，連續 max_dup 次推播通知）
+        4. 模板比對（detect_verdict 一次完成）：
            - 先用原本的模板類型（低分觸發 → 錄影）
            - 若未觸發，檢查錯誤模板類型（高分觸發 → 只截圖）
-        5. 觸發時保留截圖，未觸發時清理截圖
+        5. 只有觸發（或比對例外）時才把畫面寫成截圖檔，其餘畫面不落地
         
         觸發邏輯:
-        - 一般模板：score <= threshold → 啟動錄影 120 秒
-        - 錯誤模板：score >= threshold → 只保留截圖，不錄影
+        - 一般模板：score <= threshold → 啟動錄影 120 秒（畫面重複時不錄影：凍結畫面錄下來也沒有內容）
+        - 錯誤模板：score >= threshold → 只保留截圖，不錄影（畫面重複時照常比對，凍結的錯誤 / 斷線畫面正是要抓的）
         
         異常處理:
-        - FFmpeg 截圖失敗：記錄警告並返回
-        - 圖片讀取失敗：清理截圖並返回
+        - 取不到畫面：記錄警告並返回
         - 模板比對例外：保留截圖協助診斷
         """
-        # 若已有錄影在進行，先維護一次狀態；錄影中則直接略過「偵測」（但還是清掉截圖）
-        if self._is_recording_active():
-            ts = time.strftime("%Y%m%d_%H%M%S")
-            out = SCREENSHOT_RTMP / f"{name}_{ts}.jpg"
-            try:
-                if self.ffmpeg.snapshot(url, out, timeout=5.0):
-                    try:
-                        out.unlink(missing_ok=True)  # 錄影中，任何截圖直接清掉
-                    except Exception as cleanup_err:
-                        logging.debug(f"錄影中清理截圖失敗: {cleanup_err}")
-            except Exception as snapshot_err:
-                logging.debug(f"錄影中截圖失敗: {snapshot_err}")
+        # 錄影進行中則直接略過「偵測」；只是排隊中仍照常偵測（新的觸發不會重複排入錄影）
+        if self._is_recording_running():
             return
 
-        # 取得一張快照供偵測
+        # 取得一張畫面供偵測（只在記憶體中）
         ts = time.strftime("%Y%m%d_%H%M%S")
-        out = SCREENSHOT_RTMP / f"{name}_{ts}.jpg"
         try:
-            if not self.ffmpeg.snapshot(url, out, timeout=5.0):
-                logging.warning(f"[{name}] FFmpeg 擷取失敗或逾時")
-                return
+            got = self._grab_frame(name, url, timeout=5.0)
         except Exception as e:
-            logging.error(f"[{name}] FFmpeg 截圖發生例外: {e}")
+            logging.error(f"[{name}] 取得 RTMP 畫面發生例外: {e}")
+            return
+        if got is None:
+            logging.warning(f"[{name}] 取得 RTMP 畫面失敗或逾時")
             return
+        img, ref = got
+        src = ref if ref is not None else img  # 有環形緩衝參照時，比對程序直接讀共享記憶體
 
-        # 重複畫面偵測（以 MD5 比對）
-        curr = file_md5(out)
-        prev = last_image_hash.get(name)
-        if prev == curr:
-            cnt = int(last_image_hash.get(f"{name}_dup", "0")) + 1
-            last_image_hash[f"{name}_dup"] = str(cnt)
+        # 重複畫面偵測（以解碼後畫面的縮圖比對）；重複時仍繼續比對錯誤模板，只略過錄影
+        cnt = self._dup_count(name, url, img, ref)
+        if cnt > 0:
             logging.warning(f"[{name}] 重複圖片 {cnt}/{max_dup}")
-            # 重複的這張，立刻刪掉
-            try:
-                out.unlink(missing_ok=True)
-            except Exception:
-                pass
             # 達門檻推播一次後把 counter 歸零
             if cnt >= max_dup:
                 try:
-                    self.lark.send_text(f"🔄 [{name}] RTMP 畫面連續重複 {cnt} 次，請檢查串流")
+                    self.lark.send_text(f"🔄 [{name}] RTMP 畫面連續重複 {cnt} 次，請檢查串流", key="dup")
                 except Exception:
                     pass
-                last_image_hash[f"{name}_dup"] = "0"
-            return
-        else:
-            last_image_hash[name] = curr
-            last_image_hash[f"{name}_dup"] = "0"
+                self._reset_dup_count(name)
 
-        # 模板偵測（低於門檻觸發錄影）
-        img = cv2.imread(str(out))
-        if img is None or img.size == 0:
-            logging.warning(f"[{name}] 讀圖失敗或為空影像：{out.name}，刪除後跳過")
-            try:
-                out.unlink(missing_ok=True)
-            except Exception:
-                pass
-            return
-        
-        error_hit_file = None  # 標記是否由 error 模板高分觸發
+        # 模板偵測：一次比對完成一般模板（低分觸發 → 錄影）與錯誤模板（高分觸發 → 只截圖）
         try:
-            self.matcher.current_game = self.cfg.game_title_code or "UnknownGame"
-            self.matcher.cfg = self.cfg
-
-            hit = None
-
-            # 1) 先用原本的模板類型比對（維持舊流程，低分觸發）
-            if self.template_type:
-                hit = self.matcher.detect_by_manifest(
-                    img,
-                    type_name=self.template_type,   # 僅比對該遊戲類型
-                    default_threshold=threshold     # fallback 門檻
-                )
-
-            # 2) 若原本類型未觸發，且有為此機台額外指定 error_template_type，
-            #    則改用「高分觸發」邏輯再比一次（比分數大則觸發）
-            if hit is None and self.error_template_type and self.error_template_type != self.template_type:
-                logging.info(
-                    f"[{name}] RTMP 檢測 - 進行錯誤畫面模板比對（高分觸發），type='{self.error_template_type}'"
-                )
-                _, report = self.matcher.detect_by_manifest(
-                    img,
-                    type_name=self.error_template_type,
-                    default_threshold=threshold,
-                    return_report=True,
-                )
-                # 額外輸出 error 模板的分數細節，並改用「score >= thr」作為觸發條件
-                best_file = None
-                best_score = float("-inf")
-                error_hit = False
-                for item in report.get("templates", []):
-                    score = item["score"]
-                    thr = item["thr"]
-                    hit_high = (score >= thr)
-                    logging.info(
-                        f"[{name}] ErrorTemplateScore file={item['file']} "
-                        f"score={score:.5f} thr={thr:.2f} hit_high={hit_high} (高分觸發: score>=thr)"
-                    )
-                    if hit_high:
-                        error_hit = True
-                        if score > best_score:
-                            best_score = score
-                            best_file = item["file"]
-
-                if error_hit:
-                    error_hit_file = best_file
-                    hit = best_file
-                    logging.warning(
-                        f"[{name}] 🎯 錯誤模板高分觸發：{best_file} "
-                        f"(score={best_score:.5f} >= thr={thr:.2f})"
-                    )
-                else:
-                    logging.info(
-                        f"[{name}] 錯誤模板未觸發（所有模板分數皆 < 門檻）"
-                    )
-
+            verdict = self._detect_verdict(src, threshold)
+        except StaleFrameError:
+            self._note_stale_frame(name)
+            return
         except Exception as e:
             logging.error(f"[{name}] 模板比對發生例外：{e}\n{traceback.format_exc()}")
-            # 保留截圖協助診斷（不清理）
+            # 保留截圖協助診斷
+            self._save_evidence(name, ts, img, ref)
             return
-            
+        self._stale_drops = 0
+        self._log_error_scores(name, verdict)
+
+        hit = verdict.file if verdict.triggered else None
+        error_hit_file = hit if verdict.kind == DetectionVerdict.ERROR else None
+
         if hit is not None:
+            # 觸發 → 這張畫面當作證據寫檔（與錄影共用同一個 ts）
+            self._save_evidence(name, ts, img, ref)
+
             # 判斷觸發來源：error_template_type（高分觸發，只截圖不錄影），template_type（低分觸發 + 錄影）
             if error_hit_file:
-                # ✅ 錯誤模板：只截圖、不錄影（out 已是本次 error 畫面的截圖）
+                if self.cfg.record_error_hits and self.cfg.enable_recording:
+                    # ✅ 錯誤模板（record_error_hits=true）：排入錄影，優先於低分觸發
+                    logging.warning(f"[{name}] 錯誤模板高分觸發：{hit}，優先排入錄影")
+                    try:
+                        self.lark.send_text(f"⚠️ [{name}] 錯誤畫面偵測到（{hit}），已保留截圖並排入錄影 2 分鐘", key="error")
+                    except Exception:
+                        pass
+                    self._start_recording(name, url, duration_sec=120, ts=ts, kind="error")
+                    return
+                # ✅ 錯誤模板：只截圖、不錄影
                 logging.warning(f"[{name}] 錯誤模板高分觸發：{hit}，僅截圖、不啟動錄影")
                 try:
-                    self.lark.send_text(f"⚠️ [{name}] 錯誤畫面偵測到（{hit}），已保留截圖，不自動錄影")
+                    self.lark.send_text(f"⚠️ [{name}] 錯誤畫面偵測到（{hit}），已保留截圖，不自動錄影", key="error")
                 except Exception:
                     pass
-                # 不要刪除 out；直接結束
                 return
             else:
                 # 一般模板：維持原本「低分觸發 + 錄影」流程
                 logging.warning(f"[{name}] 低分觸發：{hit}")
-                
-                if self.cfg.enable_recording:
+
+                if cnt > 0:
+                    # 畫面凍結時的低分多半只是停格，證據截圖已保留，不啟動錄影
+                    logging.info(f"[{name}] 畫面重複中，略過錄影")
+                elif self.cfg.enable_recording and self._is_recording_pending():
+                    logging.info(f"[{name}] 已有錄影排隊中，本次觸發只保留截圖")
+                elif self.cfg.enable_recording:
                     logging.warning(f"[{name}] 開始錄影 120s")
                     try:
                         self.lark.send_text(f"🎯 [{name}] 低分觸發：{hit}\n即刻開始錄影 2 分鐘")
                     except Exception:
                         pass
-                    # ★ 自動暫停本機台（不影響其他台）
-                    self._auto_pause = True
-                    logging.info(f"[{name}]已暫停spin")
-
-                    # ★ 用同一個 ts（與上面快照 out 同名）
-                    self._start_recording(name, url, duration_sec=120, ts=ts)     
-
-                    # 等待錄影程序真的起來（最多 3 秒）
-                    t0 = time.time()   
-                    while time.time() - t0 < 3.0:
-                        if self._is_recording_active():
-                            break
-                        time.sleep(0.1)
-                    # ★ 錄影啟動後，恢復本機台 SPIN
-                    self._auto_pause = False
-                    logging.info(f"[{name}]已重新啟動spin")
+                    # ★ 用同一個 ts（與證據截圖同名）；排入排程後立即返回，
+                    #   錄影真正開始後由 spin 迴圈依 _rec_started_at 暫停本機台 Spin
+                    self._start_recording(name, url, duration_sec=120, ts=ts)
                 else:
                     # 錄製功能停用，只推播通知
                     logging.info(f"[{name}] 錄製功能已停用，僅推播觸發通知")
@@ -2006,273 +4664,318 @@ class GameRunner:
                         self.lark.send_text(f"🎯 [{name}] 低分觸發：{hit}\n（錄製功能已停用）")
                     except Exception:
                         pass
-            
-            # 不刪這張截圖（當作觸發證據）
             return
-        else:
-            # 未觸發 → 清理截圖
-            try:
-                out.unlink(missing_ok=True)
-            except Exception:
-                pass
     
         # 錄影可能剛好在這輪結束（極少數），做個狀態維護
         self._maybe_cleanup_finished_recording()
 
+    def _pacing_active(self) -> bool:
+        """本機台節奏是否生效（有 spin_profiles.json 且未被熱鍵的全域頻率覆蓋）"""
+        with spin_frequency_lock:
+            if spin_frequency_override:
+                return False
+        return self.pacing is not None and self.pacing.profile is not None
+
+    def _failure_delay(self) -> float:
+        """Spin 失敗 / 例外後的等待：本機台節奏依 on_fail_backoff_ms 逐次拉長，否則固定 1 秒"""
+        return self.pacing.on_failure() if self._pacing_active() else 1.0
+
     def spin_forever(self):
         """
-        主要工作迴圈（無限循環直到收到停止訊號）
+        主要工作迴圈（執行緒模式；無限循環直到收到停止訊號）
+        
+        - 暫停（pause_event）時每 0.3 秒確認一次
+        - 每輪呼叫 _spin_step()，再以 stop_event.wait() 等待回傳的秒數（Ctrl+C / Ctrl+Esc 立即結束等待）
+        """
+        while not stop_event.is_set():
+            while pause_event.is_set() and not stop_event.is_set():
+                logging.info("[Loop] 已暫停，等待恢復（Space 解除暫停）")
+                time.sleep(0.3)
+            if stop_event.is_set():
+                break
+            delay = self._spin_step()
+            if delay > 0:
+                stop_event.wait(delay)
+
+    def _spin_step(self) -> float:
+        """
+        執行一輪 Spin（spin_forever 的執行緒迴圈與 AsyncOrchestrator 共用）
         
-        每輪循環流程:
-        1. 檢查暫停狀態（pause_event 或 _auto_pause）
-        2. 定時檢測 404 頁面（每 30 秒一次）
-        3. 檢查錄影狀態（錄影開始未滿 10 秒時暫停 Spin）
-        4. 餘額檢查（Spin 前，低於 20000 執行退出流程）
-        5. 檢查是否在遊戲中（退出流程後可能還在大廳）
-        6. 點擊 Spin 按鈕
-        7. 餘額變化檢測（超快頻率用上次比較，正常頻率用前後比較）
-        8. 特殊流程（連續 10 次無變化觸發 machine_actions）
-        9. RTMP 檢測（根據頻率和設定執行模板比對）
-        10. 動態等待（根據頻率加上隨機抖動）
+        每輪流程:
+        1. 定時檢測 404 頁面（每 5 秒一次，換頁時立即檢測）
+        2. 檢查錄影狀態（錄影開始未滿 10 秒時暫停 Spin）
+        3. 餘額檢查（Spin 前，低於 20000 執行退出流程）
+        4. 檢查是否在遊戲中（退出流程後可能還在大廳）
+        5. 點擊 Spin 按鈕
+        6. 餘額變化檢測（超快頻率用上次比較，正常頻率用前後比較）
+        7. 特殊流程（連續 10 次無變化觸發 machine_actions）
+        8. RTMP 檢測（根據頻率和設定執行模板比對）
+        9. 計算下一輪前的等待（spin_profiles.json 的本機台節奏；熱鍵覆蓋時用全域頻率加隨機抖動）
         
         頻率調整:
+        - 頻率來源：spin_profiles.json 解析出的本機台間隔（PacingScheduler）；
+          按過小鍵盤頻率熱鍵（或沒有 spin_profiles.json）時改用全域 spin_frequency
         - 超快頻率（≤0.1s）：使用快速餘額檢查、間隔 RTMP 檢測
         - 正常頻率（>0.1s）：使用標準流程
         
         異常處理:
-        - 任意例外：記錄錯誤、嘗試 RTMP 截圖、等待 1 秒後繼續
+        - Spin 點擊失敗 / 任意例外：依 on_fail_backoff_ms 退避（全域頻率時固定 1 秒）後繼續
+        - 任意例外：另外記錄錯誤、嘗試 RTMP 截圖
         - KeyboardInterrupt：由外層 run() 處理
         
-        停止條件:
-        - stop_event 被設置（Ctrl+C 或 Ctrl+Esc）
+        返回:
+            float: 下一輪開始前要等待的秒數（由呼叫端等待，收到停止訊號可立即中斷）
         """
         game_code = self.cfg.game_title_code or ""
         is_special_game = any(k in game_code for k in SPECIAL_GAMES)
 
-        while not stop_event.is_set():
-            while pause_event.is_set() and not stop_event.is_set():
-                logging.info("[Loop] 已暫停，等待恢復（Space 解除暫停）")
-                time.sleep(0.3)
-            try:
-                loop_start_time = time.time()  # 記錄循環開始時間
-                
-                # 獲取當前頻率設定
+        try:
+            loop_start_time = time.time()  # 記錄循環開始時間
+            
+            # 獲取當前頻率設定：本機台節奏，熱鍵覆蓋時用全域頻率
+            use_pacing = self._pacing_active()
+            if use_pacing:
+                current_freq = self.pacing.spin_frequency_hint()
+            else:
                 with spin_frequency_lock:
                     current_freq = spin_frequency
-                
-                # ✅ 定時檢測 404 頁面（每 30 秒一次）
-                self._check_and_refresh_if_404()
-                
-                # ✅ 如果正在錄影，並且錄影開始未滿 10 秒，就暫停 spin
-                if hasattr(self, "_rec_started_at"):
-                    delta = time.time() - self._rec_started_at
-                    if delta < 10:
-                        logging.info(f"[{game_code}] 錄影開始 {delta:.1f}s，等待到 10 秒才開始 Spin")
-                        time.sleep(1.0)
-                        continue  # 跳過這輪 loop，不執行 Spin
-                # 1) Balance 檢查（Spin 前）
-                bal_before = self._parse_balance(is_special=is_special_game)
-                if bal_before is not None:
-                    if bal_before < 20000:
-                        # 所有頻率都執行退出流程，但超快頻率使用快速退出
-                        if current_freq <= 0.1:  # 超快頻率使用快速退出流程
-                            logging.warning(f"超快頻率({current_freq}s) - 餘額過低({bal_before})，執行快速退出流程")
-                            self._fast_low_balance_exit_and_reenter(bal_before, self.cfg.game_title_code)
-                            time.sleep(1.0)  # 減少等待時間
-                            continue
-                        else:  # 正常頻率使用標準退出流程
-                            self._low_balance_exit_and_reenter(bal_before, self.cfg.game_title_code)
-                            time.sleep(2.0)
-                            continue
+            
+            # ✅ 本輪頁面快照：餘額、遊戲中 / 大廳、Spin 按鈕、Cashout、404 標記一次取得
+            snap = self._probe_page(is_special_game)
+
+            # ✅ 定時檢測 404 頁面（每 5 秒一次，換頁時立即）；刷新後快照已失效，重新開始本輪
+            if self._check_and_refresh_if_404(snap):
+                return 0.0
+            
+            # ✅ 如果正在錄影，並且錄影開始未滿 after_recording_delay_sec（預設 10 秒），就暫停 spin
+            with self._lock:
+                rec_started_at = self._rec_started_at
+            if rec_started_at is not None:
+                delta = time.time() - rec_started_at
+                rec_delay = self.pacing.after_recording_delay() if use_pacing else 10.0
+                if delta < rec_delay:
+                    logging.info(f"[{game_code}] 錄影開始 {delta:.1f}s，等待到 {rec_delay:.0f} 秒才開始 Spin")
+                    return 1.0  # 跳過這輪，不執行 Spin
+            # 1) Balance 檢查（Spin 前）
+            bal_before = snap.balance if snap is not None else self._parse_balance(is_special=is_special_game)
+            if bal_before is not None:
+                if bal_before < 20000:
+                    # 所有頻率都執行退出流程，但超快頻率使用快速退出
+                    if current_freq <= 0.1:  # 超快頻率使用快速退出流程
+                        logging.warning(f"超快頻率({current_freq}s) - 餘額過低({bal_before})，執行快速退出流程")
+                        # 退出流程內已等待回到大廳 / 重新進入遊戲，不再額外固定等待
+                        self._fast_low_balance_exit_and_reenter(bal_before, self.cfg.game_title_code)
+                        return 0.0
+                    else:  # 正常頻率使用標準退出流程
+                        self._low_balance_exit_and_reenter(bal_before, self.cfg.game_title_code)
+                        return 0.0
+            else:
+                logging.info("無法取得 BAL，略過本輪餘額檢查")
+
+            # ✅ 檢查是否在遊戲中（退出流程後可能還在大廳）
+            in_game = snap.in_game if snap is not None else self._is_in_game()
+            if not in_game:
+                snap = None  # 重新進入遊戲後快照已失效
+                logging.warning(f"{game_code} 檢測到在大廳，先嘗試進入遊戲")
+                if game_code:
+                    if self.scroll_and_click_game(game_code):
+                        logging.info(f"{game_code} 成功進入遊戲，等待遊戲畫面出現")
+                        if not wait_page_state(self.driver, "game", timeout=8.0):
+                            logging.warning(f"{game_code} 8 秒內未出現遊戲畫面，下一輪再確認")
+                    else:
+                        logging.warning(f"{game_code} 無法進入遊戲，跳過本輪")
+                        return 2.0
                 else:
-                    logging.info("無法取得 BAL，略過本輪餘額檢查")
-
-                # ✅ 檢查是否在遊戲中（退出流程後可能還在大廳）
-                if not self._is_in_game():
-                    logging.warning(f"{game_code} 檢測到在大廳，先嘗試進入遊戲")
-                    if game_code:
-                        if self.scroll_and_click_game(game_code):
-                            logging.info(f"{game_code} 成功進入遊戲，等待頁面穩定")
-                            time.sleep(3.0)  # 等待遊戲加載
-                        else:
-                            logging.warning(f"{game_code} 無法進入遊戲，跳過本輪")
-                            time.sleep(2.0)
-                            continue
+                    logging.warning(f"{game_code} 沒有 game_title_code，無法進入遊戲")
+                    return 2.0
+
+            # 2) 點擊 Spin 並等待結算：快照確認按鈕可點時直接以快照的觀察器點擊；
+            #    否則（剛進遊戲、按鈕還在載入）先記下觀察器狀態，再等按鈕出現後點擊
+            settle_timeout = self._settle_timeout(current_freq)
+            if snap is not None and snap.spin_ready:
+                clicked, bal_after = self._click_spin_and_wait(snap, is_special_game, settle_timeout)
+            else:
+                armed = self._arm_spin_watch(is_special_game)
+                clicked = self._click_spin(is_special=is_special_game)
+                bal_after = self._wait_spin_settled(armed, is_special_game, settle_timeout) if clicked else None
+            if not clicked:
+                logging.warning(f"{game_code} 點擊 Spin 失敗，嘗試回廳重進")
+                if game_code:
+                    self.scroll_and_click_game(game_code)
+                return self._failure_delay()
+
+            freq_status = self.pacing.profile.source if use_pacing else get_current_frequency_status()
+            logging.info(f"已點擊 {'特殊' if is_special_game else '一般'} Spin (頻率: {freq_status})")
+
+            # 3) 餘額變化檢測：bal_after 為頁面回報 Spin 結算（餘額 / Spin 按鈕變動後安靜下來）時的餘額，
+            #    等待上限依頻率決定（超快頻率最多 0.3 秒）
+            if current_freq <= 0.1:  # 超快頻率
+                logging.info(f"超快頻率({current_freq}s) - 快速餘額檢查")
+            
+            # 檢測餘額變化（累積統計模式）
+            balance_changed = False
+            should_trigger_special = False
+            
+            if current_freq <= 0.1:  # 超快頻率使用與上次餘額比較
+                if self._last_balance is not None and bal_after is not None:
+                    balance_changed = (bal_after != self._last_balance)
+                    if balance_changed:
+                        logging.info(f"超快頻率餘額變化 (與上次比較): {self._last_balance:,} → {bal_after:,} (變化: {bal_after - self._last_balance:+,})")
+                        self._no_change_count = 0  # 重置計數器
                     else:
-                        logging.warning(f"{game_code} 沒有 game_title_code，無法進入遊戲")
-                        time.sleep(2.0)
-                        continue
-
-                # 2) 點擊 Spin
-                if not self._click_spin(is_special=is_special_game):
-                    logging.warning(f"{game_code} 點擊 Spin 失敗，嘗試回廳重進")
-                    if game_code:
-                        self.scroll_and_click_game(game_code)
-                    time.sleep(1.0)
-                    continue
-
-                logging.info(f"已點擊 {'特殊' if is_special_game else '一般'} Spin (頻率: {get_current_frequency_status()})")
-
-                # 3) 餘額變化檢測（超快頻率使用快速檢查）
-                balance_changed = False
-                
-                # 根據頻率調整等待時間
-                if current_freq <= 0.1:  # 超快頻率
-                    time.sleep(0.05)  # 極短等待時間
-                    logging.info(f"超快頻率({current_freq}s) - 快速餘額檢查")
-                elif current_freq <= 0.5:  # 快速頻率
-                    time.sleep(0.2)  # 較短等待時間
-                else:  # 正常頻率以上
-                    time.sleep(0.5)  # 標準等待時間
-                
-                bal_after = self._parse_balance(is_special=is_special_game)
-                
-                # 檢測餘額變化（累積統計模式）
-                balance_changed = False
-                should_trigger_special = False
-                
-                if current_freq <= 0.1:  # 超快頻率使用與上次餘額比較
-                    if self._last_balance is not None and bal_after is not None:
-                        balance_changed = (bal_after != self._last_balance)
-                        if balance_changed:
-                            logging.info(f"超快頻率餘額變化 (與上次比較): {self._last_balance:,} → {bal_after:,} (變化: {bal_after - self._last_balance:+,})")
-                            self._no_change_count = 0  # 重置計數器
-                        else:
-                            self._no_change_count += 1
-                            logging.info(f"超快頻率餘額無變化 (與上次比較): {bal_after:,} (連續無變化: {self._no_change_count}/{self._check_interval})")
+                        self._no_change_count += 1
+                        logging.info(f"超快頻率餘額無變化 (與上次比較): {bal_after:,} (連續無變化: {self._no_change_count}/{self._check_interval})")
+                else:
+                    self._no_change_count += 1
+                    logging.info(f"超快頻率 - 無法與上次餘額比較，計入無變化: {self._no_change_count}/{self._check_interval}")
+            else:  # 正常頻率使用 Spin 前後比較
+                if bal_before is not None and bal_after is not None:
+                    balance_changed = (bal_after != bal_before)
+                    if balance_changed:
+                        logging.info(f"餘額變化: {bal_before:,} → {bal_after:,} (變化: {bal_after - bal_before:+,})")
+                        self._no_change_count = 0  # 重置計數器
                     else:
                         self._no_change_count += 1
-                        logging.info(f"超快頻率 - 無法與上次餘額比較，計入無變化: {self._no_change_count}/{self._check_interval}")
-                else:  # 正常頻率使用 Spin 前後比較
-                    if bal_before is not None and bal_after is not None:
-                        balance_changed = (bal_after != bal_before)
-                        if balance_changed:
-                            logging.info(f"餘額變化: {bal_before:,} → {bal_after:,} (變化: {bal_after - bal_before:+,})")
-                            self._no_change_count = 0  # 重置計數器
-                        else:
-                            self._no_change_count += 1
-                            logging.info(f"餘額無變化: {bal_after:,} (連續無變化: {self._no_change_count}/{self._check_interval})")
-                    elif self._last_balance is not None and bal_after is not None:
-                        # 如果這輪無法取得 Spin 前餘額，但能取得 Spin 後餘額，與上次比較
-                        balance_changed = (bal_after != self._last_balance)
-                        if balance_changed:
-                            logging.info(f"餘額變化 (與上次比較): {self._last_balance:,} → {bal_after:,} (變化: {bal_after - self._last_balance:+,})")
-                            self._no_change_count = 0  # 重置計數器
-                        else:
-                            self._no_change_count += 1
-                            logging.info(f"餘額無變化 (與上次比較): {bal_after:,} (連續無變化: {self._no_change_count}/{self._check_interval})")
+                        logging.info(f"餘額無變化: {bal_after:,} (連續無變化: {self._no_change_count}/{self._check_interval})")
+                elif self._last_balance is not None and bal_after is not None:
+                    # 如果這輪無法取得 Spin 前餘額，但能取得 Spin 後餘額，與上次比較
+                    balance_changed = (bal_after != self._last_balance)
+                    if balance_changed:
+                        logging.info(f"餘額變化 (與上次比較): {self._last_balance:,} → {bal_after:,} (變化: {bal_after - self._last_balance:+,})")
+                        self._no_change_count = 0  # 重置計數器
                     else:
                         self._no_change_count += 1
-                        logging.info(f"無法檢測餘額變化，計入無變化: {self._no_change_count}/{self._check_interval}")
-                
-                # 檢查是否達到觸發特殊流程的條件
-                if self._no_change_count >= self._check_interval:
-                    should_trigger_special = True
-                    logging.info(f"🎯 連續 {self._check_interval} 次無變化，觸發特殊流程！")
-                    self._no_change_count = 0  # 重置計數器
-                
-                # 更新上次餘額記錄
-                if bal_after is not None:
-                    self._last_balance = bal_after
-
-                # 4) 特殊機台 Spin 後流程（依 actions.json 的 machine_actions）
-                # 只有累積 10 次無變化時才執行特殊流程
-                if should_trigger_special:
-                    for kw, (positions, do_take) in self.machine_actions.items():
-                        if game_code and kw in game_code:
-                            if current_freq <= 0.1:  # 超快頻率
-                                logging.info(f"超快頻率({current_freq}s) - 連續{self._check_interval}次無變化觸發特殊流程: {kw} -> {positions}, take={do_take}")
-                            else:
-                                logging.info(f"連續{self._check_interval}次無變化觸發特殊流程: {kw} -> {positions}, take={do_take}")
-                            self.click_multiple_positions(positions, click_take=do_take)
-                            break
-                elif balance_changed:
-                    logging.info("餘額有變化，重置計數器，繼續 Spin")
+                        logging.info(f"餘額無變化 (與上次比較): {bal_after:,} (連續無變化: {self._no_change_count}/{self._check_interval})")
                 else:
-                    logging.info(f"餘額無變化，累積計數: {self._no_change_count}/{self._check_interval}，繼續 Spin")
-
-                # 5) RTMP 單次偵測（可選）
-                if self.cfg.rtmp and self.cfg.rtmp_url:
-                    # 檢查是否啟用模板偵測（高頻率時可關閉以提升性能）
-                    if current_freq <= 0.1:  # 超快頻率使用間隔檢測
-                        if not self.cfg.enable_template_detection:
-                            logging.info(f"超快頻率({current_freq}s) - 模板偵測已關閉，跳過 RTMP 檢測")
-                        else:
-                            self._spin_count += 1
-                            # 每隔 5 次 Spin 才檢測一次 RTMP
-                            if self._spin_count % 5 == 0:
-                                logging.info(f"超快頻率({current_freq}s) - 間隔檢測 RTMP (第 {self._spin_count} 次)")
-                                if self._fast_rtmp_check(self.cfg.rtmp, self.cfg.rtmp_url, threshold=0.80):
-                                    # 快速檢測觸發，執行錄影流程
-                                    logging.warning(f"[{self.cfg.rtmp}] 快速檢測觸發，開始錄影 120s")
-                                    try:
-                                        self.lark.send_text(f"🎯 [{self.cfg.rtmp}] 快速檢測觸發\n即刻開始錄影 2 分鐘")
-                                    except Exception:
-                                        pass
-                                    # 自動暫停本機台
-                                    self._auto_pause = True
-                                    logging.info(f"[{self.cfg.rtmp}]已暫停spin")
-                                    
-                                    # 開始錄影
-                                    ts = time.strftime("%Y%m%d_%H%M%S")
-                                    self._start_recording(self.cfg.rtmp, self.cfg.rtmp_url, duration_sec=120, ts=ts)
-                                    
-                                    # 等待錄影程序啟動
-                                    t0 = time.time()   
-                                    while time.time() - t0 < 3.0:
-                                        if self._is_recording_active():
-                                            break
-                                        time.sleep(0.1)
-                                    # 恢復本機台 SPIN
-                                    self._auto_pause = False
-                                    logging.info(f"[{self.cfg.rtmp}]已重新啟動spin")
-                    else:  # 正常頻率使用標準檢測
-                        if not self.cfg.enable_template_detection:
-                            logging.info(f"正常頻率({current_freq}s) - 模板偵測已關閉，跳過 RTMP 檢測")
+                    self._no_change_count += 1
+                    logging.info(f"無法檢測餘額變化，計入無變化: {self._no_change_count}/{self._check_interval}")
+            
+            # 檢查是否達到觸發特殊流程的條件
+            if self._no_change_count >= self._check_interval:
+                should_trigger_special = True
+                logging.info(f"🎯 連續 {self._check_interval} 次無變化，觸發特殊流程！")
+                self._no_change_count = 0  # 重置計數器
+            
+            # 更新上次餘額記錄
+            if bal_after is not None:
+                self._last_balance = bal_after
+
+            # 4) 特殊機台 Spin 後流程（依 actions.json 的 machine_actions）
+            # 只有累積 10 次無變化時才執行特殊流程
+            if should_trigger_special:
+                for kw, (positions, do_take) in self.machine_actions.items():
+                    if game_code and kw in game_code:
+                        if current_freq <= 0.1:  # 超快頻率
+                            logging.info(f"超快頻率({current_freq}s) - 連續{self._check_interval}次無變化觸發特殊流程: {kw} -> {positions}, take={do_take}")
                         else:
-                            self._rtmp_once_check(self.cfg.rtmp, self.cfg.rtmp_url, threshold=0.80)
+                            logging.info(f"連續{self._check_interval}次無變化觸發特殊流程: {kw} -> {positions}, take={do_take}")
+                        self.click_multiple_positions(positions, click_take=do_take)
+                        break
+            elif balance_changed:
+                logging.info("餘額有變化，重置計數器，繼續 Spin")
+            else:
+                logging.info(f"餘額無變化，累積計數: {self._no_change_count}/{self._check_interval}，繼續 Spin")
+
+            # 5) RTMP 單次偵測（可選）
+            if self.cfg.rtmp and self.cfg.rtmp_url:
+                # 檢查是否啟用模板偵測（高頻率時可關閉以提升性能）
+                if current_freq <= 0.1:  # 超快頻率使用間隔檢測
+                    if not self.cfg.enable_template_detection:
+                        logging.info(f"超快頻率({current_freq}s) - 模板偵測已關閉，跳過 RTMP 檢測")
+                    else:
+                        self._spin_count += 1
+                        # 每隔 5 次 Spin 才檢測一次 RTMP
+                        if self._spin_count % 5 == 0:
+                            logging.info(f"超快頻率({current_freq}s) - 間隔檢測 RTMP (第 {self._spin_count} 次)")
+                            if self._fast_rtmp_check(self.cfg.rtmp, self.cfg.rtmp_url, threshold=0.80):
+                                # 快速檢測觸發，執行錄影流程
+                                logging.warning(f"[{self.cfg.rtmp}] 快速檢測觸發，開始錄影 120s")
+                                try:
+                                    self.lark.send_text(f"🎯 [{self.cfg.rtmp}] 快速檢測觸發\n即刻開始錄影 2 分鐘")
+                                except Exception:
+                                    pass
+                                # 開始錄影（排入排程後立即返回；錄影開始後 spin 迴圈依 _rec_started_at 暫停本機台 Spin）
+                                ts = time.strftime("%Y%m%d_%H%M%S")
+                                self._start_recording(self.cfg.rtmp, self.cfg.rtmp_url, duration_sec=120, ts=ts)
+                else:  # 正常頻率使用標準檢測
+                    if not self.cfg.enable_template_detection:
+                        logging.info(f"正常頻率({current_freq}s) - 模板偵測已關閉，跳過 RTMP 檢測")
+                    else:
+                        self._rtmp_once_check(self.cfg.rtmp, self.cfg.rtmp_url, threshold=0.80)
 
-                # 6) 動態 sleep：使用全域頻率設定，加上小幅隨機抖動避免同步問題
-                with spin_frequency_lock:
-                    base_sleep = spin_frequency
-                
-                # 根據頻率調整隨機抖動範圍
-                if base_sleep <= 0.1:  # 極限頻率使用最小抖動
-                    random_factor = 0.95 + np.random.random() * 0.1  # 0.95 到 1.05 (±5%)
-                elif base_sleep <= 0.2:  # 超快頻率使用較小抖動
-                    random_factor = 0.9 + np.random.random() * 0.2  # 0.9 到 1.1 (±10%)
-                else:  # 其他頻率使用標準抖動
-                    random_factor = 0.8 + np.random.random() * 0.4  # 0.8 到 1.2 (±20%)
-                
-                actual_sleep = base_sleep * random_factor
-                
-                # 計算並顯示實際循環時間
+            # 6) 動態 sleep：本機台節奏（間隔以本輪開始起算，扣掉本輪耗時）
+            if use_pacing:
                 loop_elapsed = time.time() - loop_start_time
-                logging.info(f"循環耗時: {loop_elapsed:.3f}s | 設定頻率: {base_sleep:.3f}s | 實際等待: {actual_sleep:.3f}s")
-                
-                time.sleep(actual_sleep)
+                actual_sleep = self.pacing.next_delay(bal_after if bal_after is not None else bal_before, loop_elapsed)
+                logging.info(f"循環耗時: {loop_elapsed:.3f}s | 節奏: {self.pacing.profile.mode} | 實際等待: {actual_sleep:.3f}s")
+                return actual_sleep
 
-            except KeyboardInterrupt:
-                # 手動中斷：向上拋出，由 run() 處理
-                raise
-            except Exception as e:
-                # 任意例外：記錄並嘗試拍一次 RTMP 便於診斷
-                logging.error(f"spin_forever 例外: {e}\n{traceback.format_exc()}")
-                try:
-                    if self.cfg.rtmp and self.cfg.rtmp_url:
-                        self._rtmp_once_check(self.cfg.rtmp + "_Exception", self.cfg.rtmp_url, threshold=0.80)
-                except Exception as rtmp_err:
-                    logging.debug(f"例外時 RTMP 截圖失敗: {rtmp_err}")
-                time.sleep(1.0)  # 避免例外循環過快
+            # 熱鍵覆蓋：使用全域頻率設定，加上小幅隨機抖動避免同步問題
+            with spin_frequency_lock:
+                base_sleep = spin_frequency
+            
+            # 根據頻率調整隨機抖動範圍
+            if base_sleep <= 0.1:  # 極限頻率使用最小抖動
+                random_factor = 0.95 + np.random.random() * 0.1  # 0.95 到 1.05 (±5%)
+            elif base_sleep <= 0.2:  # 超快頻率使用較小抖動
+                random_factor = 0.9 + np.random.random() * 0.2  # 0.9 到 1.1 (±10%)
+            else:  # 其他頻率使用標準抖動
+                random_factor = 0.8 + np.random.random() * 0.4  # 0.8 到 1.2 (±20%)
+            
+            actual_sleep = base_sleep * random_factor
+            
+            # 計算並顯示實際循環時間
+            loop_elapsed = time.time() - loop_start_time
+            logging.info(f"循環耗時: {loop_elapsed:.3f}s | 設定頻率: {base_sleep:.3f}s | 實際等待: {actual_sleep:.3f}s")
+            
+            return actual_sleep
 
-        while (pause_event.is_set() or self._auto_pause) and not stop_event.is_set():
-            logging.info("[Loop] 已暫停（%s）", "Global" if pause_event.is_set() else "Auto")
-            time.sleep(0.2)
+        except KeyboardInterrupt:
+            # 手動中斷：向上拋出，由 run() 處理
+            raise
+        except Exception as e:
+            # 任意例外：記錄並嘗試拍一次 RTMP 便於診斷
+            logging.error(f"spin_forever 例外: {e}\n{traceback.format_exc()}")
+            try:
+                if self.cfg.rtmp and self.cfg.rtmp_url:
+                    self._rtmp_once_check(self.cfg.rtmp + "_Exception", self.cfg.rtmp_url, threshold=0.80)
+            except Exception as rtmp_err:
+                logging.debug(f"例外時 RTMP 截圖失敗: {rtmp_err}")
+            return self._failure_delay()  # 避免例外循環過快
 
     # ----------------- 對外啟動 -----------------
+    def _open_session(self) -> None:
+        """建立 Edge WebDriver 並載入遊戲 URL；建立失敗時記錄錯誤並拋出"""
+        # 安全日誌輸出（不洩露 URL 和 token）
+        safe_info = f"rtmp={self.cfg.rtmp or 'N/A'}, game={self.cfg.game_title_code or 'N/A'}, template_type={self.template_type or 'N/A'}"
+        logging.info(f"初始化遊戲測試: {safe_info}")
+        try:
+            self.driver = self._build_driver()
+        except Exception as e:
+            logging.error(f"建立瀏覽器失敗: {e}")
+            raise
+
+    def _enter_game(self) -> None:
+        """若提供 game_title_code，開啟後先嘗試從 Lobby 進入"""
+        if self.cfg.game_title_code:
+            self.scroll_and_click_game(self.cfg.game_title_code)
+
+    def _close_session(self) -> None:
+        """記錄元素快取統計並關閉瀏覽器"""
+        logging.info(f"[{self.cfg.rtmp or self.cfg.game_title_code or 'NA'}] 元素快取統計：{self._elements.report()}")
+        if self._lease is not None:
+            # 共用 Edge：只關閉本機台的視窗與 context
+            self.browser_pool.release(self._lease)
+            self._lease = None
+        elif self.driver:
+            try:
+                self.driver.quit()
+            except Exception:
+                pass
+
     def run(self):
         """
-        建立瀏覽器、必要時先嘗試從 Lobby 進入遊戲，接著進入 spin_forever 迴圈
+        建立瀏覽器、必要時先嘗試從 Lobby 進入遊戲，接著進入 spin_forever 迴圈（執行緒模式）
         
         流程：
         1. 建立 Edge WebDriver 並載入遊戲 URL
@@ -2283,27 +4986,137 @@ class GameRunner:
         - KeyboardInterrupt：優雅退出，關閉瀏覽器
         - 其他例外：記錄錯誤並關閉瀏覽器
         """
-        # 安全日誌輸出（不洩露 URL 和 token）
-        safe_info = f"rtmp={self.cfg.rtmp or 'N/A'}, game={self.cfg.game_title_code or 'N/A'}, template_type={self.template_type or 'N/A'}"
-        logging.info(f"初始化遊戲測試: {safe_info}")
-        try:
-            self.driver = self._build_driver()
-        except Exception as e:
-            logging.error(f"建立瀏覽器失敗: {e}")
-            raise
+        self._open_session()
         try:
-            # 若提供 game_title_code，開啟後先嘗試從 Lobby 進入
-            if self.cfg.game_title_code:
-                self.scroll_and_click_game(self.cfg.game_title_code)
+            self._enter_game()
             self.spin_forever()
         except KeyboardInterrupt:
             logging.info("手動中止")
         finally:
-            if self.driver:
-                try:
-                    self.driver.quit()
-                except Exception:
-                    pass
+            self._close_session()
+
+
+# =========================== 非同步協調器（asyncio） ===========================
+class AsyncOrchestrator:
+    """
+    以單一 asyncio 事件迴圈驅動所有機台（AUTOSPIN_ORCHESTRATOR=async，預設）：
+    - 每台機台一個 coroutine；阻塞的部分（WebDriver、FFmpeg、模板比對）以「一輪 Spin」（_spin_step）
+      為單位丟到有上限的執行緒池，執行緒只在真正工作時占用
+    - 輪與輪之間的等待、暫停、錯開啟動都是 await，不占執行緒；機台數可以大於執行緒數
+    - stop_event / pause_event 變動時經 call_soon_threadsafe 喚醒事件迴圈，暫停 / 停止不必等輪詢
+    """
+
+    def __init__(
+        self,
+        runners: List[GameRunner],
+        workers: int = 0,
+        stagger: Tuple[float, float] = (1.0, 2.0),
+        on_start: Optional[Callable[[GameRunner], None]] = None,
+    ):
+        self.runners = runners
+        self.on_start = on_start  # 每台機台啟動前呼叫（例如先連上串流）
+        self.workers = workers if workers > 0 else max(1, min(32, len(runners)))
+        self.stagger = stagger
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    @staticmethod
+    def _name(runner: GameRunner) -> str:
+        return runner.cfg.rtmp or runner.cfg.game_title_code or "NA"
+
+    def _sync_events(self) -> None:
+        """於事件迴圈內執行：把 stop_event / pause_event 的最新狀態同步過來"""
+        if stop_event.is_set():
+            self._stop.set()
+        self._changed.set()
+
+    def _on_event(self) -> None:
+        """stop_event / pause_event 的回呼（可能來自熱鍵或訊號執行緒）"""
+        try:
+            self._loop.call_soon_threadsafe(self._sync_events)
+        except RuntimeError:
+            pass  # 事件迴圈已關閉
+
+    async def _sleep(self, seconds: float) -> bool:
+        """等待 seconds 秒；期間收到停止訊號立即返回 True"""
+        try:
+            await asyncio.wait_for(self._stop.wait(), timeout=max(0.0, seconds))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _wait_resumed(self, name: str) -> None:
+        """暫停時等到恢復（或停止）；狀態改變由回呼喚醒，不輪詢"""
+        logged = False
+        while pause_event.is_set() and not stop_event.is_set():
+            if not logged:
+                logging.info(f"[Loop][{name}] 已暫停，等待恢復（Space 解除暫停）")
+                logged = True
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def _call(self, fn: Callable, *args):
+        return await self._loop.run_in_executor(self._pool, fn, *args)
+
+    async def _run_machine(self, runner: GameRunner) -> None:
+        name = self._name(runner)
+        try:
+            await self._call(runner._open_session)
+        except Exception:
+            return  # 已在 _open_session 記錄
+        try:
+            await self._call(runner._enter_game)
+            while not stop_event.is_set():
+                await self._wait_resumed(name)
+                if stop_event.is_set():
+                    break
+                delay = await self._call(runner._spin_step)
+                if delay > 0 and await self._sleep(delay):
+                    break
+        except Exception as e:
+            logging.error(f"[Async][{name}] 機台協程例外結束: {e}\n{traceback.format_exc()}")
+        finally:
+            await self._call(runner._close_session)
+
+    async def _main(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="GameStep")
+        stop_event.add_listener(self._on_event)
+        pause_event.add_listener(self._on_event)
+        self._sync_events()
+        logging.info(f"[Async] 以 {self.workers} 個執行緒驅動 {len(self.runners)} 台機台")
+        tasks: List[asyncio.Task] = []
+        try:
+            for idx, runner in enumerate(self.runners):
+                if stop_event.is_set():
+                    break
+                logging.info(f"[Async] 啟動機台 {idx+1}/{len(self.runners)}: {self._name(runner)}")
+                if self.on_start is not None:
+                    try:
+                        self.on_start(runner)
+                    except Exception as e:
+                        logging.warning(f"[Async][{self._name(runner)}] 啟動前準備失敗: {e}")
+                tasks.append(asyncio.create_task(self._run_machine(runner), name=f"Game-{self._name(runner)}"))
+                # 錯開啟動時間，避免同時連接 RTMP 造成資源競爭（不阻塞已啟動的機台）
+                if idx < len(self.runners) - 1:
+                    lo, hi = self.stagger
+                    delay = lo + np.random.random() * (hi - lo)
+                    logging.info(f"[Async] 等待 {delay:.2f} 秒後啟動下一台機台")
+                    if await self._sleep(delay):
+                        break
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            stop_event.remove_listener(self._on_event)
+            pause_event.remove_listener(self._on_event)
+            self._pool.shutdown(wait=True)
+
+    def run(self) -> None:
+        """阻塞直到所有機台結束（Ctrl+C / Ctrl+Esc 設定 stop_event 後，各機台跑完當輪即收尾）"""
+        asyncio.run(self._main())
 
 
 # =========================== 主程式與訊號處理 ===========================
@@ -2348,6 +5161,11 @@ def main():
                     enabled=True,
                     enable_recording=raw.get("enable_recording", True),  # ✅ 支援錄製功能開關
                     enable_template_detection=raw.get("enable_template_detection", True),  # ✅ 支援模板偵測開關
+                    enable_frame_grabber=raw.get("enable_frame_grabber", True),  # ✅ 支援常駐取幀開關
+                    recording_mode=raw.get("recording_mode", "reencode"),  # ✅ 支援串流複製 + 預錄緩衝
+                    record_error_hits=raw.get("record_error_hits", False),  # ✅ 錯誤模板觸發也錄影
+                    spin_profile=raw.get("spin_profile"),  # ✅ 指定 spin_profiles.json 的 named_profiles
+                    lean_browser=raw.get("lean_browser", False),  # ✅ 精簡瀏覽器（headless + 擋資源）
                 )
             )
 
@@ -2363,18 +5181,93 @@ def main():
 
     # 共用元件（✅ 帶入 manifest）
     matcher = TemplateMatcher(TEMPLATE_DIR, manifest_path=TEMPLATES_MANIFEST)
+    atexit.register(matcher.save_learned_roi, True)
     ff = FFmpegRunner(FFMPEG_EXE)
-    lark = LarkClient(LARK_WEBHOOK)
+    lark = LarkClient(LARK_WEBHOOK, queue_size=LARK_QUEUE_SIZE, coalesce_window=LARK_COALESCE_WINDOW, key_interval=LARK_KEY_INTERVAL)
+    atexit.register(lark.flush)
+    # 常駐取幀：同一 rtmp_url 共用一個解碼程序；程式結束時一併收掉 FFmpeg
+    # 重複畫面偵測：常駐取幀的每張畫面都比對；退回單張截圖時由各機台自行比對
+    dup_detector = FrameDupDetector(tolerance=DUP_TOLERANCE)
+    grabbers = FrameGrabberPool(
+        FFMPEG_EXE, fps=GRABBER_FPS, stall_timeout=GRABBER_STALL_TIMEOUT, ring_slots=FRAME_RING_SLOTS,
+        dup_detector=dup_detector,
+    )
+    atexit.register(grabbers.stop_all)
+    # 模板比對工作池：DETECTION_WORKERS > 0 時比對移到獨立程序，畫面經共享記憶體傳遞
+    detector = DetectionPool(matcher, workers=DETECTION_WORKERS)
+    atexit.register(detector.close)
+    # 串流複製錄影的預錄緩衝（只有 recording_mode="copy" 的機台會用到）
+    recorders = SegmentRecorderPool(
+        FFMPEG_EXE, SCREENSHOT_RTMP / ".segments", pre_roll=RECORD_PRE_ROLL, segment_seconds=RECORD_SEGMENT_SECONDS
+    )
+    atexit.register(recorders.stop_all)
+    # 全程序共用的錄影排程（限制同時錄影數與 CPU 用量）
+    recording_scheduler = RecordingScheduler(RECORD_MAX_CONCURRENT, RECORD_CPU_BUDGET, RECORD_QUEUE_TIMEOUT)
+    atexit.register(recording_scheduler.stop)
+    # 各機台 Spin 節奏（spin_profiles.json，執行中修改會自動重載）
+    pacing_store = SpinProfileStore(SPIN_PROFILES, reload_interval=SPIN_PROFILES_RELOAD_INTERVAL)
+    if not pacing_store.available:
+        logging.info(f"[Main] 未找到 {SPIN_PROFILES.name}，Spin 間隔使用全域頻率（小鍵盤熱鍵）")
+
+    recording_enabled_count = sum(1 for conf in games if conf.enable_recording)
+    logging.info(f"[Main] 準備啟動 {len(games)} 台機台，其中 {recording_enabled_count} 台啟用錄製功能")
+
+    # 瀏覽器池：多台機台共用少數 Edge 程序（BROWSER_POOL_CONTEXTS > 0 時）
+    browser_pool: Optional[BrowserPool] = None
+    if BROWSER_POOL_CONTEXTS > 0:
+        try:
+            browser_pool = new_browser_pool(BROWSER_POOL_CONTEXTS)
+            atexit.register(browser_pool.close_all)
+            logging.info(f"[Main] 瀏覽器池：每個 Edge 程序最多 {BROWSER_POOL_CONTEXTS} 台機台")
+        except Exception as e:
+            logging.warning(f"[Main] 無法建立瀏覽器池，改為每台機台獨立 Edge：{e}")
+
+    # 預熱：一般 / 精簡機台分開預熱（啟動參數不同），最多開到該類機台數為止
+    warm_pools: Dict[bool, WarmDriverPool] = {}
+    if browser_pool is None and BROWSER_PREWARM > 0:
+        for lean in (False, True):
+            count = sum(1 for conf in games if conf.lean_browser == lean)
+            if count:
+                warm_pools[lean] = WarmDriverPool(
+                    lambda lean=lean: new_edge_driver(lean=lean),
+                    size=min(BROWSER_PREWARM, count), total=count, name="lean" if lean else "default",
+                )
+                atexit.register(warm_pools[lean].close)
+
+    runners: List[GameRunner] = [
+        GameRunner(
+            conf, matcher, ff, lark, keyword_actions, machine_actions,
+            grabbers=grabbers, dup_detector=dup_detector, detector=detector, recorders=recorders,
+            recording_scheduler=recording_scheduler, pacing_store=pacing_store, browser_pool=browser_pool,
+            warm_drivers=warm_pools.get(conf.lean_browser),
+        )
+        for conf in games
+    ]
+
+    def warm_up_streams(runner: GameRunner) -> None:
+        """機台啟動前先連上串流（隨機台錯開啟動）"""
+        conf = runner.cfg
+        # 先連上串流，等第一次 RTMP 偵測時畫面已就緒
+        if conf.enable_frame_grabber and conf.rtmp_url:
+            grabbers.get(conf.rtmp_url, name=conf.rtmp)
+        # 預錄緩衝要在觸發前就開始錄，才拿得到觸發前的畫面
+        if conf.enable_recording and conf.recording_mode == "copy" and conf.rtmp_url:
+            recorders.get(conf.rtmp_url, name=conf.rtmp)
+
+    # ✅ 預設以 asyncio 協調器驅動所有機台；AUTOSPIN_ORCHESTRATOR=thread 時維持每台機台一個執行緒
+    if AUTOSPIN_ORCHESTRATOR != "thread":
+        if AUTOSPIN_ORCHESTRATOR != "async":
+            logging.warning(f"[Main] 未知的 AUTOSPIN_ORCHESTRATOR='{AUTOSPIN_ORCHESTRATOR}'，改用 async")
+        AsyncOrchestrator(runners, workers=ORCHESTRATOR_WORKERS, on_start=warm_up_streams).run()
+        return
 
     # 每台機台一個執行緒
     threads: List[threading.Thread] = []
-    recording_enabled_count = sum(1 for conf in games if conf.enable_recording)
-    logging.info(f"[Main] 準備啟動 {len(games)} 個執行緒，其中 {recording_enabled_count} 個啟用錄製功能")
-    
-    for idx, conf in enumerate(games):
-        runner = GameRunner(conf, matcher, ff, lark, keyword_actions, machine_actions)
+    for idx, runner in enumerate(runners):
+        conf = runner.cfg
+        warm_up_streams(runner)
         recording_status = "啟用錄製" if conf.enable_recording else "停用錄製"
-        logging.info(f"[Main] 啟動執行緒 {idx+1}/{len(games)}: {conf.rtmp or conf.game_title_code or 'NA'} ({recording_status})")
+        logging.info(f"[Main] 啟動執行緒 {idx+1}/{len(runners)}: {conf.rtmp or conf.game_title_code or 'NA'} ({recording_status})")
         
         t = threading.Thread(
             target=runner.run,
@@ -2384,7 +5277,7 @@ def main():
         t.start()
         threads.append(t)
         # 錯開啟動時間，避免同時連接 RTMP 造成資源競爭（每個間隔 1-2 秒）
-        if idx < len(games) - 1:
+        if idx < len(runners) - 1:
             delay = 1.0 + np.random.random()
             logging.info(f"[Main] 等待 {delay:.2f} 秒後啟動下一個執行緒")
             time.sleep(delay)
@@ -2393,6 +5286,6 @@ def main():
     for t in threads:
         t.join()
 
-
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # 打包成 .exe 時比對工作程序需要
     main()
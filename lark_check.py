@@ -0,0 +1,188 @@
+"""
+lark_check.py — 以本機 HTTP stub 檢查 LarkClient 的合併、限流與非阻塞行為
+
+做法：
+- 在 127.0.0.1 開一個 http.server 假 Webhook，記錄每次收到的訊息與時間
+- 合併：coalesce_window 內同一 key 的多則訊息只送出一則「📦 彙整」，未帶 key 的訊息各自送出
+- 限流：同一 key 兩次發送的間隔不小於 key_interval
+- 非阻塞：Webhook 卡住、佇列已滿時 send_text() 仍立即返回，多出的訊息計入 dropped
+
+用法：
+    python lark_check.py [--slow-ms 50] [--interval 1.0]
+
+任一項檢查失敗時以 exit code 1 結束，不會連到真正的 Lark。
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from AutoSpin import LarkClient
+
+# =========================== 假 Webhook ===========================
+class StubWebhook:
+    """記錄收到的訊息；gate 清除時請求會卡住，用來模擬 Lark 回應緩慢"""
+
+    def __init__(self):
+        self.received = []  # (收到時間, 文本)
+        self.lock = threading.Lock()
+        self.gate = threading.Event()
+        self.gate.set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                text = json.loads(body or b"{}").get("content", {}).get("text", "")
+                with stub.lock:
+                    stub.received.append((time.time(), text))
+                stub.gate.wait(timeout=5.0)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(b'{"code":0}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, name="StubWebhook", daemon=True).start()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.received.clear()
+
+    def texts(self) -> list:
+        with self.lock:
+            return [t for _, t in self.received]
+
+    def times(self) -> list:
+        with self.lock:
+            return [ts for ts, _ in self.received]
+
+    def wait_for(self, count: int, timeout: float) -> bool:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if len(self.received) >= count:
+                    return True
+            time.sleep(0.02)
+        return False
+
+    def close(self) -> None:
+        self.gate.set()
+        self.server.shutdown()
+
+
+# =========================== 檢查項目 ===========================
+def check_coalesce(stub: StubWebhook) -> list:
+    stub.reset()
+    client = LarkClient(stub.url, coalesce_window=0.5, key_interval=0.0)
+    for i in range(5):
+        client.send_text(f"機台{i} 畫面重複", key="dup")
+    client.send_text("單獨通知 A")
+    client.send_text("單獨通知 B")
+    stub.wait_for(3, timeout=3.0)  # 等合併視窗到期自然送出，不靠 flush() 強制送出
+    client.flush(timeout=5.0)
+    texts = stub.texts()
+    digests = [t for t in texts if t.startswith("📦 彙整")]
+    stats = client.snapshot_stats()
+    errors = []
+    if len(texts) != 3:
+        errors.append(f"預期送出 3 則（1 則彙整 + 2 則單獨），實際 {len(texts)} 則：{texts}")
+    if len(digests) != 1 or "彙整 5 則" not in digests[0]:
+        errors.append(f"同一 key 的 5 則訊息未合併成一則彙整：{digests}")
+    if stats["coalesced"] != 4 or stats["sent"] != 3:
+        errors.append(f"統計不符：{stats}")
+    return errors
+
+
+def check_rate_limit(stub: StubWebhook, interval: float) -> list:
+    stub.reset()
+    client = LarkClient(stub.url, coalesce_window=0.05, key_interval=interval)
+    client.send_text("第一則", key="dup")
+    if not stub.wait_for(1, timeout=3.0):
+        client.flush(timeout=1.0)
+        return ["第一則訊息未送出"]
+    client.send_text("第二則", key="dup")
+    client.send_text("第三則", key="dup")
+    client.send_text("其他 key", key="other")
+    stub.wait_for(3, timeout=interval + 3.0)  # flush() 會立即送出尚未到期的彙整，先等限流到期
+    client.flush(timeout=5.0)
+    received = list(zip(stub.times(), stub.texts()))
+    dup = [(ts, t) for ts, t in received if t != "其他 key"]
+    other = [ts for ts, t in received if t == "其他 key"]
+    errors = []
+    if len(dup) != 2:
+        return [f"同一 key 預期送出 2 則（第二、三則合併），實際 {len(dup)} 則：{[t for _, t in dup]}"]
+    gap = dup[1][0] - dup[0][0]
+    if gap < interval - 0.05:
+        errors.append(f"同一 key 兩次發送間隔 {gap:.2f}s，小於 key_interval {interval:.2f}s")
+    if not other or other[0] >= dup[1][0]:
+        errors.append("其他 key 的訊息被同一個限流卡住")
+    return errors
+
+
+def check_non_blocking(stub: StubWebhook, slow_ms: float) -> list:
+    stub.reset()
+    stub.gate.clear()  # Webhook 卡住：背景執行緒停在第一則的 POST
+    client = LarkClient(stub.url, queue_size=2, coalesce_window=0.0, key_interval=0.0)
+    errors = []
+    try:
+        client.send_text("卡住的第一則")
+        if not stub.wait_for(1, timeout=3.0):
+            return ["第一則訊息未送到 stub"]
+        worst = 0.0
+        accepted = 0
+        for i in range(10):
+            t0 = time.perf_counter()
+            accepted += bool(client.send_text(f"排隊 {i}"))
+            worst = max(worst, time.perf_counter() - t0)
+        stats = client.snapshot_stats()
+        if worst * 1000 > slow_ms:
+            errors.append(f"send_text 最慢耗時 {worst * 1000:.1f} ms，超過 {slow_ms:.0f} ms")
+        if accepted != 2 or stats["dropped"] != 8:
+            errors.append(f"佇列上限 2：預期接受 2 則、丟棄 8 則，實際接受 {accepted}、統計 {stats}")
+    finally:
+        stub.gate.set()
+        client.flush(timeout=5.0)
+    if len(stub.texts()) != 3:
+        errors.append(f"放行後預期共送出 3 則，實際 {len(stub.texts())} 則")
+    return errors
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="LarkClient 合併 / 限流 / 非阻塞檢查（本機 HTTP stub）")
+    parser.add_argument("--slow-ms", type=float, default=50.0, help="send_text 單次耗時上限（毫秒）")
+    parser.add_argument("--interval", type=float, default=1.0, help="限流檢查使用的 key_interval（秒）")
+    args = parser.parse_args()
+
+    stub = StubWebhook()
+    print(f"🧪 假 Webhook：{stub.url}")
+    checks = [
+        ("合併", lambda: check_coalesce(stub)),
+        ("限流", lambda: check_rate_limit(stub, args.interval)),
+        ("非阻塞", lambda: check_non_blocking(stub, args.slow_ms)),
+    ]
+    failed = 0
+    try:
+        for name, fn in checks:
+            errors = fn()
+            if errors:
+                failed += 1
+                print(f"❌ {name}")
+                for e in errors:
+                    print(f"   {e}")
+            else:
+                print(f"✅ {name}")
+    finally:
+        stub.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+pyramid_check.py — 比對 TemplateMatcher 的 pyramid（粗到細）與 exact（全解析度）分數差異
+
+做法：
+- 從 templates/ 每張圖各切幾塊區域當作「模板」
+- 正樣本：在來源圖上比對（應該接近 1.0）
+- 負樣本：在另一張同尺寸的圖上比對
+- 分別以 exact 與 pyramid 計算最高分，統計分數差與耗時
+
+用法：
+    python pyramid_check.py [--scale 0.5] [--top-k 3] [--tolerance 0.05] [--patches 4]
+
+最大分數差超過 tolerance 時以 exit code 1 結束，方便在調整 manifest 的 pyramid 參數前先確認精度。
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from AutoSpin import BASE_DIR, CompiledTemplate, TemplateMatcher
+
+# =========================== 參數 ===========================
+PATCH_SIZES = [(320, 180), (240, 120), (160, 90)]  # (寬, 高)，以 1024x576 畫面為基準
+SEED = 20240101
+
+
+def load_frames(template_dir: Path) -> dict:
+    frames = {}
+    for p in sorted(template_dir.glob("*.png")):
+        img = cv2.imread(str(p), cv2.IMREAD_GRAYSCALE)
+        if img is not None:
+            frames[p.name] = img
+    return frames
+
+
+def cut_patches(img: np.ndarray, count: int, rng: np.random.Generator) -> list:
+    """依畫面比例縮放 PATCH_SIZES，隨機切出 count 塊（跳過幾乎純色、無法比對的區域）"""
+    h, w = img.shape[:2]
+    ratio = w / 1024.0
+    patches = []
+    for i in range(count * 4):
+        if len(patches) >= count:
+            break
+        pw, ph = PATCH_SIZES[i % len(PATCH_SIZES)]
+        pw, ph = int(pw * ratio), int(ph * ratio)
+        if pw >= w or ph >= h:
+            continue
+        x, y = int(rng.integers(0, w - pw)), int(rng.integers(0, h - ph))
+        patch = img[y:y + ph, x:x + pw].copy()
+        if float(patch.std()) < 8.0:
+            continue
+        patches.append(((x, y), patch))
+    return patches
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="pyramid vs exact 模板比對精度檢查")
+    parser.add_argument("--templates", default=str(BASE_DIR / "templates"))
+    parser.add_argument("--scale", type=float, default=0.5)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    parser.add_argument("--patches", type=int, default=4, help="每張圖切幾塊")
+    args = parser.parse_args()
+
+    frames = load_frames(Path(args.templates))
+    if len(frames) < 2:
+        print(f"❌ {args.templates} 內可用圖片不足")
+        return 2
+
+    rng = np.random.default_rng(SEED)
+    names = list(frames)
+    rows = []  # (名稱, 種類, exact 分數, pyramid 分數)
+    t_exact = t_pyr = 0.0
+
+    for idx, name in enumerate(names):
+        img = frames[name]
+        # 負樣本：下一張同尺寸的圖
+        other = next(
+            (frames[n] for n in names[idx + 1:] + names[:idx] if frames[n].shape == img.shape),
+            None,
+        )
+        for (x, y), patch in cut_patches(img, args.patches, rng):
+            tpl = CompiledTemplate(
+                file=f"{name}@{x},{y}",
+                image=patch,
+                mask=None,
+                threshold=None,
+                when=None,
+                match_mode="pyramid",
+                pyramid_scale=args.scale,
+                pyramid_top_k=args.top_k,
+            )
+            TemplateMatcher._build_pyramid_level(tpl)
+            targets = [("pos", img)] + ([("neg", other)] if other is not None else [])
+            for kind, frame in targets:
+                t0 = time.perf_counter()
+                exact, _ = TemplateMatcher._match_exact(frame, patch, None)
+                t1 = time.perf_counter()
+                pyr, _ = TemplateMatcher._match_pyramid(frame, tpl)
+                t2 = time.perf_counter()
+                t_exact += t1 - t0
+                t_pyr += t2 - t1
+                rows.append((tpl.file, kind, exact, pyr))
+
+    if not rows:
+        print("❌ 沒有可用的比對樣本")
+        return 2
+
+    diffs = np.array([abs(e - p) for _, _, e, p in rows])
+    worst = sorted(rows, key=lambda r: abs(r[2] - r[3]), reverse=True)[:5]
+
+    print(f"📊 樣本數：{len(rows)}（scale={args.scale}，top_k={args.top_k}）")
+    for kind in ("pos", "neg"):
+        d = np.array([abs(e - p) for _, k, e, p in rows if k == kind])
+        if d.size:
+            print(f"   {kind}: 平均差 {d.mean():.4f}，最大差 {d.max():.4f}")
+    print(f"⏱️ exact 總耗時 {t_exact * 1000:.1f} ms，pyramid 總耗時 {t_pyr * 1000:.1f} ms（{t_exact / max(t_pyr, 1e-9):.1f}x）")
+    print("🔎 差異最大的樣本：")
+    for file, kind, e, p in worst:
+        print(f"   {file:<40} {kind}  exact={e:.4f}  pyramid={p:.4f}")
+
+    if float(diffs.max()) > args.tolerance:
+        print(f"❌ 最大分數差 {diffs.max():.4f} 超過容許值 {args.tolerance}")
+        return 1
+    print(f"✅ 最大分數差 {diffs.max():.4f} 在容許值 {args.tolerance} 內")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
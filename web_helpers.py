@@ -0,0 +1,565 @@
+"""
+web_helpers.py — AutoSpin.py 與 200spinTest.py 共用的頁面操作工具（在頁面內執行 JS，減少 WebDriver 來回）
+
+- LobbyIndex：大廳遊戲卡片索引。一次 execute_script 取得所有卡片的 title → 索引，
+  同一次大廳載入（卡片 DOM 未重建）內重複進入遊戲時不再重新掃描，找卡片 + 點擊只需一次來回
+- click_positions：keyword_actions / machine_actions 的座標批次點擊。一次 execute_async_script
+  在頁面內找出所有座標 span、依序點擊（可設定每次點擊間隔），並回報找不到的座標
+- BrowserPool：多台機台共用少數 Edge 程序，每台一個獨立 browser context（cookie / token 隔離）與專屬視窗
+- AccountContext：同一個 Edge 換帳號時，每個帳號開一個新的 browser context，上一個帳號的狀態整個丟棄
+- resolve_driver_path / WarmDriverPool：msedgedriver 路徑每個程序只解析一次；預先並行啟動瀏覽器，取用時不必冷啟動
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import websocket  # websocket-client（selenium 的相依套件），瀏覽器池送 browser 層級 CDP 指令用
+except Exception:  # pragma: no cover
+    websocket = None  # type: ignore
+
+# =========================== 大廳卡片索引 ===========================
+# arguments: [game_title_code, Python 端快取的 gen, Python 端算出的索引（或 null）]
+# - 頁面端以 window.__autospinLobby 記住「這次大廳載入」（卡片數量 + 首尾節點參照），DOM 重建時 gen + 1
+# - 索引仍有效（gen 相同、該卡片 title 仍含 code）時直接點擊
+# - 否則在頁面內找第一張 title 含 code 的卡片並點擊；大廳有重建時順便回傳全部 title 供 Python 端建索引
+_LOBBY_CLICK_JS = """
+const code = arguments[0], gen = arguments[1], idx = arguments[2];
+const cards = document.querySelectorAll('#grid_gm_item');
+const n = cards.length;
+let L = window.__autospinLobby;
+const same = !!L && n > 0 && L.count === n && L.first === cards[0] && L.last === cards[n - 1];
+if (!same && n > 0) {
+  L = window.__autospinLobby = {gen: (L ? L.gen : 0) + 1, count: n, first: cards[0], last: cards[n - 1]};
+}
+const titleOf = (c) => c.getAttribute('title') || '';
+const click = (c) => { c.scrollIntoView({block: 'center'}); c.click(); return titleOf(c); };
+const out = {count: n, gen: L ? L.gen : 0, clicked: null};
+if (same && gen === L.gen && idx !== null && idx < n && titleOf(cards[idx]).indexOf(code) >= 0) {
+  out.clicked = click(cards[idx]);
+  out.index = idx;
+  return out;
+}
+if (!same || gen !== out.gen) out.titles = Array.prototype.map.call(cards, titleOf);
+for (let i = 0; i < n; i++) {
+  if (code && titleOf(cards[i]).indexOf(code) >= 0) { out.clicked = click(cards[i]); out.index = i; break; }
+}
+return out;
+"""
+
+
+class LobbyIndex:
+    """
+    大廳卡片索引（可多個 driver / 執行緒共用，各 driver 以 session_id 分開快取）：
+    - 快取每個 driver 目前大廳的 {title: 索引} 與頁面端的 gen
+    - click_card() 一次 execute_script 完成「找卡片 + 捲動 + 點擊」；大廳剛載入、卡片還沒出現時每 0.2 秒重試
+    - stats 記錄點擊次數、重新掃描次數與 execute_script 次數
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, dict] = {}  # session_id -> {"gen": int, "titles": {title: idx}}
+        self._lock = threading.Lock()
+        self.stats = {"clicks": 0, "scans": 0, "calls": 0}
+
+    @staticmethod
+    def _key(driver) -> str:
+        return str(getattr(driver, "session_id", None) or id(driver))
+
+    def lookup(self, driver, game_title_code: str) -> Optional[int]:
+        """以快取的索引找第一張 title 含 game_title_code 的卡片（與原本逐張比對 title 的規則相同）"""
+        with self._lock:
+            entry = self._cache.get(self._key(driver))
+        if not entry or not game_title_code:
+            return None
+        hits = [i for t, i in entry["titles"].items() if game_title_code in t]
+        return min(hits) if hits else None
+
+    def titles(self, driver) -> List[str]:
+        """目前快取的大廳卡片 title（依頁面順序）"""
+        with self._lock:
+            entry = self._cache.get(self._key(driver))
+        return sorted(entry["titles"], key=entry["titles"].get) if entry else []
+
+    def invalidate(self, driver=None) -> None:
+        with self._lock:
+            if driver is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(self._key(driver), None)
+
+    def click_card(self, driver, game_title_code: str, timeout: float = 10.0) -> Optional[str]:
+        """
+        在大廳找到 title 含 game_title_code 的卡片並點擊
+
+        返回:
+            Optional[str]: 點擊到的卡片 title；大廳在 timeout 秒內都沒有卡片或找不到符合的卡片時回傳 None
+        """
+        key = self._key(driver)
+        deadline = time.time() + timeout
+        while True:
+            with self._lock:
+                entry = self._cache.get(key)
+            gen = entry["gen"] if entry else -1
+            res = driver.execute_script(_LOBBY_CLICK_JS, game_title_code, gen, self.lookup(driver, game_title_code))
+            self.stats["calls"] += 1
+            if res.get("titles") is not None:
+                # 大廳重建（或第一次看到）：更新索引（同名卡片保留第一張）
+                index: Dict[str, int] = {}
+                for i, t in enumerate(res["titles"]):
+                    index.setdefault(t, i)
+                with self._lock:
+                    self._cache[key] = {"gen": res["gen"], "titles": index}
+                self.stats["scans"] += 1
+                logging.debug(f"[Lobby] 重建大廳索引：{len(index)} 張卡片（gen={res['gen']}）")
+            if res.get("clicked") is not None:
+                self.stats["clicks"] += 1
+                return res["clicked"]
+            if res.get("count", 0) > 0 or time.time() >= deadline:
+                return None
+            time.sleep(0.2)  # 大廳卡片尚未出現
+
+
+# =========================== 座標批次點擊 ===========================
+# execute_async_script；arguments: [labels, paceMs, waitMs, callback]
+# - 以 span 自身的文字節點（不含子元素的文字；去頭尾空白、連續空白視為一個，等同 XPath normalize-space(text())）比對，
+#   同文字取第一個；外層包著座標 span 的 span 不會被當成座標
+# - 有座標還沒出現時每 100ms 重新查一次，最多等 waitMs；之後依序點擊已找到的座標，每次間隔 paceMs
+# - 點擊前元素已被重新渲染（不在 DOM 上）或先前還沒出現時，以文字重新查一次再點
+_BATCH_CLICK_JS = """
+const labels = arguments[0], paceMs = arguments[1], waitMs = arguments[2];
+const done = arguments[arguments.length - 1];
+const t0 = performance.now();
+const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim();
+const ownText = (el) => {
+  let s = '';
+  for (const n of el.childNodes) if (n.nodeType === 3) s += n.nodeValue;
+  return norm(s);
+};
+const want = new Set(labels);
+const resolve = (wanted) => {
+  const found = new Map();
+  const spans = document.getElementsByTagName('span');
+  for (let i = 0; i < spans.length && found.size < wanted.size; i++) {
+    const t = ownText(spans[i]);
+    if (wanted.has(t) && !found.has(t)) found.set(t, spans[i]);
+  }
+  return found;
+};
+const run = (found) => {
+  const clicked = [], missing = [], errors = [];
+  let i = 0;
+  const next = () => {
+    if (i >= labels.length) return done({clicked: clicked, missing: missing, errors: errors, ms: performance.now() - t0});
+    const label = labels[i++];
+    let el = found.get(label);
+    if (!el || !el.isConnected) el = resolve(new Set([label])).get(label);  // 先前的點擊造成重新渲染 / 之後才出現
+    if (!el) { missing.push(label); return next(); }
+    try { el.scrollIntoView({block: 'center'}); el.click(); clicked.push(label); }
+    catch (e) { errors.push(label + ': ' + e); }
+    if (i < labels.length) setTimeout(next, paceMs); else next();
+  };
+  next();
+};
+(function poll() {
+  const found = resolve(want);
+  if (found.size >= want.size || performance.now() - t0 >= waitMs) return run(found);
+  setTimeout(poll, 100);
+})();
+"""
+
+
+@dataclass
+class BatchClickResult:
+    """click_positions 的結果"""
+    clicked: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing and not self.errors
+
+
+def click_positions(driver, labels: List[str], pace_ms: int = 150, wait_timeout: float = 2.5) -> BatchClickResult:
+    """
+    一次 execute_async_script 依序點擊多個座標 span（例如 ["3,2", "3,5"]）
+
+    參數:
+        labels (List[str]): 座標文字清單，依清單順序點擊（同一座標出現多次會點多次）
+        pace_ms (int): 每次點擊之間的間隔（毫秒），給遊戲 UI 反應時間
+        wait_timeout (float): 座標尚未全部出現時最多等待的秒數（整批共用，不是每個座標各等一次）
+
+    注意:
+        - 整批耗時約 wait_timeout + pace_ms × 座標數，需小於 driver 的 script timeout（Selenium 預設 30 秒）
+        - 失敗不拋例外：找不到的座標放在 missing，點擊時頁面拋出的錯誤放在 errors
+    """
+    labels = [str(x).strip() for x in (labels or []) if str(x).strip()]
+    if not labels:
+        return BatchClickResult()
+    try:
+        res = driver.execute_async_script(_BATCH_CLICK_JS, labels, int(pace_ms), int(wait_timeout * 1000))
+    except Exception as e:
+        logging.warning(f"❌ 批次點擊座標失敗: {e}")
+        return BatchClickResult(missing=list(labels), errors=[str(e)])
+    result = BatchClickResult(
+        clicked=list(res.get("clicked") or []),
+        missing=list(res.get("missing") or []),
+        errors=list(res.get("errors") or []),
+        elapsed_ms=float(res.get("ms") or 0.0),
+    )
+    logging.info(f"✅ 已點擊座標 {len(result.clicked)}/{len(labels)}（{result.elapsed_ms:.0f}ms）：{', '.join(result.clicked)}")
+    if result.missing:
+        logging.warning(f"❌ 找不到座標（等待 {wait_timeout:.1f} 秒）：{', '.join(result.missing)}")
+    for err in result.errors:
+        logging.warning(f"❌ 點擊座標時發生錯誤：{err}")
+    return result
+
+
+# =========================== 瀏覽器池（共用 Edge 程序 + 獨立 browser context） ===========================
+@dataclass
+class BrowserLease:
+    """BrowserPool.acquire() 借出的瀏覽器：driver 只操作自己的視窗，cookie / storage 與其他機台隔離"""
+    name: str
+    driver: Any
+    host: "_BrowserHost"
+    context_id: str
+    target_id: str
+
+
+class _BrowserHost:
+    """
+    一個共用的 Edge 程序：
+    - 以一般 WebDriver 啟動（持有程序生命週期），另開一條 DevTools WebSocket 送 browser 層級的 CDP 指令
+      （Target.createBrowserContext / createTarget / closeTarget / disposeBrowserContext）
+    - 各機台的 driver 以 debuggerAddress 附加到這個程序，再切到自己的視窗
+    """
+
+    def __init__(self, index: int, driver, address: str, profile: str = "default"):
+        self.index = index
+        self.profile = profile
+        self.driver = driver
+        self.address = address
+        self.leases = 0
+        self.alive = True
+        self._lock = threading.Lock()
+        self._seq = 0
+        with urllib.request.urlopen(f"http://{address}/json/version", timeout=10) as resp:
+            ws_url = json.loads(resp.read().decode("utf-8"))["webSocketDebuggerUrl"]
+        # suppress_origin：新版 Edge 拒絕帶 Origin 標頭、但未列在 --remote-allow-origins 的連線
+        self._ws = websocket.create_connection(ws_url, timeout=15, suppress_origin=True)
+
+    @classmethod
+    def for_driver(cls, driver, index: int = 0, profile: str = "default") -> "_BrowserHost":
+        """由 WebDriver capabilities 取得 debuggerAddress 後建立"""
+        caps = driver.capabilities
+        address = next(
+            (v["debuggerAddress"] for k, v in caps.items() if isinstance(v, dict) and "debuggerAddress" in v),
+            None,
+        )
+        if not address:
+            raise RuntimeError("WebDriver 未回報 debuggerAddress")
+        return cls(index, driver, address, profile)
+
+    def cdp(self, method: str, params: Optional[dict] = None) -> dict:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            try:
+                self._ws.send(json.dumps({"id": seq, "method": method, "params": params or {}}))
+                while True:
+                    msg = json.loads(self._ws.recv())
+                    if msg.get("id") == seq:
+                        break
+            except Exception:
+                self.alive = False
+                raise
+        if "error" in msg:
+            raise RuntimeError(f"{method} 失敗：{msg['error'].get('message', msg['error'])}")
+        return msg.get("result") or {}
+
+    def disconnect(self) -> None:
+        """只關閉 DevTools WebSocket（Edge 程序交由 driver 擁有者處理）"""
+        self.alive = False
+        try:
+            self._ws.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self.disconnect()
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """
+    多台機台共用少數幾個 Edge 程序（每台機台一個獨立的 browser context + 專屬視窗）：
+    - 每個 Edge 程序最多放 contexts_per_host 台機台，額滿時自動再開一個
+    - 啟動參數不同的機台（例如 headless 精簡模式）以 profile 區分，各自使用不同的 Edge 程序
+    - browser context 等同無痕視窗：cookie、localStorage、token 各機台互不影響
+    - 每台機台的視窗以 window_size 開啟（行動版版面與原本獨立瀏覽器相同）
+    - release() 關閉該機台的視窗與 context；close_all() 關閉所有 Edge 程序（程式結束時呼叫）
+
+    參數:
+        new_host (Callable[[str], driver]): 依 profile 啟動一個共用 Edge 程序並回傳其 WebDriver（需帶 User-Agent 等共用啟動參數）
+        attach (Callable[[str], driver]): 以 debuggerAddress 附加到指定位址的 Edge，回傳新的 WebDriver
+    """
+
+    def __init__(
+        self,
+        new_host: Callable[[str], Any],
+        attach: Callable[[str], Any],
+        contexts_per_host: int = 8,
+        window_size: Tuple[int, int] = (432, 859),
+    ):
+        if websocket is None:
+            raise RuntimeError("瀏覽器池需要 websocket-client（selenium 的相依套件）")
+        self.new_host = new_host
+        self.attach = attach
+        self.contexts_per_host = max(1, contexts_per_host)
+        self.window_size = window_size
+        self._hosts: List[_BrowserHost] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {"hosts": 0, "acquired": 0, "released": 0}
+
+    def _launch_host(self, profile: str) -> _BrowserHost:
+        driver = self.new_host(profile)
+        try:
+            host = _BrowserHost.for_driver(driver, self.stats["hosts"], profile)
+        except Exception:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            raise
+        self.stats["hosts"] += 1
+        logging.info(f"[BrowserPool] 啟動共用 Edge #{host.index}（{host.address}，profile={profile}）")
+        return host
+
+    def _reserve(self, profile: str) -> _BrowserHost:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("瀏覽器池已關閉")
+            self._hosts = [h for h in self._hosts if h.alive]
+            host = min(
+                (h for h in self._hosts if h.profile == profile and h.leases < self.contexts_per_host),
+                key=lambda h: h.leases,
+                default=None,
+            )
+            if host is None:
+                # 啟動期間持有鎖：其他機台本來就要等這個新程序
+                host = self._launch_host(profile)
+                self._hosts.append(host)
+            host.leases += 1
+            return host
+
+    def acquire(self, name: str, profile: str = "default", window_size: Optional[Tuple[int, int]] = None) -> BrowserLease:
+        """借出一個獨立 context 的視窗（driver 已切到該視窗，頁面為 about:blank）；window_size 未指定時用池的預設值"""
+        host = self._reserve(profile)
+        context_id = target_id = None
+        driver = None
+        try:
+            context_id = host.cdp("Target.createBrowserContext", {"disposeOnDetach": False})["browserContextId"]
+            w, h = window_size or self.window_size
+            target_id = host.cdp("Target.createTarget", {
+                "url": "about:blank", "browserContextId": context_id, "newWindow": True, "width": w, "height": h,
+            })["targetId"]
+            driver = self.attach(host.address)
+            driver.switch_to.window(target_id)  # chromium 系列的 window handle 即 targetId
+            try:
+                driver.set_window_size(w, h)
+            except Exception:
+                pass
+        except Exception:
+            self._discard(host, context_id, target_id, driver)
+            raise
+        self.stats["acquired"] += 1
+        logging.info(f"[BrowserPool][{name}] 使用共用 Edge #{host.index}（{host.leases}/{self.contexts_per_host}）")
+        return BrowserLease(name, driver, host, context_id, target_id)
+
+    def _discard(self, host: _BrowserHost, context_id: Optional[str], target_id: Optional[str], driver) -> None:
+        if driver is not None:
+            try:
+                driver.quit()  # debuggerAddress 附加的 session：只中斷連線，不會關閉共用的 Edge
+            except Exception:
+                pass
+        if host.alive:
+            for method, key, value in (("Target.closeTarget", "targetId", target_id),
+                                       ("Target.disposeBrowserContext", "browserContextId", context_id)):
+                if value:
+                    try:
+                        host.cdp(method, {key: value})
+                    except Exception as e:
+                        logging.debug(f"[BrowserPool] {method} 失敗：{e}")
+        with self._lock:
+            host.leases = max(0, host.leases - 1)
+
+    def release(self, lease: BrowserLease) -> None:
+        """關閉該機台的視窗與 context（共用的 Edge 程序保留給其他機台 / 下一次借用）"""
+        self._discard(lease.host, lease.context_id, lease.target_id, lease.driver)
+        self.stats["released"] += 1
+
+    def close_all(self) -> None:
+        with self._lock:
+            self._closed = True
+            hosts, self._hosts = self._hosts, []
+        for host in hosts:
+            host.close()
+        if hosts:
+            logging.info(f"[BrowserPool] 已關閉 {len(hosts)} 個共用 Edge（累計借出 {self.stats['acquired']} 次）")
+
+
+class AccountContext:
+    """
+    單一 WebDriver 依序跑多個帳號時的隔離：
+    - fresh() 關閉上一個帳號的視窗與 browser context，再開一個全新的 context + 視窗並切過去
+      （cookie、localStorage、sessionStorage、IndexedDB、所有網域的資料都不會帶到下一個帳號）
+    - 啟動時的原始視窗保留不動，讓 driver 在兩個 context 之間仍有視窗可切
+    - close() 丟棄目前的 context 並中斷 DevTools 連線（不關閉瀏覽器）
+    """
+
+    def __init__(self, driver, window_size: Optional[Tuple[int, int]] = None):
+        if websocket is None:
+            raise RuntimeError("帳號隔離需要 websocket-client（selenium 的相依套件）")
+        self.driver = driver
+        self.window_size = window_size
+        self._host = _BrowserHost.for_driver(driver)
+        self._home = driver.current_window_handle
+        self.context_id: Optional[str] = None
+        self.target_id: Optional[str] = None
+
+    def fresh(self) -> None:
+        """換成一個全新的 context（頁面為 about:blank）；失敗時拋例外，呼叫端應改用新的瀏覽器"""
+        self.dispose()
+        self.context_id = self._host.cdp("Target.createBrowserContext", {"disposeOnDetach": False})["browserContextId"]
+        params = {"url": "about:blank", "browserContextId": self.context_id, "newWindow": True}
+        if self.window_size:
+            params["width"], params["height"] = self.window_size
+        self.target_id = self._host.cdp("Target.createTarget", params)["targetId"]
+        self.driver.switch_to.window(self.target_id)  # chromium 系列的 window handle 即 targetId
+
+    def dispose(self) -> None:
+        """關閉目前帳號的視窗與 context（driver 切回原始視窗）"""
+        if self.target_id is None and self.context_id is None:
+            return
+        try:
+            self.driver.switch_to.window(self._home)
+        except Exception:
+            pass
+        for method, key, value in (("Target.closeTarget", "targetId", self.target_id),
+                                   ("Target.disposeBrowserContext", "browserContextId", self.context_id)):
+            if value:
+                try:
+                    self._host.cdp(method, {key: value})
+                except Exception as e:
+                    logging.debug(f"[AccountContext] {method} 失敗：{e}")
+        self.context_id = self.target_id = None
+
+    def close(self) -> None:
+        self.dispose()
+        self._host.disconnect()
+
+
+# =========================== WebDriver 路徑快取與預熱 ===========================
+_DRIVER_PATHS: Dict[str, str] = {}
+_DRIVER_PATHS_LOCK = threading.Lock()
+
+
+def resolve_driver_path(local_path, installer: Optional[Callable[[], str]] = None) -> str:
+    """
+    解析 msedgedriver 路徑（每個程序只解析一次，之後直接取快取）：
+    - local_path 存在就用它
+    - 否則呼叫 installer（例如 webdriver_manager 下載）；多個執行緒同時呼叫時只會下載一次，其餘等待結果
+
+    異常:
+        FileNotFoundError: local_path 不存在且沒有 installer
+    """
+    key = str(local_path)
+    with _DRIVER_PATHS_LOCK:
+        path = _DRIVER_PATHS.get(key)
+        if path is None:
+            if os.path.exists(key):
+                path = key
+            elif installer is not None:
+                path = installer()
+                logging.info(f"[Driver] 已下載 / 解析驅動程式：{path}")
+            else:
+                raise FileNotFoundError(f"找不到驅動程式：{key}")
+            _DRIVER_PATHS[key] = path
+    return path
+
+
+class WarmDriverPool:
+    """
+    預先並行啟動瀏覽器，需要時直接取用（省掉逐台冷啟動的等待）：
+    - 建立時即以 size 個執行緒同時啟動 size 個瀏覽器（停在 about:blank）
+    - take() 取走最早啟動的一個，並在背景補啟動下一個，維持 size 個預備
+    - total 為最多啟動幾個（例如機台數 / 帳號數），用完後不再補；take() 取不到預備時直接冷啟動
+    - 預熱失敗的瀏覽器不會交出去，take() 改為冷啟動並記錄警告
+    - close() 關閉尚未被取走的瀏覽器（程式結束時呼叫）
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int, total: Optional[int] = None, name: str = "default"):
+        self.factory = factory
+        self.size = max(0, size)
+        self.total = total
+        self.name = name
+        self._lock = threading.Lock()
+        self._ready: List[Future] = []
+        self._spawned = 0
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=max(1, self.size), thread_name_prefix=f"Warm-{name}")
+        self.stats = {"warm": 0, "cold": 0, "failed": 0}
+        with self._lock:
+            for _ in range(self.size):
+                self._spawn_locked()
+        if self._ready:
+            logging.info(f"[Warm][{name}] 預先啟動 {len(self._ready)} 個瀏覽器")
+
+    def _spawn_locked(self) -> None:
+        if self._closed or (self.total is not None and self._spawned >= self.total):
+            return
+        self._spawned += 1
+        self._ready.append(self._pool.submit(self.factory))
+
+    def take(self, timeout: Optional[float] = None):
+        """取一個預熱好的瀏覽器（等它啟動完成）；沒有預備或預熱失敗時直接冷啟動"""
+        with self._lock:
+            fut = self._ready.pop(0) if self._ready else None
+            if fut is not None:
+                self._spawn_locked()
+        if fut is not None:
+            try:
+                driver = fut.result(timeout=timeout)
+                self.stats["warm"] += 1
+                return driver
+            except Exception as e:
+                self.stats["failed"] += 1
+                logging.warning(f"[Warm][{self.name}] 預熱瀏覽器失敗，改為冷啟動：{e}")
+        self.stats["cold"] += 1
+        return self.factory()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            pending, self._ready = self._ready, []
+        for fut in pending:
+            if fut.cancel():
+                continue
+            try:
+                fut.result(timeout=60).quit()
+            except Exception:
+                pass
+        self._pool.shutdown(wait=False)
+        logging.info(f"[Warm][{self.name}] 統計：預熱取用 {self.stats['warm']}、冷啟動 {self.stats['cold']}、失敗 {self.stats['failed']}")